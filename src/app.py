@@ -33,15 +33,14 @@ def create_app():
     
     @app.route('/api/properties')
     def get_properties():
-        import psycopg2
-        from config.db import DB_PARAMS
+        from config.db import get_connection
         
         try:
-            conn = psycopg2.connect(**DB_PARAMS)
+            conn = get_connection()
             cursor = conn.cursor()
             
-            # Execute query to fetch all properties
-            cursor.execute("SELECT * FROM properties")
+            # Execute query to fetch all current (non-retired) properties
+            cursor.execute("SELECT * FROM properties WHERE active")
             
             # Fetch all rows and convert to list of dictionaries
             columns = [desc[0] for desc in cursor.description]
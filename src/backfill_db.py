@@ -0,0 +1,25 @@
+"""
+Batch backfill script for derived property columns
+
+Run after deploying a new normalizer so rows scraped before it existed
+get the same stored values as freshly ingested ones:
+
+    python backfill_db.py
+"""
+
+from config.db import migrate_properties_table, backfill_bedrooms, backfill_geodata
+
+def backfill_db():
+    """Apply migrations, then backfill each derived column in batches"""
+    migrate_properties_table()
+
+    bedrooms_count = backfill_bedrooms()
+    print(f"Backfilled bedrooms for {bedrooms_count} properties")
+
+    geodata_count = backfill_geodata()
+    print(f"Geocoded {geodata_count} properties")
+
+    print("Backfill completed")
+
+if __name__ == '__main__':
+    backfill_db()
@@ -0,0 +1 @@
+"""Benchmarks for the ingest and parsing hot paths - run as python -m benchmarks.<name>"""
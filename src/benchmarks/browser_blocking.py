@@ -0,0 +1,67 @@
+"""
+Benchmark: browser page loads with and without request blocking
+
+Loads the same listing pages through a BrowserPool twice - once the way the
+scraper used to (normal page-load strategy, nothing blocked) and once with the
+eager strategy and the configured blocklist - and prints load time and bytes
+transferred per page for each. Needs Chrome and chromedriver:
+
+    python -m benchmarks.browser_blocking [url ...]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetcher import BrowserPool, PAGE_LOAD_STRATEGY, blocked_url_patterns, format_bytes
+from scraper import BASE_URL, listing_page_ready
+
+DEFAULT_PATHS = (
+    '10-seminary-apt-2', '31-leroy-apt-4', '68-chapin-apt-2l', '41-leroy-apt-1',
+    '44-murray', '18-seminary', '13-seminary', '97-chapin',
+)
+
+CONFIGURATIONS = (
+    ('baseline', {'block_resources': False, 'page_load_strategy': 'normal'}),
+    ('blocking', {'block_resources': True, 'page_load_strategy': PAGE_LOAD_STRATEGY}),
+)
+
+
+def run(urls, name, options):
+    pool = BrowserPool(size=1, ready=listing_page_ready, **options)
+    try:
+        # Warm the driver up so startup isn't counted against the first page
+        pool.fetch('about:blank')
+        rows = []
+        for url in urls:
+            start = time.perf_counter()
+            result = pool.fetch(url)
+            rows.append((url, time.perf_counter() - start, result['load_ms'], result['bytes'], result['error']))
+    finally:
+        pool.quit()
+
+    print(f"\n{name}: {options}")
+    for url, elapsed, load_ms, size, error in rows:
+        load = f"{load_ms:.0f}ms" if load_ms is not None else '?'
+        print(f"  {elapsed:6.2f}s  load {load:>7}  {format_bytes(size):>7}  {url}" + (f"  ({error})" if error else ''))
+    ok = [row for row in rows if not row[4]]
+    if ok:
+        print(f"  mean {sum(row[1] for row in ok) / len(ok):.2f}s, "
+              f"{format_bytes(sum(row[3] or 0 for row in ok) // len(ok))}/page over {len(ok)} pages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('urls', nargs='*', default=[f"{BASE_URL}/{path}" for path in DEFAULT_PATHS])
+    args = parser.parse_args()
+
+    print(f"Blocked patterns: {', '.join(blocked_url_patterns())}")
+    for name, options in CONFIGURATIONS:
+        run(args.urls, name, options)
+
+
+if __name__ == '__main__':
+    main()
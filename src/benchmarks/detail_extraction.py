@@ -0,0 +1,352 @@
+"""
+Benchmark: single-pass lxml extraction vs the original BeautifulSoup extractor
+
+Runs extraction.extract_listing and the detail extractor it replaced (kept below
+verbatim) over a corpus of listing pages, checks that both produce the same
+fields for every page, and prints parse time per page for each. The default
+corpus is fixtures/listing_pages; add real pages with --corpus, e.g. the
+scraper's HTTP cache directory (bodies are stored as *.body):
+
+    python -m benchmarks.detail_extraction --corpus "$HTTP_CACHE_DIR" --repeat 20
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from extraction import extract_bedrooms, extract_listing, format_address_from_url
+from scraper import BASE_URL
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'listing_pages')
+FIELDS = ('price', 'availability', 'bedrooms', 'amenities', 'description')
+
+
+def legacy_extract_details(content, url):
+    """The extraction half of extract_property_details before the lxml rewrite"""
+    title = format_address_from_url(url.split("/")[-1])
+    soup = BeautifulSoup(content, 'html.parser')
+    
+    # Extract details from the page
+    raw_amenities = []
+    description = ""
+    property_details_found = False
+    
+    # Extract from any property detail section on the page
+    # Method 1: Look for specific sections or divs with property details
+    for section in soup.find_all(['div', 'section']):
+        section_text = section.get_text().strip().lower()
+        if 'property' in section_text and ('detail' in section_text or 'feature' in section_text or 'amenities' in section_text):
+            property_details_found = True
+            # Extract all bullet points or paragraphs in this section
+            for elem in section.find_all(['li', 'p']):
+                text = elem.get_text().strip()
+                if text and len(text) > 3 and not text.lower() == 'property details':
+                    raw_amenities.append(text)
+    
+    # Method 2: Look for checkmark lists which often indicate property features
+    if not property_details_found or len(raw_amenities) < 3:
+        checkmark_elements = soup.find_all(['span', 'p', 'div', 'li'], text=re.compile(r'[✓✔]'))
+        if checkmark_elements:
+            for elem in checkmark_elements:
+                feature_text = elem.get_text().strip()
+                if re.match(r'^[✓✔]', feature_text) and len(feature_text) > 2:
+                    # Clean up the checkmark feature text
+                    clean_feature = re.sub(r'^[✓✔]\s*', '', feature_text).strip()
+                    if clean_feature and len(clean_feature) > 3:
+                        raw_amenities.append(clean_feature)
+                        property_details_found = True
+    
+    # Method 3: Look for list items that might contain features
+    if not property_details_found or len(raw_amenities) < 3:
+        feature_keywords = ['bedroom', 'bathroom', 'kitchen', 'living', 'furnished', 'porch', 
+                           'laundry', 'pet', 'bus', 'parking', 'storage', 'basement']
+        
+        for li in soup.find_all(['li']):
+            text = li.get_text().strip()
+            if text and any(keyword in text.lower() for keyword in feature_keywords):
+                raw_amenities.append(text)
+                property_details_found = True
+    
+    # Method 4: Look for specific property feature text
+    if not property_details_found or len(raw_amenities) < 3:
+        # Look for paragraphs containing property features
+        feature_patterns = [
+            r'\b(one|1|two|2|three|3|four|4)\s+bedroom',
+            r'\bbig\s+eat[\s-]in\s+kitchen\b',
+            r'\bliving\s+room\b',
+            r'\bfully\s+furnished\b',
+            r'\blaundry\s+available\b',
+            r'\bfront\s+and\s+back\s+porch\b',
+            r'\b(\d+)\s+block\s+to\s+bus\s+stop\b',
+            r'\bparking\b',
+            r'\bpet\s+friendly\b'
+        ]
+        
+        for p in soup.find_all(['p', 'div', 'span']):
+            text = p.get_text().strip()
+            if text:
+                for pattern in feature_patterns:
+                    match = re.search(pattern, text.lower())
+                    if match:
+                        # Extract the specific feature that matched
+                        feature_text = match.group(0)
+                        # Capitalize first letter of each word
+                        feature_text = ' '.join(word.capitalize() for word in feature_text.split())
+                        raw_amenities.append(feature_text)
+                        property_details_found = True
+    
+    # Method 5: Extract from description text
+    description_elements = soup.find_all(['p', 'div'], text=re.compile(r'(description|about this property)', re.I))
+    for elem in description_elements:
+        desc_text = elem.get_text().strip()
+        if len(desc_text) > 50:  # Only use substantial text as description
+            description = desc_text
+            break
+    
+    # Look for price
+    price = "Contact for price"
+    price_pattern = re.compile(r'\$\s*[\d,]+(?:\.\d+)?(?:/[a-zA-Z]+)?')
+    
+    # Check text nodes for price
+    text_nodes = soup.find_all(text=True)
+    for text in text_nodes:
+        match = price_pattern.search(text)
+        if match and len(match.group()) > 1:  # Ensure we have more than just the $ symbol
+            price = match.group()
+            break
+            
+    # Extract availability information
+    availability = None
+    availability_pattern = re.compile(r'(?:available|unavailable) (?:until|from) ([a-zA-Z]+ \d{4})', re.I)
+    
+    for text in text_nodes:
+        match = availability_pattern.search(text)
+        if match:
+            availability = match.group(0)
+            break
+    
+    # Extract bedrooms from URL or title
+    bedrooms = extract_bedrooms(title)
+    
+    # If no bedrooms found, try to extract from page content
+    if not bedrooms:
+        bedroom_pattern = re.compile(r'(\d+)[\s-]bedroom', re.I)
+        for text in text_nodes:
+            match = bedroom_pattern.search(text)
+            if match:
+                bedrooms = int(match.group(1))
+                break
+    
+    # This is the key part that needs improvement - better standardization of amenities
+    standardized_amenities = []
+    amenity_map = {}
+    
+    # Process each raw amenity and add to our mapping
+    for raw_amenity in raw_amenities:
+        clean_text = raw_amenity.strip()
+        if not clean_text:
+            continue
+            
+        lower_text = clean_text.lower()
+        
+        # Key categories to detect and standardize
+        if re.search(r'(one|1)\s+bedroom', lower_text, re.I) or "one bedroom" in lower_text:
+            amenity_map["bedrooms"] = "One Bedroom"
+        elif re.search(r'(two|2)\s+large?\s+bedroom', lower_text, re.I):
+            amenity_map["bedrooms"] = "Two Large Bedrooms"
+        elif re.search(r'(two|2)\s+bedroom', lower_text, re.I) or "two bedrooms" in lower_text:
+            amenity_map["bedrooms"] = "Two Bedrooms"
+        elif re.search(r'(three|3)\s+bedroom', lower_text, re.I) or "three bedrooms" in lower_text:
+            amenity_map["bedrooms"] = "Three Bedrooms"
+        elif re.search(r'(four|4)\s+bedroom', lower_text, re.I) or "four bedrooms" in lower_text:
+            amenity_map["bedrooms"] = "Four Bedrooms"
+        elif "bedroom" in lower_text and not any(x in amenity_map for x in ["bedrooms"]):
+            amenity_map["bedrooms"] = clean_text
+            
+        # Bathroom
+        elif re.search(r'(one|1)\s+bathroom', lower_text, re.I) or "one bathroom" in lower_text:
+            amenity_map["bathroom"] = "One Bathroom"
+        elif re.search(r'(two|2)\s+bathroom', lower_text, re.I) or "two bathrooms" in lower_text:
+            amenity_map["bathroom"] = "Two Bathrooms"
+        elif "bathroom" in lower_text and not "bathroom" in amenity_map:
+            amenity_map["bathroom"] = clean_text
+            
+        # Kitchen
+        elif re.search(r'kitchen\s+with\s+dining', lower_text, re.I) or "kitchen with dining" in lower_text:
+            amenity_map["kitchen"] = "Kitchen with Dining Area"
+        elif "eat-in kitchen" in lower_text or "eat in kitchen" in lower_text:
+            amenity_map["kitchen"] = "Big Eat-In Kitchen"
+        elif "kitchen" in lower_text and not "kitchen" in amenity_map:
+            amenity_map["kitchen"] = "Kitchen"
+            
+        # Living areas
+        elif "living room" in lower_text:
+            amenity_map["living"] = "Living Room"
+        elif "dining area" in lower_text and not "kitchen" in amenity_map:
+            amenity_map["dining"] = "Dining Area"
+        elif "dining room" in lower_text:
+            amenity_map["dining"] = "Dining Room"
+        elif "bonus room" in lower_text:
+            amenity_map["bonus"] = "Bonus Room"
+            
+        # Features
+        elif "enclosed yard" in lower_text:
+            amenity_map["yard"] = "Enclosed Yard"
+        elif "furnished" in lower_text:
+            amenity_map["furnished"] = "Furnished"
+        elif "pet friendly" in lower_text or "pets allowed" in lower_text:
+            amenity_map["pets"] = "Pet Friendly"
+        elif re.search(r'(\d+)\s+block\s+to\s+bus', lower_text, re.I) or "block to bus stop" in lower_text:
+            amenity_map["bus"] = "1 Block to Bus Stop"
+        elif "washer" in lower_text and "dryer" in lower_text:
+            amenity_map["laundry"] = "Washer & Dryer"
+        elif "laundry" in lower_text:
+            amenity_map["laundry"] = "Laundry Available"
+        elif "front porch" in lower_text:
+            amenity_map["porch"] = "Front Porch"
+        elif "porch" in lower_text:
+            amenity_map["porch"] = clean_text
+    
+    # Build the standardized amenities list from our mapping
+    if bedrooms == 1 and "bedrooms" not in amenity_map:
+        standardized_amenities.append("One Bedroom")
+    elif bedrooms == 2 and "bedrooms" not in amenity_map:
+        standardized_amenities.append("Two Bedrooms")
+    elif "bedrooms" in amenity_map:
+        standardized_amenities.append(amenity_map["bedrooms"])
+        
+    if "bathroom" in amenity_map:
+        standardized_amenities.append(amenity_map["bathroom"])
+    else:
+        standardized_amenities.append("One Bathroom")
+        
+    if "kitchen" in amenity_map:
+        standardized_amenities.append(amenity_map["kitchen"])
+    else:
+        standardized_amenities.append("Kitchen")
+        
+    if "living" in amenity_map:
+        standardized_amenities.append(amenity_map["living"])
+    else:
+        standardized_amenities.append("Living Room")
+        
+    # Add the rest of the amenities
+    for key, value in amenity_map.items():
+        if key not in ["bedrooms", "bathroom", "kitchen", "living"] and value not in standardized_amenities:
+            standardized_amenities.append(value)
+            
+    # Add other standard amenities if not found - based on property pattern
+    standard_amenities = [
+        "Pet Friendly",
+        "1 Block to Bus Stop"
+    ]
+    
+    for amenity in standard_amenities:
+        if amenity.lower() not in [a.lower() for a in standardized_amenities]:
+            standardized_amenities.append(amenity)
+            
+    # If we couldn't get a good set of amenities, add these defaults
+    if len(standardized_amenities) < 3:
+        default_amenities = [
+            "Kitchen",
+            "Living Room",
+            "Fully Furnished",
+            "Pet Friendly",
+            "1 Block to Bus Stop"
+        ]
+        for amenity in default_amenities:
+            if amenity not in standardized_amenities:
+                standardized_amenities.append(amenity)
+    
+    # If no description available, generate one based on amenities
+    if not description or description.lower() == "no description available.":
+        if standardized_amenities:
+            property_type = "apartment" if "apt" in title.lower() else "property"
+            bedrooms_text = f"{bedrooms} bedroom" if bedrooms and bedrooms == 1 else f"{bedrooms} bedrooms" if bedrooms else ""
+            
+            description = f"This {bedrooms_text} {property_type} at {title} features "
+            
+            if len(standardized_amenities) > 1:
+                description += ", ".join(standardized_amenities[:-1]) + " and " + standardized_amenities[-1] + "."
+            else:
+                description += standardized_amenities[0] + "."
+        else:
+            description = "No description available. Contact the property manager for more details."
+    
+    return {
+        "price": price,
+        "availability": availability,
+        "bedrooms": bedrooms,
+        "amenities": standardized_amenities,
+        "description": description,
+    }
+
+
+def lxml_extract_details(content, url):
+    return extract_listing(content, url)
+
+
+def load_corpus(directories):
+    """(name, url, content) for every .html / .body file under the directories"""
+    pages = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if not name.endswith(('.html', '.body')):
+                    continue
+                with open(os.path.join(root, name), 'rb') as f:
+                    content = f.read()
+                # Fixtures are named after the listing slug; cached bodies aren't, so use a stand-in
+                slug = name.rsplit('.', 1)[0] if name.endswith('.html') else 'cached-page'
+                pages.append((name, f"{BASE_URL}/{slug}", content))
+    return pages
+
+
+def timed(fn, pages, repeat):
+    """Mean seconds per page over `repeat` passes, and the last pass's results"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [fn(content, url) for _, url, content in pages]
+    return (time.perf_counter() - start) / (repeat * len(pages)), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', nargs='*', default=[], help="extra directories of pages")
+    parser.add_argument('--no-fixtures', action='store_true', help="skip the bundled fixture pages")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    pages = load_corpus(([] if args.no_fixtures else [FIXTURES_DIR]) + args.corpus)
+    if not pages:
+        parser.error("empty corpus")
+    size = sum(len(content) for _, _, content in pages)
+    print(f"{len(pages)} pages, {size / 1024:.0f}KB, {args.repeat} passes (base {BASE_URL})")
+
+    legacy_time, legacy_results = timed(legacy_extract_details, pages, args.repeat)
+    lxml_time, lxml_results = timed(lxml_extract_details, pages, args.repeat)
+
+    mismatches = 0
+    for (name, _, _), expected, actual in zip(pages, legacy_results, lxml_results):
+        differing = [field for field in FIELDS if expected[field] != actual[field]]
+        if differing:
+            mismatches += 1
+            print(f"MISMATCH {name}:")
+            for field in differing:
+                print(f"  {field}: {expected[field]!r} != {actual[field]!r}")
+
+    print(f"{'extractor':>10} {'ms/page':>10}")
+    print(f"{'legacy':>10} {legacy_time * 1000:>10.2f}")
+    print(f"{'lxml':>10} {lxml_time * 1000:>10.2f}")
+    print(f"speedup {legacy_time / lxml_time:.1f}x, {len(pages) - mismatches}/{len(pages)} pages identical")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: per-row vs bulk listing upserts
+
+Compares the original save_to_database loop (its own INSERT ... ON CONFLICT
+statement and one COMMIT per listing, copied here as ROWWISE_UPSERT) with the
+COPY + staging-table bulk path. Each size is run three times per path: a cold
+run that inserts every row, an update run with every listing's price changed,
+and an unchanged run that saves the same listings again - the bulk path skips
+those rows on content_hash, the per-row path rewrites them as it always did.
+
+Writes synthetic rows under a unique url prefix and deletes them afterwards,
+but still run it against a development database:
+
+    python -m benchmarks.save_to_database --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.db import create_properties_table, get_connection, save_to_database
+from geocoder import geocode_listing
+from normalizer import normalize_bedrooms, parse_price_value
+
+STREETS = ('Leroy St', 'Seminary Ave', 'Chapin St', 'Murray St', 'Main St', 'Oak St')
+
+
+def synthetic_listings(count, prefix, price_offset=0):
+    for i in range(count):
+        street = STREETS[i % len(STREETS)]
+        title = f"{i % 200 + 1} {street} Apt {i % 4 + 1}"
+        yield {
+            'title': title,
+            'price': f"${600 + i % 900 + price_offset:,}",
+            'location': title,
+            'url': f"{prefix}/{i}",
+            'bedrooms': i % 4 + 1,
+            'image_url': f"{prefix}/img/{i}.jpg",
+            'map_image_url': None,
+        }
+
+
+# The statement save_to_database ran per listing before the bulk path: no
+# content_hash skip, so an unchanged listing is rewritten like any other
+ROWWISE_UPSERT = '''
+INSERT INTO properties (title, price, price_value, location, url, bedrooms, image_url, map_image_url,
+                        latitude, longitude, distance)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (url) DO UPDATE
+SET title = EXCLUDED.title,
+    price = EXCLUDED.price,
+    price_value = EXCLUDED.price_value,
+    location = EXCLUDED.location,
+    bedrooms = EXCLUDED.bedrooms,
+    image_url = EXCLUDED.image_url,
+    map_image_url = EXCLUDED.map_image_url,
+    latitude = EXCLUDED.latitude,
+    longitude = EXCLUDED.longitude,
+    distance = EXCLUDED.distance
+'''
+
+
+def save_rowwise(listings):
+    """The pre-bulk save_to_database: geocode, one upsert and one commit per listing"""
+    conn = get_connection()
+    cur = conn.cursor()
+    for listing in listings:
+        try:
+            geo = geocode_listing(listing['location'], listing['title'])
+            cur.execute(ROWWISE_UPSERT, (
+                listing['title'],
+                listing['price'],
+                listing.get('price_value', parse_price_value(listing['price'])),
+                listing['location'],
+                listing['url'],
+                normalize_bedrooms(listing.get('bedrooms'), listing['title']),
+                listing.get('image_url'),
+                listing.get('map_image_url'),
+                geo['latitude'],
+                geo['longitude'],
+                geo['distance']
+            ))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Error saving {listing['title']}: {e}")
+    cur.close()
+    conn.close()
+
+
+def delete_prefix(prefix):
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM properties WHERE url LIKE %s", (prefix + '/%',))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def timed(fn, listings):
+    start = time.perf_counter()
+    fn(listings)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--skip-rowwise-above', type=int, default=None,
+                        help="skip the per-row path for sizes above this (it is slow at 100k)")
+    args = parser.parse_args()
+
+    create_properties_table()
+    run_id = f"{os.getpid()}-{int(time.time())}"
+
+    print(f"{'rows':>8} {'path':>8} {'insert s':>10} {'update s':>10} {'update rows/s':>14} {'unchanged s':>12}")
+    for size in args.sizes:
+        paths = [('bulk', lambda rows: save_to_database(rows))]
+        if args.skip_rowwise_above is None or size <= args.skip_rowwise_above:
+            paths.insert(0, ('rowwise', save_rowwise))
+
+        for name, fn in paths:
+            prefix = f"https://bench.invalid/{run_id}/{name}/{size}"
+            listings = list(synthetic_listings(size, prefix))
+            changed = list(synthetic_listings(size, prefix, price_offset=50))
+            try:
+                cold = timed(fn, listings)
+                update = timed(fn, changed)
+                unchanged = timed(fn, changed)
+            finally:
+                delete_prefix(prefix)
+            print(f"{size:>8} {name:>8} {cold:>10.2f} {update:>10.2f} {size / update:>14.0f} {unchanged:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
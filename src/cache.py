@@ -0,0 +1,440 @@
+"""
+Query result cache
+
+This module:
+1. Provides a bounded LRU cache whose entries also expire after a TTL
+2. Tracks a data generation that every write path bumps, so cached
+   results from before a write are never served after it
+3. Optionally shares cached payloads and the generation across worker
+   processes through Redis, with pub/sub invalidation backed by a periodic
+   re-read of the shared generation; without Redis (or while it is down)
+   everything stays in-process
+"""
+
+import hashlib
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+LISTINGS_CACHE_SIZE = int(os.environ.get('LISTINGS_CACHE_SIZE', 256))
+LISTINGS_CACHE_TTL = float(os.environ.get('LISTINGS_CACHE_TTL', 300))
+PROPERTY_CACHE_SIZE = int(os.environ.get('PROPERTY_CACHE_SIZE', 512))
+PROPERTY_CACHE_TTL = float(os.environ.get('PROPERTY_CACHE_TTL', 600))
+
+# e.g. redis://redis:6379/0 - leave unset to cache in-process only
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHE_KEY_PREFIX = 'housing'
+GENERATION_KEY = f'{CACHE_KEY_PREFIX}:generation'
+INVALIDATION_CHANNEL = f'{CACHE_KEY_PREFIX}:invalidate'
+
+# Cache reads and writes give up quickly so a slow Redis can't stall requests
+REDIS_SOCKET_TIMEOUT = 0.5
+# Seconds between attempts to reach Redis after it was unavailable
+REDIS_RETRY_INTERVAL = float(os.environ.get('REDIS_RETRY_INTERVAL', 30))
+# How often each process re-reads the shared generation, in case it missed an invalidation
+GENERATION_SYNC_INTERVAL = float(os.environ.get('CACHE_GENERATION_SYNC_INTERVAL', 1))
+# How long the invalidation listener waits for a message before checking it should still run
+LISTEN_POLL_INTERVAL = 1.0
+LISTEN_RETRY_DELAY = 5
+
+# Payloads larger than this are zlib-compressed before going to Redis
+COMPRESS_THRESHOLD = 1024
+
+_generation = 0
+_generation_lock = threading.Lock()
+_generation_synced_at = 0.0
+
+
+def current_generation():
+    sync_generation()
+    return _generation
+
+
+def _observe_generation(generation):
+    """Adopt a generation announced by another process if it is newer"""
+    global _generation
+    with _generation_lock:
+        if generation > _generation:
+            _generation = generation
+
+
+def bump_generation():
+    """Mark all cached query results stale - call after any write to properties"""
+    global _generation
+    client = get_shared_client()
+    if client is not None:
+        try:
+            generation = int(client.incr(GENERATION_KEY))
+            client.publish(INVALIDATION_CHANNEL, generation)
+            _observe_generation(generation)
+            return _generation
+        except Exception as e:
+            print(f"Error bumping shared cache generation: {e}")
+    with _generation_lock:
+        _generation += 1
+        return _generation
+
+
+class InMemoryRedis:
+    """
+    Stand-in for the subset of the redis client the cache uses.
+
+    Lets the shared tier and its pub/sub invalidation be exercised without a
+    Redis server - several TieredCache users sharing one instance behave like
+    workers sharing one Redis.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        expires_at = time.monotonic() + ex if ex else None
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[key] = (value, expires_at)
+        return True
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._data.get(key, (b'0', None))[0]) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = [q for ch, q in self._subscribers if ch == channel]
+        for q in subscribers:
+            q.put({'type': 'message', 'channel': channel.encode(), 'data': str(message).encode()})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        return _InMemoryPubSub(self)
+
+
+class _InMemoryPubSub:
+    def __init__(self, server):
+        self._server = server
+        self._queue = queue.Queue()
+
+    def subscribe(self, channel):
+        with self._server._lock:
+            self._server._subscribers.append((channel, self._queue))
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self._server._lock:
+            self._server._subscribers = [(ch, q) for ch, q in self._server._subscribers if q is not self._queue]
+
+
+_shared_client = None
+_shared_pid = None
+_shared_retry_at = 0.0
+_shared_lock = threading.Lock()
+_connect_lock = threading.Lock()
+
+
+def configure_shared_cache(client, listener_client=None):
+    """
+    Use `client` (a redis.Redis or InMemoryRedis) as the shared tier.
+
+    Syncs the local generation with the shared one and starts a daemon
+    thread that applies invalidations published by other processes, over
+    `listener_client` if given (pub/sub waits on its socket between
+    messages, so it needs a connection without the short read timeout).
+    Pass None to go back to in-process caching.
+    """
+    global _shared_client, _shared_pid, _shared_retry_at
+    with _shared_lock:
+        _shared_client = client
+        _shared_pid = os.getpid()
+        _shared_retry_at = float('inf')
+    if client is None:
+        return
+
+    _sync_generation(client, force=True)
+    listener = threading.Thread(target=_listen_for_invalidations, args=(client, listener_client or client),
+                                daemon=True)
+    listener.start()
+
+
+def _sync_generation(client, force=False):
+    """Adopt the shared generation, reading it at most every GENERATION_SYNC_INTERVAL seconds"""
+    global _generation_synced_at
+    now = time.monotonic()
+    if not force and now - _generation_synced_at < GENERATION_SYNC_INTERVAL:
+        return
+    _generation_synced_at = now
+    try:
+        shared_generation = client.get(GENERATION_KEY)
+        if shared_generation is not None:
+            _observe_generation(int(shared_generation))
+    except Exception as e:
+        print(f"Error reading shared cache generation: {e}")
+
+
+def sync_generation():
+    """Backstop for missed invalidations - the listener normally keeps the generation current"""
+    client = get_shared_client()
+    if client is not None:
+        _sync_generation(client)
+
+
+def _listen_for_invalidations(client, listener_client):
+    while _shared_client is client:
+        try:
+            pubsub = listener_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Catch up on bumps published while (re)subscribing
+            _sync_generation(client, force=True)
+            try:
+                while _shared_client is client:
+                    # An empty poll is normal; it lets the loop notice reconfiguration
+                    message = pubsub.get_message(timeout=LISTEN_POLL_INTERVAL)
+                    if message is not None and message.get('type') == 'message':
+                        _observe_generation(int(message['data']))
+            finally:
+                pubsub.close()
+        except Exception as e:
+            print(f"Cache invalidation listener error, retrying: {e}")
+            time.sleep(LISTEN_RETRY_DELAY)
+
+
+def get_shared_client():
+    """
+    The shared cache client for this process, connecting to REDIS_URL on first use.
+
+    While Redis can't be reached the process caches in-process, trying
+    again every REDIS_RETRY_INTERVAL seconds.
+    """
+    global _shared_retry_at
+    if _shared_pid == os.getpid() and (_shared_client is not None or time.monotonic() < _shared_retry_at):
+        return _shared_client
+    if not (REDIS_URL and REDIS_AVAILABLE):
+        configure_shared_cache(None)
+        return None
+    # One thread connects; the others carry on without the shared tier meanwhile
+    if not _connect_lock.acquire(blocking=False):
+        return _shared_client if _shared_pid == os.getpid() else None
+
+    try:
+        try:
+            client = redis.Redis.from_url(REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT,
+                                          socket_connect_timeout=REDIS_SOCKET_TIMEOUT)
+            client.ping()
+            listener_client = redis.Redis.from_url(REDIS_URL, socket_timeout=None,
+                                                   socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                                                   health_check_interval=30)
+        except Exception as e:
+            print(f"Redis unavailable at {REDIS_URL}, caching in-process only "
+                  f"(retrying in {REDIS_RETRY_INTERVAL:g}s): {e}")
+            configure_shared_cache(None)
+            _shared_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+            return None
+        configure_shared_cache(client, listener_client)
+        return client
+    finally:
+        _connect_lock.release()
+
+
+def encode_payload(payload):
+    """Compact a serialized payload for Redis - small ones stay raw"""
+    data = payload.encode() if isinstance(payload, str) else payload
+    if len(data) > COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(data, 6)
+    return b'r' + data
+
+
+def decode_payload(data):
+    if data[:1] == b'z':
+        return zlib.decompress(data[1:]).decode()
+    return data[1:].decode()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and generation checks.
+
+    An entry is only served if it is younger than `ttl` seconds and was
+    stored under the current data generation. Pass generational=False for
+    values that don't come from the database (e.g. link checks), which only
+    expire.
+    """
+
+    def __init__(self, max_entries, ttl, generational=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generational = generational
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expired': 0,
+            'invalidated': 0,
+        }
+
+    def get(self, key):
+        """
+        Look up a cached value.
+
+        Returns:
+            tuple: (hit, value) - value is None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, value = entry
+                if self.generational and generation != _generation:
+                    del self._entries[key]
+                    self._stats['invalidated'] += 1
+                elif expires_at <= now:
+                    del self._entries[key]
+                    self._stats['expired'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return True, value
+            self._stats['misses'] += 1
+            return False, None
+
+    def set(self, key, value, generation=None):
+        """
+        Store a value.
+
+        Pass the generation read before running the query so a write that
+        lands mid-query leaves the entry already stale.
+        """
+        if self.max_entries <= 0:
+            return
+        if generation is None:
+            generation = _generation
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['generation'] = _generation
+        return stats
+
+
+class TieredCache:
+    """
+    In-process TTLCache in front of the optional shared Redis tier.
+
+    Values are serialized JSON strings. A local miss falls through to Redis,
+    where keys embed the generation, so a bump makes every older entry
+    unreachable without deleting anything.
+    """
+
+    def __init__(self, namespace, local):
+        self.namespace = namespace
+        self.local = local
+        self._stats = {'shared_hits': 0, 'shared_misses': 0, 'shared_errors': 0}
+
+    def _shared_key(self, key, generation):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f'{CACHE_KEY_PREFIX}:{self.namespace}:{generation}:{digest}'
+
+    def get(self, key):
+        sync_generation()
+        hit, value = self.local.get(key)
+        if hit:
+            return True, value
+
+        client = get_shared_client()
+        if client is None:
+            return False, None
+
+        generation = _generation
+        try:
+            data = client.get(self._shared_key(key, generation))
+        except Exception as e:
+            self._stats['shared_errors'] += 1
+            print(f"Shared cache read failed: {e}")
+            return False, None
+        if data is None:
+            self._stats['shared_misses'] += 1
+            return False, None
+
+        self._stats['shared_hits'] += 1
+        value = decode_payload(data)
+        self.local.set(key, value, generation)
+        return True, value
+
+    def set(self, key, value, generation=None):
+        if generation is None:
+            generation = _generation
+        self.local.set(key, value, generation)
+
+        # Don't publish a result that a write has already made stale
+        client = get_shared_client()
+        if client is None or generation != _generation:
+            return
+        try:
+            client.set(self._shared_key(key, generation), encode_payload(value), ex=int(self.local.ttl))
+        except Exception as e:
+            self._stats['shared_errors'] += 1
+            print(f"Shared cache write failed: {e}")
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        stats = self.local.stats()
+        stats.update(self._stats)
+        stats['backend'] = 'redis' if get_shared_client() is not None else 'local'
+        return stats
+
+
+# Cache for /housing/api/listings responses, keyed on the normalized query
+listings_cache = TieredCache('listings', TTLCache(LISTINGS_CACHE_SIZE, LISTINGS_CACHE_TTL))
+
+# Cache for /housing/api/properties/<id> responses
+property_cache = TieredCache('property', TTLCache(PROPERTY_CACHE_SIZE, PROPERTY_CACHE_TTL))
@@ -1,12 +1,19 @@
 # configuration.py
 
+import os
+
 DB_PARAMS = {
-    'host': 'database',  # Using container name in Docker network
-    'database': 'test_db',
-    'user': 'postgres',
-    'password': 'team13'
+    'host': os.environ.get('POSTGRES_HOST', 'database'),  # Using container name in Docker network
+    'database': os.environ.get('POSTGRES_DB', 'test_db'),
+    'user': os.environ.get('POSTGRES_USER', 'postgres'),
+    'password': os.environ.get('POSTGRES_PASSWORD', 'team13')
 }
 
+# Connection pool sizing - these limits apply per worker process
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
 BASE_URL = 'https://www.binghamtonwest.com'
 TARGET_URL = f'{BASE_URL}/school/binghamton-university'
 
@@ -6,11 +6,229 @@
 # - Handle database errors
 """ 
 
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
 import psycopg2
-from .configuration import DB_PARAMS
+import psycopg2.extensions
+import psycopg2.extras
+from .configuration import DB_PARAMS, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT
+
+try:
+    from normalizer import parse_price_value, normalize_bedrooms, infer_bedrooms
+    from geocoder import geocode_listing
+    from cache import bump_generation
+except ImportError:
+    from src.normalizer import parse_price_value, normalize_bedrooms, infer_bedrooms
+    from src.geocoder import geocode_listing
+    from src.cache import bump_generation
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no pooled connection frees up within the checkout timeout."""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connection whose close() hands it back to the pool it came from."""
+
+    def close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            return super().close()
+        pool.putconn(self)
+
+    def discard(self):
+        """Really close the underlying connection."""
+        self._pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections.
+
+    Idle connections are reused LIFO so the warmest one is handed out first.
+    When every connection is checked out, callers wait up to `timeout` seconds
+    for one to be returned before PoolTimeoutError is raised.
+    """
+
+    def __init__(self, min_size, max_size, timeout, **conn_params):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.conn_params = conn_params
+        self._idle = []
+        self._in_use = set()
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+        }
+        for _ in range(min(min_size, self.max_size)):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.conn_params)
+        conn._pool = self
+        conn._owner = None
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def getconn(self):
+        """Check out a connection, waiting for one to be returned if the pool is full"""
+        deadline = None
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn = self._idle.pop()
+                    if conn.closed:
+                        self._stats['discarded'] += 1
+                        continue
+                    return self._checkout(conn)
+
+                if len(self._in_use) < self.max_size:
+                    # Reserve the slot before connecting outside the lock
+                    placeholder = object()
+                    self._in_use.add(placeholder)
+                    break
+
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"({self.max_size} in use)"
+                    )
+                waited_from = time.monotonic()
+                self._cond.wait(remaining)
+                self._stats['wait_time_total'] += time.monotonic() - waited_from
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use.discard(placeholder)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.discard(placeholder)
+            return self._checkout(conn)
+
+    def _checkout(self, conn):
+        self._in_use.add(conn)
+        self._stats['checkouts'] += 1
+        conn._owner = threading.get_ident()
+        return conn
+
+    def putconn(self, conn):
+        """Return a connection to the pool, resetting any open transaction"""
+        reusable = not conn.closed
+        if reusable:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                reusable = False
+
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            conn._owner = None
+            if reusable:
+                self._idle.append(conn)
+            else:
+                self._stats['discarded'] += 1
+            self._cond.notify()
+
+        if not reusable and not conn.closed:
+            conn.discard()
+
+    def release_thread_connections(self):
+        """Return every connection the current thread still holds (e.g. after an exception)"""
+        ident = threading.get_ident()
+        with self._cond:
+            owned = [conn for conn in self._in_use if getattr(conn, '_owner', None) == ident]
+        for conn in owned:
+            self.putconn(conn)
+        return len(owned)
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['in_use'] = len(self._in_use)
+            stats['idle'] = len(self._idle)
+        stats['min_size'] = self.min_size
+        stats['max_size'] = self.max_size
+        stats['timeout'] = self.timeout
+        stats['avg_wait_ms'] = round(stats['wait_time_total'] * 1000 / stats['waits'], 2) if stats['waits'] else 0.0
+        stats['wait_time_total'] = round(stats['wait_time_total'], 4)
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get this process's connection pool, creating it on first use (and again after a fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT, **DB_PARAMS)
+                _pool_pid = pid
+    return _pool
+
+
+def get_connection(autocommit=False):
+    """
+    Check out a pooled database connection.
+
+    Calling close() on the returned connection gives it back to the pool.
+    """
+    conn = get_pool().getconn()
+    if autocommit:
+        conn.autocommit = True
+    return conn
+
+
+def release_thread_connections():
+    """Give back any connections the current thread forgot to close"""
+    if _pool is None or _pool_pid != os.getpid():
+        return 0
+    return _pool.release_thread_connections()
+
+
+def pool_stats():
+    """Checkout/wait/in-use counters for sizing the pool"""
+    return get_pool().stats()
 
 def create_properties_table():
-    conn = psycopg2.connect(**DB_PARAMS)
+    conn = get_connection()
     cur = conn.cursor()
     cur.execute('''
     CREATE TABLE IF NOT EXISTS properties (
@@ -22,66 +240,1006 @@ def create_properties_table():
         bedrooms INTEGER,
         image_url TEXT,
         map_image_url TEXT,
+        price_value INTEGER,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        distance DOUBLE PRECISION,
+        content_hash TEXT,
+        active BOOLEAN NOT NULL DEFAULT TRUE,
+        retired_at TIMESTAMP,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     ''')
     conn.commit()
     cur.close()
     conn.close()
+    migrate_properties_table()
+
+# Idempotent schema changes layered on top of the original properties table.
+# Append new steps at the end - every statement must be safe to re-run.
+PROPERTIES_MIGRATIONS = [
+    # Parsed monthly rent so price filters and sorts can run in SQL
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS price_value INTEGER",
+    "CREATE INDEX IF NOT EXISTS idx_properties_price_value ON properties (price_value, id)",
+    # Matches ORDER BY price_value DESC NULLS LAST, id DESC for keyset paging,
+    # replacing the earlier (price_value DESC NULLS LAST, id ASC) index
+    "CREATE INDEX IF NOT EXISTS idx_properties_price_value_id_desc ON properties (price_value DESC NULLS LAST, id DESC)",
+    "DROP INDEX IF EXISTS idx_properties_price_value_desc",
+    # Gazetteer coordinates and haversine miles to campus, filled in at ingest
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION",
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION",
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS distance DOUBLE PRECISION",
+    "CREATE INDEX IF NOT EXISTS idx_properties_distance ON properties (distance, id)",
+    # Incremental scrapes: skip unchanged rows by hash, retire vanished ones instead of deleting
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS content_hash TEXT",
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS active BOOLEAN NOT NULL DEFAULT TRUE",
+    "ALTER TABLE properties ADD COLUMN IF NOT EXISTS retired_at TIMESTAMP",
+    # Scraped detail-page content, keyed on the listing url so it survives the
+    # scraper's truncate-and-reload. Read by the detail API, refreshed in the background
+    '''
+    CREATE TABLE IF NOT EXISTS property_details (
+        url TEXT PRIMARY KEY,
+        bedrooms INTEGER,
+        price TEXT,
+        amenities JSONB,
+        description TEXT,
+        availability TEXT,
+        content_hash TEXT,
+        fetched_at TIMESTAMP,
+        attempted_at TIMESTAMP,
+        last_error TEXT
+    )
+    ''',
+    # Listing urls found by the scraper's discovery stage. lastmod is the
+    # sitemap's value as published; last_changed moves when it (or the url's
+    # bedroom category) changes, and the page is re-fetched once fetched_at
+    # falls behind it. gone_at is set when discovery stops finding the url
+    '''
+    CREATE TABLE IF NOT EXISTS listing_frontier (
+        url TEXT PRIMARY KEY,
+        bedrooms INTEGER,
+        lastmod TEXT,
+        first_seen TIMESTAMP NOT NULL DEFAULT NOW(),
+        last_seen TIMESTAMP NOT NULL DEFAULT NOW(),
+        last_changed TIMESTAMP NOT NULL DEFAULT NOW(),
+        fetched_at TIMESTAMP,
+        gone_at TIMESTAMP
+    )
+    ''',
+    # One row per scraper run, and the status and timings of every url it set
+    # out to fetch. A run still 'running' was interrupted; a restart within the
+    # resume window carries it on instead of starting over
+    '''
+    CREATE TABLE IF NOT EXISTS scrape_runs (
+        id SERIAL PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'running',
+        started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        finished_at TIMESTAMP,
+        resumes INTEGER NOT NULL DEFAULT 0,
+        totals JSONB
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS scrape_run_pages (
+        run_id INTEGER NOT NULL REFERENCES scrape_runs (id) ON DELETE CASCADE,
+        url TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        fetch_path TEXT,
+        fetch_seconds DOUBLE PRECISION,
+        parse_seconds DOUBLE PRECISION,
+        write_seconds DOUBLE PRECISION,
+        error TEXT,
+        completed_at TIMESTAMP,
+        PRIMARY KEY (run_id, url)
+    )
+    ''',
+    # Audit trail of bulk deletes and retires from the cleanup endpoints: what
+    # was asked for and which listing ids it removed
+    '''
+    CREATE TABLE IF NOT EXISTS property_removals (
+        id SERIAL PRIMARY KEY,
+        action TEXT NOT NULL,
+        reason TEXT,
+        criteria JSONB,
+        property_ids INTEGER[] NOT NULL,
+        removed INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+    ''',
+    # Background admin jobs (src/jobs.py), shared by every web worker
+    '''
+    CREATE TABLE IF NOT EXISTS admin_jobs (
+        id SERIAL PRIMARY KEY,
+        kind TEXT NOT NULL,
+        params JSONB,
+        status TEXT NOT NULL,
+        owner TEXT,
+        progress JSONB,
+        report JSONB,
+        error TEXT,
+        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        finished_at TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_admin_jobs_kind_id ON admin_jobs (kind, id)",
+]
+
+def backfill_price_values(cur):
+    """Fill price_value for rows written before the column existed"""
+    cur.execute('''
+    SELECT id, price FROM properties
+    WHERE price_value IS NULL AND price IS NOT NULL
+    ''')
+    updates = []
+    for property_id, price in cur.fetchall():
+        price_value = parse_price_value(price)
+        if price_value is not None:
+            updates.append((property_id, price_value))
+
+    if updates:
+        psycopg2.extras.execute_values(cur, '''
+        UPDATE properties AS p
+        SET price_value = v.price_value
+        FROM (VALUES %s) AS v (id, price_value)
+        WHERE p.id = v.id
+        ''', updates)
+    return len(updates)
 
-def truncate_properties_table():
-    """Truncate the properties table before starting a new scrape."""
-    conn = None # Initialize conn to None
+def backfill_bedrooms(batch_size=500):
+    """
+    Infer bedrooms for existing rows that were saved without a count.
+
+    Rows are walked in id order, one committed batch at a time, so the
+    command can run against a live table.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    last_id = 0
+    updated = 0
     try:
-        conn = psycopg2.connect(**DB_PARAMS)
-        cur = conn.cursor()
-        print("Truncating properties table...")
-        cur.execute('TRUNCATE TABLE properties RESTART IDENTITY CASCADE;')
-        conn.commit()
-        print("Properties table truncated.")
+        while True:
+            cur.execute('''
+            SELECT id, title FROM properties
+            WHERE bedrooms IS NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+            ''', (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for property_id, title in rows:
+                bedrooms = infer_bedrooms(title)
+                if bedrooms is not None:
+                    updates.append((property_id, bedrooms))
+
+            if updates:
+                psycopg2.extras.execute_values(cur, '''
+                UPDATE properties AS p
+                SET bedrooms = v.bedrooms
+                FROM (VALUES %s) AS v (id, bedrooms)
+                WHERE p.id = v.id
+                ''', updates)
+            conn.commit()
+            bump_generation()
+            updated += len(updates)
+        return updated
     except Exception as e:
-        print(f"Error truncating properties table: {e}")
-        if conn:
-            conn.rollback() # Rollback if error occurs
+        conn.rollback()
+        print(f"Error backfilling bedrooms: {e}")
+        raise
     finally:
-        if conn:
-            cur.close()
-            conn.close()
+        cur.close()
+        conn.close()
 
-def save_to_database(listings):
-    conn = psycopg2.connect(**DB_PARAMS)
+def backfill_geodata(batch_size=500):
+    """Geocode existing rows that have no coordinates yet, one committed batch at a time"""
+    conn = get_connection()
     cur = conn.cursor()
+    last_id = 0
+    updated = 0
+    try:
+        while True:
+            cur.execute('''
+            SELECT id, location, title FROM properties
+            WHERE latitude IS NULL AND id > %s
+            ORDER BY id
+            LIMIT %s
+            ''', (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            updates = []
+            for property_id, location, title in rows:
+                geo = geocode_listing(location, title)
+                if geo['latitude'] is not None:
+                    updates.append((property_id, geo['latitude'], geo['longitude'], geo['distance']))
+
+            if updates:
+                psycopg2.extras.execute_values(cur, '''
+                UPDATE properties AS p
+                SET latitude = v.latitude, longitude = v.longitude, distance = v.distance
+                FROM (VALUES %s) AS v (id, latitude, longitude, distance)
+                WHERE p.id = v.id
+                ''', updates)
+            conn.commit()
+            bump_generation()
+            updated += len(updates)
+        return updated
+    except Exception as e:
+        conn.rollback()
+        print(f"Error backfilling geodata: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def migrate_properties_table():
+    """Apply PROPERTIES_MIGRATIONS and backfill derived columns"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for statement in PROPERTIES_MIGRATIONS:
+            cur.execute(statement)
+        backfilled = backfill_price_values(cur)
+        conn.commit()
+        bump_generation()
+        print(f"Properties table migrated ({backfilled} prices backfilled)")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error migrating properties table: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+# Columns written by save_to_database, in staging/COPY order
+LISTING_COLUMNS = (
+    'title', 'price', 'price_value', 'location', 'url', 'bedrooms', 'image_url', 'map_image_url',
+    'latitude', 'longitude', 'distance', 'content_hash'
+)
+
+# Unchanged rows (same content_hash, still active) are left untouched, so a
+# run only writes what actually changed. A retired listing that reappears is
+# reactivated under its original id.
+LISTINGS_UPSERT = '''
+INSERT INTO properties (title, price, price_value, location, url, bedrooms, image_url, map_image_url,
+                        latitude, longitude, distance, content_hash)
+{source}
+ON CONFLICT (url) DO UPDATE 
+SET title = EXCLUDED.title,
+    price = EXCLUDED.price,
+    price_value = EXCLUDED.price_value,
+    location = EXCLUDED.location,
+    bedrooms = EXCLUDED.bedrooms,
+    image_url = EXCLUDED.image_url,
+    map_image_url = EXCLUDED.map_image_url,
+    latitude = EXCLUDED.latitude,
+    longitude = EXCLUDED.longitude,
+    distance = EXCLUDED.distance,
+    content_hash = EXCLUDED.content_hash,
+    active = TRUE,
+    retired_at = NULL
+WHERE properties.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+   OR NOT properties.active
+RETURNING (xmax = 0) AS inserted
+'''
+
+def listing_content_hash(values):
+    """Stable hash of a listing's stored columns, used to skip unchanged rows"""
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def listing_row(listing):
+    """Normalize a scraped listing into a LISTING_COLUMNS tuple, raising ValueError if unusable"""
+    if not listing.get('title'):
+        raise ValueError("missing title")
+    if not listing.get('url'):
+        raise ValueError("missing url")
+    geo = geocode_listing(listing.get('location'), listing['title'])
+    values = (
+        listing['title'],
+        listing.get('price'),
+        listing.get('price_value', parse_price_value(listing.get('price'))),
+        listing.get('location'),
+        listing['url'],
+        normalize_bedrooms(listing.get('bedrooms'), listing['title']),
+        listing.get('image_url'),
+        listing.get('map_image_url'),
+        geo['latitude'],
+        geo['longitude'],
+        geo['distance']
+    )
+    return values + (listing_content_hash(values),)
+
+def _copy_value(value):
+    """Render one value in COPY text format"""
+    if value is None:
+        return '\\N'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+def _copy_rows(cur, table, rows, columns=LISTING_COLUMNS):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+def _bulk_upsert(cur, rows):
+    """
+    COPY rows into a temp staging table and merge them with one upsert.
+
+    Returns:
+        tuple: (inserted, updated)
+    """
+    cur.execute('''
+    CREATE TEMP TABLE properties_staging (
+        title TEXT,
+        price TEXT,
+        price_value INTEGER,
+        location TEXT,
+        url TEXT,
+        bedrooms INTEGER,
+        image_url TEXT,
+        map_image_url TEXT,
+        latitude DOUBLE PRECISION,
+        longitude DOUBLE PRECISION,
+        distance DOUBLE PRECISION,
+        content_hash TEXT
+    ) ON COMMIT DROP
+    ''')
+    _copy_rows(cur, 'properties_staging', rows)
+    cur.execute(f'''
+    WITH merged AS (
+        {LISTINGS_UPSERT.format(source=f"SELECT {', '.join(LISTING_COLUMNS)} FROM properties_staging")}
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged
+    ''')
+    return cur.fetchone()
+
+def _rowwise_upsert(cur, rows, rejected):
+    """
+    Upsert rows one at a time under savepoints, collecting the ones the database refuses.
+
+    Returns:
+        tuple: (inserted, updated)
+    """
+    inserted = updated = 0
+    single = LISTINGS_UPSERT.format(source=f"VALUES ({', '.join(['%s'] * len(LISTING_COLUMNS))})")
+    for row in rows:
+        cur.execute("SAVEPOINT listing_row")
+        try:
+            cur.execute(single, row)
+            result = cur.fetchone()
+            cur.execute("RELEASE SAVEPOINT listing_row")
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT listing_row")
+            rejected.append({'title': row[0], 'url': row[4], 'error': str(e).strip()})
+            continue
+        if result is None:
+            continue
+        if result[0]:
+            inserted += 1
+        else:
+            updated += 1
+    return inserted, updated
+
+def _retire_missing(cur, urls, scope):
+    """Mark active listings matching `scope` (a LIKE pattern) that were not seen in this run"""
+    cur.execute("CREATE TEMP TABLE scrape_seen_urls (url TEXT PRIMARY KEY) ON COMMIT DROP")
+    buffer = io.StringIO(''.join(_copy_value(url) + '\n' for url in urls))
+    cur.copy_expert("COPY scrape_seen_urls (url) FROM STDIN", buffer)
+    cur.execute('''
+    UPDATE properties AS p
+    SET active = FALSE,
+        retired_at = NOW()
+    WHERE p.active
+      AND p.url LIKE %s
+      AND NOT EXISTS (SELECT 1 FROM scrape_seen_urls s WHERE s.url = p.url)
+    ''', (scope,))
+    return cur.rowcount
+
+def save_to_database(listings, retire_scope=None, seen_urls=()):
+    """
+    Apply a scrape run to the properties table in a single transaction.
+
+    Each listing carries a content hash; rows are COPY'd into a staging table
+    and merged with one set-based INSERT ... ON CONFLICT that only touches new
+    or changed listings. If the merge fails as a whole, the batch is retried
+    row by row under savepoints so only the offending rows drop out. When a
+    url appears more than once the last occurrence wins.
+
+    Args:
+        listings (list): Scraped listing dicts.
+        retire_scope (str): LIKE pattern of urls this run covers completely.
+            Active listings in scope that the run did not return are marked
+            inactive rather than deleted, so ids and saved listings survive.
+        seen_urls (iterable): Urls that still exist but were not re-scraped
+            (e.g. unchanged pages), so retire_scope leaves them alone.
+
+    Returns:
+        dict: inserted/updated/unchanged/retired counts and the rejected rows
+            as [{'title', 'url', 'error'}, ...].
+    """
+    rejected = []
+    rows_by_url = {}
     for listing in listings:
         try:
-            cur.execute('''
-            INSERT INTO properties (title, price, location, url, bedrooms, image_url, map_image_url)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (url) DO UPDATE 
-            SET title = EXCLUDED.title,
-                price = EXCLUDED.price,
-                location = EXCLUDED.location,
-                bedrooms = EXCLUDED.bedrooms,
-                image_url = EXCLUDED.image_url,
-                map_image_url = EXCLUDED.map_image_url
-            ''', (
-                listing['title'],
-                listing['price'],
-                listing['location'],
-                listing['url'],
-                listing['bedrooms'],
-                listing.get('image_url'),
-                listing.get('map_image_url')
-            ))
+            row = listing_row(listing)
+        except Exception as e:
+            rejected.append({'title': listing.get('title'), 'url': listing.get('url'), 'error': str(e)})
+            continue
+        rows_by_url[row[4]] = row
+    rows = list(rows_by_url.values())
+    invalid = len(rejected)
+
+    inserted = updated = retired = 0
+    if rows or retire_scope:
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            try:
+                if rows:
+                    inserted, updated = _bulk_upsert(cur, rows)
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f"Bulk upsert failed ({e}), retrying row by row")
+                inserted, updated = _rowwise_upsert(cur, rows, rejected)
+
+            # Rejected rows were still seen - a bad scrape of a listing must not retire it
+            if retire_scope:
+                seen = set(rows_by_url) | {row['url'] for row in rejected if row['url']} | set(seen_urls)
+                retired = _retire_missing(cur, seen, retire_scope)
             conn.commit()
         except Exception as e:
             conn.rollback()
-            print(f"Error saving {listing['title']}: {e}")
-    cur.close()
-    conn.close()
+            print(f"Error saving listings: {e}")
+            raise
+        finally:
+            cur.close()
+            conn.close()
+        if inserted or updated or retired:
+            bump_generation()
+
+    report = {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': len(rows) - inserted - updated - (len(rejected) - invalid),
+        'retired': retired,
+        'rejected': rejected,
+    }
+    for row in rejected:
+        print(f"Error saving {row['title']}: {row['error']}")
+    print(f"Saved listings: {inserted} inserted, {updated} updated, {report['unchanged']} unchanged, "
+          f"{retired} retired, {len(rejected)} rejected")
+    return report
+
+# Detail fields persisted in property_details - also what content_hash covers
+PROPERTY_DETAIL_FIELDS = ('bedrooms', 'price', 'amenities', 'description', 'availability')
+
+def property_details_hash(details):
+    """Stable hash of the persisted detail fields, to skip no-op rewrites"""
+    content = {field: details.get(field) for field in PROPERTY_DETAIL_FIELDS}
+    raw = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def save_property_details(url, details):
+    """
+    Store freshly scraped details for a listing url.
+
+    Returns:
+        bool: True if the content changed, False if only fetched_at moved.
+    """
+    content_hash = property_details_hash(details)
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        INSERT INTO property_details (url, bedrooms, price, amenities, description, availability,
+                                      content_hash, fetched_at, attempted_at, last_error)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), NULL)
+        ON CONFLICT (url) DO UPDATE
+        SET bedrooms = EXCLUDED.bedrooms,
+            price = EXCLUDED.price,
+            amenities = EXCLUDED.amenities,
+            description = EXCLUDED.description,
+            availability = EXCLUDED.availability,
+            content_hash = EXCLUDED.content_hash,
+            fetched_at = EXCLUDED.fetched_at,
+            attempted_at = EXCLUDED.attempted_at,
+            last_error = NULL
+        RETURNING (xmax = 0) AS inserted,
+                  (SELECT content_hash FROM property_details WHERE url = %s) AS previous_hash
+        ''', (
+            url,
+            details.get('bedrooms'),
+            details.get('price'),
+            psycopg2.extras.Json(details.get('amenities') or []),
+            details.get('description'),
+            details.get('availability'),
+            content_hash,
+            url
+        ))
+        inserted, previous_hash = cur.fetchone()
+        conn.commit()
+        changed = inserted or previous_hash != content_hash
+        if changed:
+            bump_generation()
+        return changed
+    except Exception as e:
+        conn.rollback()
+        print(f"Error saving details for {url}: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def record_property_details_error(url, error):
+    """Note a failed detail scrape so retries back off; existing content is kept"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        INSERT INTO property_details (url, attempted_at, last_error)
+        VALUES (%s, NOW(), %s)
+        ON CONFLICT (url) DO UPDATE
+        SET attempted_at = EXCLUDED.attempted_at,
+            last_error = EXCLUDED.last_error
+        ''', (url, str(error)))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error recording detail failure for {url}: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+def update_frontier(entries, complete, refresh_age=None):
+    """
+    Record a discovery pass in listing_frontier and pick the urls to fetch.
+
+    Args:
+        entries (dict): url -> {'bedrooms', 'lastmod'} for every listing url
+            discovery found; None values keep what is stored.
+        complete (bool): Whether discovery saw the whole site. Only then are
+            known urls missing from `entries` marked gone.
+        refresh_age (float): Also re-fetch urls last fetched more than this
+            many seconds ago; None or 0 to fetch only new and changed urls.
+
+    Returns:
+        dict: due - [(url, bedrooms)] new, changed or never-fetched urls;
+            live - every url not marked gone; new, changed and gone counts.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        CREATE TEMP TABLE frontier_seen (url TEXT PRIMARY KEY, bedrooms INTEGER, lastmod TEXT)
+        ON COMMIT DROP
+        ''')
+        _copy_rows(cur, 'frontier_seen', [
+            (url, entry.get('bedrooms'), entry.get('lastmod')) for url, entry in entries.items()
+        ], columns=('url', 'bedrooms', 'lastmod'))
+
+        cur.execute('''
+        INSERT INTO listing_frontier AS f (url, bedrooms, lastmod)
+        SELECT url, bedrooms, lastmod FROM frontier_seen
+        ON CONFLICT (url) DO UPDATE
+        SET bedrooms = COALESCE(EXCLUDED.bedrooms, f.bedrooms),
+            lastmod = COALESCE(EXCLUDED.lastmod, f.lastmod),
+            last_seen = NOW(),
+            last_changed = CASE
+                WHEN f.gone_at IS NOT NULL
+                  OR EXCLUDED.lastmod IS DISTINCT FROM f.lastmod AND EXCLUDED.lastmod IS NOT NULL
+                  OR EXCLUDED.bedrooms IS DISTINCT FROM f.bedrooms AND EXCLUDED.bedrooms IS NOT NULL
+                THEN NOW() ELSE f.last_changed END,
+            gone_at = NULL
+        RETURNING (xmax = 0) AS inserted, last_changed = NOW() AS changed
+        ''')
+        results = cur.fetchall()
+        new = sum(1 for inserted, _ in results if inserted)
+        changed = sum(1 for inserted, was_changed in results if was_changed and not inserted)
+
+        gone = 0
+        if complete:
+            cur.execute('''
+            UPDATE listing_frontier AS f
+            SET gone_at = NOW()
+            WHERE f.gone_at IS NULL
+              AND NOT EXISTS (SELECT 1 FROM frontier_seen s WHERE s.url = f.url)
+            ''')
+            gone = cur.rowcount
+
+        cur.execute('''
+        SELECT url, bedrooms FROM listing_frontier
+        WHERE gone_at IS NULL
+          AND (fetched_at IS NULL
+               OR fetched_at < last_changed
+               OR (%s > 0 AND fetched_at < NOW() - make_interval(secs => %s)))
+        ORDER BY bedrooms NULLS LAST, url
+        ''', (refresh_age or 0, refresh_age or 0))
+        due = [tuple(row) for row in cur.fetchall()]
+        cur.execute("SELECT url FROM listing_frontier WHERE gone_at IS NULL")
+        live = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating listing frontier: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return {'due': due, 'live': live, 'new': new, 'changed': changed, 'gone': gone}
+
+def mark_frontier_fetched(urls):
+    """Record that these frontier urls were fetched and parsed successfully"""
+    if not urls:
+        return
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("UPDATE listing_frontier SET fetched_at = NOW() WHERE url = ANY(%s)", (list(urls),))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating listing frontier: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+# Finished runs kept in scrape_runs (with their pages); older ones are pruned
+SCRAPE_RUN_HISTORY = 100
+SCRAPE_PAGE_COLUMNS = ('url', 'status', 'fetch_path', 'fetch_seconds', 'parse_seconds', 'write_seconds', 'error')
+
+def start_scrape_run(urls, resume_window=0):
+    """
+    Open the scrape_runs record for a run, or resume an interrupted one.
+
+    The newest run still marked running that made progress within
+    `resume_window` seconds is resumed: it keeps its id and page rows, and
+    the urls it already completed are returned so they can be skipped. Any
+    other unfinished run is marked abandoned. `urls` not yet in the run are
+    added as pending.
+
+    Returns:
+        dict: id, resumed (bool), completed (set of urls already done).
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        row = None
+        if resume_window:
+            cur.execute('''
+            SELECT id FROM scrape_runs
+            WHERE status = 'running' AND updated_at >= NOW() - make_interval(secs => %s)
+            ORDER BY id DESC LIMIT 1
+            ''', (resume_window,))
+            row = cur.fetchone()
+        if row:
+            run_id = row[0]
+            cur.execute("UPDATE scrape_runs SET resumes = resumes + 1, updated_at = NOW() WHERE id = %s", (run_id,))
+        else:
+            cur.execute("INSERT INTO scrape_runs DEFAULT VALUES RETURNING id")
+            run_id = cur.fetchone()[0]
+        cur.execute('''
+        UPDATE scrape_runs SET status = 'abandoned', finished_at = NOW()
+        WHERE status = 'running' AND id <> %s
+        ''', (run_id,))
+
+        cur.execute("CREATE TEMP TABLE scrape_run_due (url TEXT PRIMARY KEY) ON COMMIT DROP")
+        _copy_rows(cur, 'scrape_run_due', [(url,) for url in set(urls)], columns=('url',))
+        cur.execute('''
+        INSERT INTO scrape_run_pages (run_id, url)
+        SELECT %s, url FROM scrape_run_due
+        ON CONFLICT (run_id, url) DO NOTHING
+        ''', (run_id,))
+        cur.execute("SELECT url FROM scrape_run_pages WHERE run_id = %s AND status = 'done'", (run_id,))
+        completed = {url for url, in cur.fetchall()}
+
+        cur.execute('''
+        DELETE FROM scrape_runs
+        WHERE id < (SELECT id FROM scrape_runs ORDER BY id DESC OFFSET %s LIMIT 1)
+        ''', (SCRAPE_RUN_HISTORY,))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error starting scrape run: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    return {'id': run_id, 'resumed': bool(row), 'completed': completed}
+
+def record_scrape_pages(run_id, pages):
+    """
+    Checkpoint pages of a run: status ('done', 'rejected' or 'failed'),
+    fetch path and error, and fetch/parse/write seconds, per url.
+    """
+    if not pages:
+        return
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        CREATE TEMP TABLE scrape_page_updates (
+            url TEXT PRIMARY KEY,
+            status TEXT,
+            fetch_path TEXT,
+            fetch_seconds DOUBLE PRECISION,
+            parse_seconds DOUBLE PRECISION,
+            write_seconds DOUBLE PRECISION,
+            error TEXT
+        ) ON COMMIT DROP
+        ''')
+        rows_by_url = {page['url']: tuple(page.get(column) for column in SCRAPE_PAGE_COLUMNS) for page in pages}
+        _copy_rows(cur, 'scrape_page_updates', rows_by_url.values(), columns=SCRAPE_PAGE_COLUMNS)
+        cur.execute('''
+        INSERT INTO scrape_run_pages AS p
+            (run_id, url, status, fetch_path, fetch_seconds, parse_seconds, write_seconds, error, completed_at)
+        SELECT %s, url, status, fetch_path, fetch_seconds, parse_seconds, write_seconds, error, NOW()
+        FROM scrape_page_updates
+        ON CONFLICT (run_id, url) DO UPDATE
+        SET status = EXCLUDED.status,
+            fetch_path = EXCLUDED.fetch_path,
+            fetch_seconds = EXCLUDED.fetch_seconds,
+            parse_seconds = EXCLUDED.parse_seconds,
+            write_seconds = EXCLUDED.write_seconds,
+            error = EXCLUDED.error,
+            completed_at = EXCLUDED.completed_at
+        ''', (run_id,))
+        cur.execute("UPDATE scrape_runs SET updated_at = NOW() WHERE id = %s", (run_id,))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error recording scrape run pages: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+def finish_scrape_run(run_id, status, totals=None):
+    """Close a run as 'finished' or 'failed', with the save counts of its last attempt"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        UPDATE scrape_runs
+        SET status = %s, finished_at = NOW(), updated_at = NOW(), totals = %s
+        WHERE id = %s
+        ''', (status, psycopg2.extras.Json(totals) if totals is not None else None, run_id))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error finishing scrape run: {e}")
+    finally:
+        cur.close()
+        conn.close()
+
+def scrape_run_report(run_id, slowest=10):
+    """
+    Summarize a run from its page rows.
+
+    Returns:
+        dict: counts per status, summed fetch/parse/write seconds, and the
+            `slowest` pages by total time as dicts of SCRAPE_PAGE_COLUMNS.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        SELECT status, COUNT(*), COALESCE(SUM(fetch_seconds), 0), COALESCE(SUM(parse_seconds), 0),
+               COALESCE(SUM(write_seconds), 0)
+        FROM scrape_run_pages WHERE run_id = %s GROUP BY status
+        ''', (run_id,))
+        statuses = {}
+        seconds = {'fetch': 0.0, 'parse': 0.0, 'write': 0.0}
+        for status, count, fetch_seconds, parse_seconds, write_seconds in cur.fetchall():
+            statuses[status] = count
+            seconds['fetch'] += fetch_seconds
+            seconds['parse'] += parse_seconds
+            seconds['write'] += write_seconds
+        cur.execute(f'''
+        SELECT {', '.join(SCRAPE_PAGE_COLUMNS)} FROM scrape_run_pages
+        WHERE run_id = %s AND completed_at IS NOT NULL
+        ORDER BY COALESCE(fetch_seconds, 0) + COALESCE(parse_seconds, 0) + COALESCE(write_seconds, 0) DESC
+        LIMIT %s
+        ''', (run_id, slowest))
+        slow = [dict(zip(SCRAPE_PAGE_COLUMNS, row)) for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    return {'statuses': statuses, 'seconds': seconds, 'slowest': slow}
+
+# Named conditions listings can be bulk removed by. Trusted SQL, so only these
+# names - never caller-supplied SQL - reach the WHERE clause
+REMOVAL_PREDICATES = {
+    'missing_image': "image_url IS NULL OR image_url = ''",
+    'placeholder_image': '''
+        url LIKE '%%binghamtonwest.com%%'
+        AND (
+            image_url = '/static/images/placeholder.jpg'
+            OR image_url LIKE '%%600x400%%'
+            OR image_url LIKE '%%placeholder%%'
+        )
+    ''',
+}
+REMOVAL_ACTIONS = ('delete', 'retire')
+REMOVAL_COLUMNS = ('id', 'title', 'url', 'image_url')
+
+def remove_properties(ids=None, titles=None, predicates=(), action='delete', reason=None, dry_run=False):
+    """
+    Delete or retire every listing matching any of the criteria, in one statement.
+
+    The statement also writes one property_removals audit row for the batch
+    (none if nothing matched). Retiring marks listings inactive, like the
+    scraper does for vanished ones, so ids and saved listings survive.
+
+    Args:
+        ids (list): Listing ids, as ints.
+        titles (list): Exact listing titles, as strings.
+        predicates (iterable): Names from REMOVAL_PREDICATES.
+        action (str): 'delete' or 'retire'.
+        reason (str): Recorded in the audit row.
+        dry_run (bool): Only report what would be removed.
+
+    Returns:
+        dict: action, dry_run, removed (count), listings (REMOVAL_COLUMNS
+            dicts) and audit_id (None on a dry run or when nothing matched).
+
+    Raises:
+        TypeError: ids, titles or predicates of the wrong type.
+        ValueError: An unknown action or predicate name.
+    """
+    # Everything is checked before any SQL is built; a string would otherwise
+    # be iterated a character at a time and True would pass as id 1
+    if ids is not None and not (isinstance(ids, (list, tuple))
+                                and all(isinstance(property_id, int) and not isinstance(property_id, bool)
+                                        for property_id in ids)):
+        raise TypeError("ids must be a list of integers")
+    if titles is not None and not (isinstance(titles, (list, tuple))
+                                   and all(isinstance(title, str) for title in titles)):
+        raise TypeError("titles must be a list of strings")
+    if isinstance(predicates, str) or not all(isinstance(name, str) for name in predicates):
+        raise TypeError("predicates must be a list of predicate names")
+    if not isinstance(action, str) or action not in REMOVAL_ACTIONS:
+        raise ValueError(f"Unknown removal action: {action}")
+    unknown = [name for name in predicates if name not in REMOVAL_PREDICATES]
+    if unknown:
+        raise ValueError(f"Unknown removal predicates: {', '.join(unknown)}")
+
+    criteria = {}
+    if ids:
+        criteria['ids'] = sorted(set(ids))
+    if titles:
+        criteria['titles'] = sorted(set(titles))
+    if predicates:
+        criteria['predicates'] = sorted(set(predicates))
+    result = {'action': action, 'dry_run': dry_run, 'removed': 0, 'listings': [], 'audit_id': None}
+    if not criteria:
+        return result
+
+    conditions, params = [], []
+    if 'ids' in criteria:
+        conditions.append("id = ANY(%s)")
+        params.append(criteria['ids'])
+    if 'titles' in criteria:
+        conditions.append("title = ANY(%s)")
+        params.append(criteria['titles'])
+    conditions.extend(f"({REMOVAL_PREDICATES[name]})" for name in criteria.get('predicates', ()))
+    where = ' OR '.join(conditions)
+    if action == 'retire':
+        where = f"active AND ({where})"
+    columns = ', '.join(REMOVAL_COLUMNS)
+
+    if dry_run:
+        query = f"SELECT {columns}, NULL FROM properties WHERE {where} ORDER BY id"
+    else:
+        if action == 'delete':
+            removal = f"DELETE FROM properties WHERE {where} RETURNING {columns}"
+        else:
+            removal = f"UPDATE properties SET active = FALSE, retired_at = NOW() WHERE {where} RETURNING {columns}"
+        query = f'''
+        WITH removed AS (
+            {removal}
+        ), audit AS (
+            INSERT INTO property_removals (action, reason, criteria, property_ids, removed)
+            SELECT %s, %s, %s, array_agg(id ORDER BY id), COUNT(*)
+            FROM removed
+            HAVING COUNT(*) > 0
+            RETURNING id
+        )
+        SELECT removed.*, (SELECT id FROM audit) FROM removed ORDER BY removed.id
+        '''
+        params.extend([action, reason, psycopg2.extras.Json(criteria)])
+
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error removing listings: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    if rows and not dry_run:
+        bump_generation()
+        result['audit_id'] = rows[0][-1]
+    result['removed'] = len(rows)
+    result['listings'] = [dict(zip(REMOVAL_COLUMNS, row[:-1])) for row in rows]
+    return result
+
+PROPERTY_UPDATE_COLUMNS = ('id', 'bedrooms', 'price', 'price_value')
+
+def update_properties(updates):
+    """
+    Apply field updates to many listings with one UPDATE.
+
+    Args:
+        updates (list): dicts with 'id' and any of bedrooms, price and
+            price_value; a field that is missing or None is left as it is.
+
+    Returns:
+        int: Rows updated.
+    """
+    if not updates:
+        return 0
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        CREATE TEMP TABLE property_updates (
+            id INTEGER PRIMARY KEY,
+            bedrooms INTEGER,
+            price TEXT,
+            price_value INTEGER
+        ) ON COMMIT DROP
+        ''')
+        # Later updates for the same id win
+        rows = {update['id']: [update.get(column) for column in PROPERTY_UPDATE_COLUMNS] for update in updates}
+        _copy_rows(cur, 'property_updates', rows.values(), PROPERTY_UPDATE_COLUMNS)
+        cur.execute('''
+        UPDATE properties p
+        SET bedrooms = COALESCE(u.bedrooms, p.bedrooms),
+            price = COALESCE(u.price, p.price),
+            price_value = COALESCE(u.price_value, p.price_value)
+        FROM property_updates u
+        WHERE p.id = u.id
+        ''')
+        updated = cur.rowcount
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error updating listings: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    if updated:
+        bump_generation()
+    return updated
 
 def delete_listing_by_title(title):
     """Delete a listing from the database by its title"""
-    conn = psycopg2.connect(**DB_PARAMS)
+    conn = get_connection()
     cur = conn.cursor()
     try:
         cur.execute('''
@@ -90,6 +1248,7 @@ def delete_listing_by_title(title):
         ''', (title,))
         deleted_count = cur.rowcount
         conn.commit()
+        bump_generation()
         print(f"Deleted {deleted_count} listings with title '{title}'")
         return deleted_count
     except Exception as e:
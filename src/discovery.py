@@ -0,0 +1,205 @@
+"""
+Listing discovery for the scraper
+
+This module:
+1. Reads the site's sitemap (following sitemap indexes) for every listing url
+   and its published lastmod
+2. Finds the bedroom category index pages from the home page menu and reads
+   which listings each one links to
+3. Goes through the disk HTTP cache, so an unchanged sitemap or index page is
+   a 304 and its parsed result is reused without re-parsing, as long as it
+   was parsed under the current DISCOVERY_VERSION
+
+The result feeds the listing_frontier table (config.db.update_frontier),
+which decides which pages the detail stage actually fetches.
+"""
+
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+
+try:
+    from fetcher import cached_get, map_concurrently, recall_derived, remember_derived
+except ImportError:
+    from src.fetcher import cached_get, map_concurrently, remember_derived
+
+# Defaults to <base url>/sitemap.xml
+SITEMAP_URL = os.environ.get('SCRAPER_SITEMAP_URL')
+# Sitemap indexes nested deeper than this are not followed
+SITEMAP_MAX_DEPTH = 3
+
+# Tags the sitemap and link parses cached with each page (see
+# fetcher.remember_derived) - bump it whenever parse_sitemap or _page_links
+# can return something different, so unchanged pages are parsed again
+DISCOVERY_VERSION = 1
+
+# Listing pages are "<house number>-<street>[-apt-<unit>]", e.g. /18-5-seminary-apt-1
+LISTING_PATH_PATTERN = re.compile(r'^/\d+(?:-\d+)?-[a-z][a-z0-9-]*$', re.I)
+# Category index pages share that shape ("/1-bed", "/2-bedrooms") but aren't listings
+CATEGORY_PATH_PATTERN = re.compile(r'^/\d+-(?:beds?|bedrooms?)$', re.I)
+
+
+def is_listing_url(url, base_url):
+    parsed = urlparse(url)
+    if parsed.netloc != urlparse(base_url).netloc:
+        return False
+    path = parsed.path.rstrip('/')
+    return bool(LISTING_PATH_PATTERN.match(path)) and not CATEGORY_PATH_PATTERN.match(path)
+
+
+def canonical_url(url, base_url):
+    """Absolute url without query, fragment or trailing slash, so one page has one frontier entry"""
+    parsed = urlparse(urljoin(base_url, url))
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path.rstrip('/')}"
+
+
+def parse_sitemap(xml_text):
+    """
+    Parse a sitemap or sitemap index.
+
+    Returns:
+        tuple: (child sitemap urls, [(page url, lastmod or None)]).
+    """
+    root = ElementTree.fromstring(xml_text)
+    children, pages = [], []
+    for element in root:
+        # Tags are namespaced ({http://www.sitemaps.org/...}loc) - match on the local name
+        fields = {child.tag.rsplit('}', 1)[-1]: (child.text or '').strip() for child in element}
+        if not fields.get('loc'):
+            continue
+        if element.tag.rsplit('}', 1)[-1] == 'sitemap':
+            children.append(fields['loc'])
+        else:
+            pages.append((fields['loc'], fields.get('lastmod') or None))
+    return children, pages
+
+
+def _read_sitemap(url):
+    """Fetch and parse one sitemap file, reusing the parse when it is unchanged"""
+    response = cached_get(url)
+    if response.status_code != 200:
+        raise ValueError(f"Status code {response.status_code}")
+    parsed = recall_derived(response.derived, 'sitemap', DISCOVERY_VERSION)
+    if parsed is not None:
+        children, pages = parsed
+        return children, [tuple(page) for page in pages]
+    children, pages = parse_sitemap(response.content)
+    remember_derived(response.cache_token, 'sitemap', [children, pages], DISCOVERY_VERSION)
+    return children, pages
+
+
+def read_sitemaps(sitemap_url):
+    """
+    Collect every page url in a sitemap tree.
+
+    Returns:
+        tuple: ({url: lastmod}, complete) - complete is False if any sitemap
+            in the tree could not be read.
+    """
+    pages = {}
+    complete = True
+    pending = [(sitemap_url, 0)]
+    visited = set()
+    while pending:
+        url, depth = pending.pop()
+        if url in visited:
+            continue
+        visited.add(url)
+        try:
+            children, found = _read_sitemap(url)
+        except Exception as e:
+            print(f"Error reading sitemap {url}: {e}")
+            complete = False
+            continue
+        pages.update(found)
+        if depth < SITEMAP_MAX_DEPTH:
+            pending.extend((child, depth + 1) for child in children)
+        elif children:
+            print(f"Not following sitemaps nested below {url}")
+            complete = False
+    return pages, complete
+
+
+def _page_links(url):
+    """Absolute hrefs and their link text on a page, reusing the parse when it is unchanged"""
+    response = cached_get(url)
+    if response.status_code != 200:
+        raise ValueError(f"Status code {response.status_code}")
+    links = recall_derived(response.derived, 'links', DISCOVERY_VERSION)
+    if links is not None:
+        return links
+    soup = BeautifulSoup(response.content, 'html.parser')
+    links = [
+        [urljoin(url, anchor['href']), ' '.join(anchor.get_text(' ').split())]
+        for anchor in soup.find_all('a', href=True)
+    ]
+    remember_derived(response.cache_token, 'links', links, DISCOVERY_VERSION)
+    return links
+
+
+def find_category_pages(base_url, categories):
+    """
+    Find bedroom category index pages in the home page menu.
+
+    Args:
+        categories (dict): Menu label -> bedroom count, e.g. {"2 Beds": 2}.
+
+    Returns:
+        dict: Category page url -> bedroom count.
+    """
+    labels = {label.lower(): beds for label, beds in categories.items()}
+    pages = {}
+    for href, text in _page_links(base_url):
+        beds = labels.get(text.lower())
+        if beds is not None:
+            pages[canonical_url(href, base_url)] = beds
+    return pages
+
+
+def discover_listings(base_url, categories):
+    """
+    Find every listing url on the site.
+
+    Args:
+        base_url (str): Site root.
+        categories (dict): Menu label -> bedroom count for the category pages.
+
+    Returns:
+        dict: entries - url -> {'bedrooms', 'lastmod'}; complete - whether the
+            whole sitemap was read (so urls it lacks can be treated as gone).
+    """
+    entries = {}
+
+    sitemap_pages, complete = read_sitemaps(SITEMAP_URL or f"{base_url.rstrip('/')}/sitemap.xml")
+    for url, lastmod in sitemap_pages.items():
+        url = canonical_url(url, base_url)
+        if is_listing_url(url, base_url):
+            entries[url] = {'bedrooms': None, 'lastmod': lastmod}
+    print(f"Sitemap: {len(entries)} listing urls ({'complete' if complete else 'incomplete'})")
+    # A sitemap without a single listing is a site change, not an empty catalog
+    if not entries:
+        complete = False
+
+    try:
+        category_pages = find_category_pages(base_url, categories)
+    except Exception as e:
+        print(f"Error reading category menu from {base_url}: {e}")
+        category_pages = {}
+
+    results = map_concurrently(_page_links, list(category_pages))
+    for (category_url, beds), (links, error) in zip(category_pages.items(), results):
+        if error is not None:
+            print(f"Error reading category page {category_url}: {error}")
+            continue
+        listed = 0
+        for href, _ in links:
+            url = canonical_url(href, base_url)
+            if is_listing_url(url, base_url):
+                entries.setdefault(url, {'bedrooms': None, 'lastmod': None})['bedrooms'] = beds
+                listed += 1
+        print(f"Category {category_url}: {listed} listings ({beds} bedrooms)")
+
+    return {'entries': entries, 'complete': complete}
@@ -0,0 +1,553 @@
+"""
+Listing page extraction
+
+The one extraction engine behind both the bulk scraper (parse_listing_page)
+and on-demand detail fetches (extract_property_details). This module:
+1. Derives the title, location and bedroom count from the listing URL
+2. Parses the page once with lxml and collects everything the extractor
+   reads in a single traversal: images, feature-section, checkmark,
+   list-item and phrase amenity candidates, the description block, and the
+   first price, availability and bedroom mentions
+3. Picks the listing image, standardizes raw amenity text through a memoized
+   rule table into the fixed amenity vocabulary, and builds the fallback
+   description
+4. Returns every field as a dict with the keys in LISTING_FIELDS
+
+Element text follows BeautifulSoup's get_text() (script, style and template
+contents and comments excluded) and single-string matches follow .string,
+so results match the BeautifulSoup/html.parser extractor this replaced - see
+benchmarks/detail_extraction.py for the comparison.
+"""
+
+import re
+from functools import lru_cache
+from urllib.parse import urljoin
+
+from bs4.dammit import UnicodeDammit
+from lxml import etree
+
+try:
+    from normalizer import parse_price_value
+except ImportError:
+    from src.normalizer import parse_price_value
+
+# Tags results cached with the page they were extracted from (see
+# fetcher.remember_derived) - bump it whenever extraction output can change,
+# so pages that haven't changed are extracted again rather than served from
+# the old extractor's results
+EXTRACTOR_VERSION = 2
+
+# Every extract_listing result has exactly these keys
+LISTING_FIELDS = (
+    'title', 'location', 'url', 'bedrooms', 'price', 'price_value', 'image_url',
+    'amenities', 'description', 'availability'
+)
+
+# Site menu labels for the bedroom category pages
+BEDROOM_CATEGORIES = {
+    "1 Bed": 1,
+    "2 Beds": 2,
+    "3 Beds": 3,
+    "4 Beds": 4,
+    "5 Beds": 5,
+    "6 Beds": 6,
+    "7 Beds": 7
+}
+TITLE_BEDROOM_PATTERNS = (re.compile(r'(\d+)\s+bed'), re.compile(r'(\d+)-bed'))
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+PRICE_PATTERN = re.compile(r'\$\s*[\d,]+(?:\.\d+)?(?:/[a-zA-Z]+)?')
+AVAILABILITY_PATTERN = re.compile(r'(?:available|unavailable) (?:until|from) ([a-zA-Z]+ \d{4})', re.I)
+BEDROOM_TEXT_PATTERN = re.compile(r'(\d+)[\s-]bedroom', re.I)
+CHECKMARK_PATTERN = re.compile(r'[✓✔]')
+CHECKMARK_PREFIX_PATTERN = re.compile(r'^[✓✔]\s*')
+DESCRIPTION_PATTERN = re.compile(r'(description|about this property)', re.I)
+
+# List items mentioning one of these are amenity candidates
+FEATURE_KEYWORDS = ('bedroom', 'bathroom', 'kitchen', 'living', 'furnished', 'porch',
+                    'laundry', 'pet', 'bus', 'parking', 'storage', 'basement')
+
+# Feature phrases searched for in lowercased element text, each paired with a
+# literal it can't match without so most elements skip the regex entirely
+FEATURE_PHRASES = [
+    ('bedroom', re.compile(r'\b(one|1|two|2|three|3|four|4)\s+bedroom')),
+    ('kitchen', re.compile(r'\bbig\s+eat[\s-]in\s+kitchen\b')),
+    ('living', re.compile(r'\bliving\s+room\b')),
+    ('furnished', re.compile(r'\bfully\s+furnished\b')),
+    ('laundry', re.compile(r'\blaundry\s+available\b')),
+    ('porch', re.compile(r'\bfront\s+and\s+back\s+porch\b')),
+    ('block', re.compile(r'\b(\d+)\s+block\s+to\s+bus\s+stop\b')),
+    ('parking', re.compile(r'\bparking\b')),
+    ('pet', re.compile(r'\bpet\s+friendly\b')),
+]
+
+# Strings under these tags are not part of an element's text (BeautifulSoup's
+# Script, Stylesheet and TemplateString)
+TEXT_EXCLUDED_TAGS = frozenset(('script', 'style', 'template'))
+# The only elements the extractor inspects
+RECORDED_TAGS = frozenset(('div', 'section', 'li', 'p', 'span'))
+
+DEFAULT_DESCRIPTION = "No description available. Contact the property manager for more details."
+
+# Image choice, best first: a map, a photo of the property, any large image
+MAP_IMAGE_HINTS = ('map', 'location')
+NON_PROPERTY_IMAGE_HINTS = ('logo', 'icon', 'button', 'wix-image', 'bedroom')
+PROPERTY_IMAGE_STREETS = ('ayres', 'murray', 'leroy', 'chapin', 'walnut', 'oak')
+LARGE_IMAGE_EXCLUDED_HINTS = ('icon', 'logo', 'button', 'bedroom')
+LARGE_IMAGE_MIN_SIZE = 200
+PLACEHOLDER_IMAGE_PATH = '/static/images/placeholder.jpg'
+
+# Distinct raw amenity texts whose standardization rules are memoized
+AMENITY_RULES_CACHE_SIZE = 4096
+
+
+def format_address_from_url(url_path):
+    """Format a URL path into a readable address."""
+    # Format the URL path as an address (e.g., "10-seminary-apt-2" -> "10 Seminary Apt 2")
+    # Replace hyphens with spaces but keep those between apt and unit numbers
+    address_parts = []
+    for part in url_path.split('-'):
+        if part.lower() in ['apt', 'unit', 'suite']:
+            # Keep the previous part and add this with a space
+            if address_parts:
+                address_parts[-1] = f"{address_parts[-1]} {part}"
+        else:
+            address_parts.append(part)
+
+    formatted_address = " ".join(address_parts).title()
+
+    # Clean up any remaining issues
+    return WHITESPACE_PATTERN.sub(' ', formatted_address).strip()
+
+
+def extract_bedrooms(title):
+    """Extract number of bedrooms from title"""
+    if not title:
+        return None
+
+    # First check if bedrooms are directly indicated in the title
+    lower_title = title.lower()
+    for pattern in TITLE_BEDROOM_PATTERNS:
+        match = pattern.search(lower_title)
+        if match:
+            return int(match.group(1))
+
+    # Direct mapping for categories based on website structure
+    for category, beds in BEDROOM_CATEGORIES.items():
+        if category.lower() in lower_title:
+            return beds
+
+    return None
+
+
+def parse_html(content):
+    """
+    Parse page bytes (or text) into an lxml tree.
+
+    Bytes are decoded the way BeautifulSoup decodes them, so both parsers see
+    the same characters. Returns None for an empty document.
+    """
+    if isinstance(content, bytes):
+        content = UnicodeDammit(content, is_html=True).unicode_markup
+    if not content:
+        return None
+    return etree.fromstring(content.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+
+
+def _visit(element, records, strings, images, excluded):
+    """
+    Depth-first step of walk().
+
+    Returns:
+        tuple: (text, string) - the element's get_text() and .string.
+    """
+    tag = element.tag
+    if not isinstance(tag, str):
+        # Comment or processing instruction: a string node, but not element text
+        if element.text:
+            strings.append(element.text)
+        return '', element.text
+
+    if tag == 'img':
+        images.append((element.get('src'), element.get('width'), element.get('height')))
+
+    excluded = excluded or tag in TEXT_EXCLUDED_TAGS
+    index = None
+    if tag in RECORDED_TAGS:
+        index = len(records)
+        records.append(None)
+
+    parts = []
+    contents = 0
+    only = None
+    if element.text:
+        strings.append(element.text)
+        contents += 1
+        only = element.text
+        if not excluded:
+            parts.append(element.text)
+    for child in element:
+        child_text, only = _visit(child, records, strings, images, excluded)
+        parts.append(child_text)
+        contents += 1
+        if child.tail:
+            strings.append(child.tail)
+            contents += 1
+            only = child.tail
+            if not excluded:
+                parts.append(child.tail)
+
+    text = ''.join(parts)
+    string = only if contents == 1 else None
+    if index is not None:
+        records[index] = (tag, text, string, len(records))
+    return text, string
+
+
+def walk(root):
+    """
+    One traversal of the tree.
+
+    Returns:
+        tuple: (records, strings, images) - records holds (tag, text, string,
+            end) for every div/section/li/p/span in document order, where end
+            is the index just past the element's last descendant record;
+            strings is every text node in document order, comments and scripts
+            included; images is (src, width, height) for every img.
+    """
+    records, strings, images = [], [], []
+    if root is not None:
+        _visit(root, records, strings, images, False)
+    return records, strings, images
+
+
+def _is_large_image(width, height):
+    try:
+        return bool((width and int(width) > LARGE_IMAGE_MIN_SIZE) or
+                    (height and int(height) > LARGE_IMAGE_MIN_SIZE))
+    except ValueError:
+        return False
+
+
+def select_image(images, page_url):
+    """
+    The listing image: a map, else a photo of the property, else any large
+    image, else the site placeholder. Relative srcs resolve against page_url.
+    """
+    candidates = [(src, src.lower(), width, height) for src, width, height in images if src]
+    chosen = next((src for src, lower, _, _ in candidates
+                   if any(hint in lower for hint in MAP_IMAGE_HINTS)), None)
+    if chosen is None:
+        chosen = next((src for src, lower, _, _ in candidates
+                       if not any(hint in lower for hint in NON_PROPERTY_IMAGE_HINTS)
+                       and (("seminary" in lower and "apt" in lower)
+                            or any(street in lower for street in PROPERTY_IMAGE_STREETS))), None)
+    if chosen is None:
+        chosen = next((src for src, lower, width, height in candidates
+                       if _is_large_image(width, height)
+                       and not any(hint in lower for hint in LARGE_IMAGE_EXCLUDED_HINTS)), None)
+    if chosen is None:
+        return urljoin(page_url, PLACEHOLDER_IMAGE_PATH)
+    return chosen if chosen.startswith(("http://", "https://")) else urljoin(page_url, chosen)
+
+
+def _first_match(pattern, strings):
+    for text in strings:
+        match = pattern.search(text)
+        if match:
+            return match
+    return None
+
+
+def _section_amenities(records):
+    """Items under divs/sections that read like a property details or features block"""
+    found, amenities = False, []
+    for index, (tag, text, _, end) in enumerate(records):
+        if tag not in ('div', 'section'):
+            continue
+        lower = text.lower()
+        if 'property' in lower and ('detail' in lower or 'feature' in lower or 'amenities' in lower):
+            found = True
+            for item_tag, item_text, _, _ in records[index + 1:end]:
+                if item_tag in ('li', 'p'):
+                    item = item_text.strip()
+                    if item and len(item) > 3 and not item.lower() == 'property details':
+                        amenities.append(item)
+    return found, amenities
+
+
+def _checkmark_amenities(records):
+    amenities = []
+    for tag, text, string, _ in records:
+        if tag == 'section' or string is None or not CHECKMARK_PATTERN.search(string):
+            continue
+        feature_text = text.strip()
+        if CHECKMARK_PREFIX_PATTERN.match(feature_text) and len(feature_text) > 2:
+            clean_feature = CHECKMARK_PREFIX_PATTERN.sub('', feature_text).strip()
+            if clean_feature and len(clean_feature) > 3:
+                amenities.append(clean_feature)
+    return amenities
+
+
+def _list_item_amenities(records):
+    amenities = []
+    for tag, text, _, _ in records:
+        if tag != 'li':
+            continue
+        item = text.strip()
+        if item:
+            lower = item.lower()
+            if any(keyword in lower for keyword in FEATURE_KEYWORDS):
+                amenities.append(item)
+    return amenities
+
+
+def _phrase_amenities(records):
+    amenities = []
+    for tag, text, _, _ in records:
+        if tag not in ('p', 'div', 'span'):
+            continue
+        lower = text.strip().lower()
+        if not lower:
+            continue
+        for keyword, pattern in FEATURE_PHRASES:
+            if keyword in lower:
+                match = pattern.search(lower)
+                if match:
+                    amenities.append(' '.join(word.capitalize() for word in match.group(0).split()))
+    return amenities
+
+
+def collect_raw_amenities(records):
+    """
+    Amenity candidates in the order the extraction methods are tried.
+
+    Each fallback method only runs while fewer than three candidates (or no
+    details section) have been found.
+    """
+    found, raw_amenities = _section_amenities(records)
+
+    if not found or len(raw_amenities) < 3:
+        checkmarks = _checkmark_amenities(records)
+        raw_amenities.extend(checkmarks)
+        found = found or bool(checkmarks)
+
+    if not found or len(raw_amenities) < 3:
+        list_items = _list_item_amenities(records)
+        raw_amenities.extend(list_items)
+        found = found or bool(list_items)
+
+    if not found or len(raw_amenities) < 3:
+        raw_amenities.extend(_phrase_amenities(records))
+
+    return raw_amenities
+
+
+def find_description(records):
+    """First substantial description / "about this property" block"""
+    for tag, text, string, _ in records:
+        if tag in ('p', 'div') and string is not None and DESCRIPTION_PATTERN.search(string):
+            description = text.strip()
+            if len(description) > 50:
+                return description
+    return ""
+
+
+ONE_BEDROOM_PATTERN = re.compile(r'(one|1)\s+bedroom', re.I)
+TWO_LARGE_BEDROOMS_PATTERN = re.compile(r'(two|2)\s+large?\s+bedroom', re.I)
+TWO_BEDROOMS_PATTERN = re.compile(r'(two|2)\s+bedroom', re.I)
+THREE_BEDROOMS_PATTERN = re.compile(r'(three|3)\s+bedroom', re.I)
+FOUR_BEDROOMS_PATTERN = re.compile(r'(four|4)\s+bedroom', re.I)
+ONE_BATHROOM_PATTERN = re.compile(r'(one|1)\s+bathroom', re.I)
+TWO_BATHROOMS_PATTERN = re.compile(r'(two|2)\s+bathroom', re.I)
+KITCHEN_WITH_DINING_PATTERN = re.compile(r'kitchen\s+with\s+dining', re.I)
+BUS_STOP_PATTERN = re.compile(r'(\d+)\s+block\s+to\s+bus', re.I)
+
+# Standardization rules in precedence order: (test on the lowercased text,
+# amenity key, standard name - None keeps the original text, key that must
+# not be mapped yet for the rule to apply)
+AMENITY_RULES = (
+    # Bedrooms
+    (lambda t: ONE_BEDROOM_PATTERN.search(t) or "one bedroom" in t, "bedrooms", "One Bedroom", None),
+    (lambda t: TWO_LARGE_BEDROOMS_PATTERN.search(t), "bedrooms", "Two Large Bedrooms", None),
+    (lambda t: TWO_BEDROOMS_PATTERN.search(t) or "two bedrooms" in t, "bedrooms", "Two Bedrooms", None),
+    (lambda t: THREE_BEDROOMS_PATTERN.search(t) or "three bedrooms" in t, "bedrooms", "Three Bedrooms", None),
+    (lambda t: FOUR_BEDROOMS_PATTERN.search(t) or "four bedrooms" in t, "bedrooms", "Four Bedrooms", None),
+    (lambda t: "bedroom" in t, "bedrooms", None, "bedrooms"),
+    # Bathroom
+    (lambda t: ONE_BATHROOM_PATTERN.search(t) or "one bathroom" in t, "bathroom", "One Bathroom", None),
+    (lambda t: TWO_BATHROOMS_PATTERN.search(t) or "two bathrooms" in t, "bathroom", "Two Bathrooms", None),
+    (lambda t: "bathroom" in t, "bathroom", None, "bathroom"),
+    # Kitchen
+    (lambda t: KITCHEN_WITH_DINING_PATTERN.search(t) or "kitchen with dining" in t,
+     "kitchen", "Kitchen with Dining Area", None),
+    (lambda t: "eat-in kitchen" in t or "eat in kitchen" in t, "kitchen", "Big Eat-In Kitchen", None),
+    (lambda t: "kitchen" in t, "kitchen", "Kitchen", "kitchen"),
+    # Living areas
+    (lambda t: "living room" in t, "living", "Living Room", None),
+    (lambda t: "dining area" in t, "dining", "Dining Area", "kitchen"),
+    (lambda t: "dining room" in t, "dining", "Dining Room", None),
+    (lambda t: "bonus room" in t, "bonus", "Bonus Room", None),
+    # Features
+    (lambda t: "enclosed yard" in t, "yard", "Enclosed Yard", None),
+    (lambda t: "furnished" in t, "furnished", "Furnished", None),
+    (lambda t: "pet friendly" in t or "pets allowed" in t, "pets", "Pet Friendly", None),
+    (lambda t: BUS_STOP_PATTERN.search(t) or "block to bus stop" in t, "bus", "1 Block to Bus Stop", None),
+    (lambda t: "washer" in t and "dryer" in t, "laundry", "Washer & Dryer", None),
+    (lambda t: "laundry" in t, "laundry", "Laundry Available", None),
+    (lambda t: "front porch" in t, "porch", "Front Porch", None),
+    (lambda t: "porch" in t, "porch", None, None),
+)
+
+
+@lru_cache(maxsize=AMENITY_RULES_CACHE_SIZE)
+def amenity_rules(clean_text):
+    """
+    The standardization rules that match one raw amenity text.
+
+    Returns:
+        tuple: (key, value, unless) in precedence order, ending at the first
+            unconditional rule. The first whose `unless` key isn't mapped yet
+            applies; the text is dropped if none does.
+    """
+    lower_text = clean_text.lower()
+    matches = []
+    for test, key, value, unless in AMENITY_RULES:
+        if test(lower_text):
+            matches.append((key, clean_text if value is None else value, unless))
+            if unless is None:
+                break
+    return tuple(matches)
+
+
+def standardize_amenities(raw_amenities, bedrooms):
+    """Map raw amenity text onto the standard amenity names, with defaults filled in"""
+    standardized_amenities = []
+    amenity_map = {}
+
+    for raw_amenity in raw_amenities:
+        clean_text = raw_amenity.strip()
+        if not clean_text:
+            continue
+        for key, value, unless in amenity_rules(clean_text):
+            if unless is None or unless not in amenity_map:
+                amenity_map[key] = value
+                break
+
+    # Build the standardized amenities list from our mapping
+    if bedrooms == 1 and "bedrooms" not in amenity_map:
+        standardized_amenities.append("One Bedroom")
+    elif bedrooms == 2 and "bedrooms" not in amenity_map:
+        standardized_amenities.append("Two Bedrooms")
+    elif "bedrooms" in amenity_map:
+        standardized_amenities.append(amenity_map["bedrooms"])
+
+    if "bathroom" in amenity_map:
+        standardized_amenities.append(amenity_map["bathroom"])
+    else:
+        standardized_amenities.append("One Bathroom")
+
+    if "kitchen" in amenity_map:
+        standardized_amenities.append(amenity_map["kitchen"])
+    else:
+        standardized_amenities.append("Kitchen")
+
+    if "living" in amenity_map:
+        standardized_amenities.append(amenity_map["living"])
+    else:
+        standardized_amenities.append("Living Room")
+
+    # Add the rest of the amenities
+    for key, value in amenity_map.items():
+        if key not in ["bedrooms", "bathroom", "kitchen", "living"] and value not in standardized_amenities:
+            standardized_amenities.append(value)
+
+    # Add other standard amenities if not found - based on property pattern
+    standard_amenities = [
+        "Pet Friendly",
+        "1 Block to Bus Stop"
+    ]
+
+    for amenity in standard_amenities:
+        if amenity.lower() not in [a.lower() for a in standardized_amenities]:
+            standardized_amenities.append(amenity)
+
+    # If we couldn't get a good set of amenities, add these defaults
+    if len(standardized_amenities) < 3:
+        default_amenities = [
+            "Kitchen",
+            "Living Room",
+            "Fully Furnished",
+            "Pet Friendly",
+            "1 Block to Bus Stop"
+        ]
+        for amenity in default_amenities:
+            if amenity not in standardized_amenities:
+                standardized_amenities.append(amenity)
+
+    return standardized_amenities
+
+
+def build_description(description, amenities, title, bedrooms):
+    """The page's description, or one generated from the amenities if it has none"""
+    if description and description.lower() != "no description available.":
+        return description
+    if not amenities:
+        return DEFAULT_DESCRIPTION
+
+    property_type = "apartment" if "apt" in title.lower() else "property"
+    bedrooms_text = f"{bedrooms} bedroom" if bedrooms and bedrooms == 1 else f"{bedrooms} bedrooms" if bedrooms else ""
+
+    description = f"This {bedrooms_text} {property_type} at {title} features "
+    if len(amenities) > 1:
+        description += ", ".join(amenities[:-1]) + " and " + amenities[-1] + "."
+    else:
+        description += amenities[0] + "."
+    return description
+
+
+def extract_listing(content, url, category_bedrooms=None, fields=LISTING_FIELDS):
+    """
+    Extract every listing field from a listing page.
+
+    Args:
+        content (bytes or str): Page HTML.
+        url (str): The page's URL. The title (and location) always come from
+            its last path segment, never from page content.
+        category_bedrooms (int): Bedrooms of the category the URL is listed
+            under, used if the title has no count. Failing both, the first
+            "<n> bedroom" mention on the page is used.
+        fields (tuple): The LISTING_FIELDS to return, so callers that only
+            keep a few (or ship the result to another process) get a compact
+            record.
+
+    Returns:
+        dict: The requested fields.
+    """
+    title = format_address_from_url(url.split("/")[-1])
+    records, strings, images = walk(parse_html(content))
+
+    bedrooms = extract_bedrooms(title) or category_bedrooms
+    if not bedrooms:
+        bedroom_match = _first_match(BEDROOM_TEXT_PATTERN, strings)
+        if bedroom_match:
+            bedrooms = int(bedroom_match.group(1))
+
+    price_match = _first_match(PRICE_PATTERN, strings)
+    price = price_match.group() if price_match else "Contact for price"
+    availability_match = _first_match(AVAILABILITY_PATTERN, strings)
+    amenities = standardize_amenities(collect_raw_amenities(records), bedrooms)
+
+    listing = {
+        'title': title,
+        'location': title,
+        'url': url,
+        'bedrooms': bedrooms,
+        'price': price,
+        'price_value': parse_price_value(price),
+        'image_url': select_image(images, url),
+        'amenities': amenities,
+        'description': build_description(find_description(records), amenities, title, bedrooms),
+        'availability': availability_match.group(0) if availability_match else None,
+    }
+    return listing if fields is LISTING_FIELDS else {field: listing[field] for field in fields}
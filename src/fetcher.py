@@ -0,0 +1,528 @@
+"""
+Page fetch engine for the scrapers
+
+This module:
+1. Fetches pages over a pooled, retrying requests.Session
+2. Falls back to headless Chrome only for pages that fail a caller-supplied
+   completeness check (or the plain request itself)
+3. Runs fetches concurrently with a bound on requests in flight and a
+   per-host requests-per-second limit, collecting results as a list or
+   streaming them in order as they come in
+4. Revalidates previously fetched pages against the on-disk HTTP cache, so
+   an unchanged page costs a 304 instead of a full download
+5. Records per-page timings for each fetch path and prints a summary
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+try:
+    from http_cache import derived_value, get_http_cache
+except ImportError:
+    from src.http_cache import derived_value, get_http_cache
+
+HTTP_TIMEOUT = float(os.environ.get('SCRAPER_HTTP_TIMEOUT', 10))
+HTTP_POOL_SIZE = int(os.environ.get('SCRAPER_HTTP_POOL_SIZE', 10))
+# Requests in flight at once, and per-host request rate, for concurrent fetches
+FETCH_CONCURRENCY = int(os.environ.get('SCRAPER_CONCURRENCY', 8))
+HOST_RATE_LIMIT = float(os.environ.get('SCRAPER_HOST_RATE_LIMIT', 4))
+# Set to false where Chrome isn't installed - incomplete pages are then skipped
+BROWSER_FALLBACK = os.environ.get('SCRAPER_BROWSER_FALLBACK', 'true').lower() == 'true'
+CHROME_BINARY = os.environ.get('CHROME_BINARY', '/usr/bin/google-chrome')
+CHROMEDRIVER_PATH = os.environ.get('CHROMEDRIVER_PATH', '/usr/local/bin/chromedriver')
+# Headless drivers kept for the fallback, how long each page may take to
+# become ready, and how many pages a driver serves before it is replaced
+BROWSER_POOL_SIZE = int(os.environ.get('SCRAPER_BROWSER_POOL_SIZE', 2))
+BROWSER_READY_TIMEOUT = float(os.environ.get('SCRAPER_BROWSER_READY_TIMEOUT', 10))
+BROWSER_MAX_PAGES = int(os.environ.get('SCRAPER_BROWSER_MAX_PAGES', 200))
+
+# The parser only needs the DOM and img src attributes, so the browser skips
+# downloading these. 'eager' returns from driver.get at DOMContentLoaded.
+PAGE_LOAD_STRATEGY = os.environ.get('SCRAPER_PAGE_LOAD_STRATEGY', 'eager')
+BROWSER_BLOCKING = os.environ.get('SCRAPER_BROWSER_BLOCKING', 'true').lower() == 'true'
+BLOCKED_RESOURCE_TYPES = [
+    resource_type.strip()
+    for resource_type in os.environ.get('SCRAPER_BLOCKED_RESOURCE_TYPES', 'image,font,media').split(',')
+    if resource_type.strip()
+]
+BLOCKED_URL_PATTERNS = [
+    pattern.strip()
+    for pattern in os.environ.get(
+        'SCRAPER_BLOCKED_URL_PATTERNS',
+        '*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,*facebook.net*,'
+        '*frog.wix.com*,*static.parastorage.com/services/wix-thunderbolt/dist/*widget*,*wixapps.net*'
+    ).split(',')
+    if pattern.strip()
+]
+
+# URL patterns for each blockable resource type - Chrome's blocklist matches URLs, not types
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*', '*.ico*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*'],
+    'stylesheet': ['*.css*'],
+}
+
+# Navigation timing and bytes over the wire (blocked requests never appear)
+PAGE_METRICS_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {
+    load_ms: nav ? (nav.loadEventEnd || nav.domContentLoadedEventEnd) : null,
+    bytes: (nav ? nav.transferSize : 0) + resources.reduce((total, r) => total + (r.transferSize || 0), 0),
+    requests: resources.length + 1
+};
+"""
+
+# Responses that mean the page no longer exists, not that it needs rendering
+GONE_STATUSES = (404, 410)
+
+# Headers to mimic a browser
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0'
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Shared keep-alive session, so repeat fetches to a host reuse connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update(HTTP_HEADERS)
+            retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                          allowed_methods=('GET', 'HEAD'))
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def http_get(url, timeout=HTTP_TIMEOUT, **kwargs):
+    return get_session().get(url, timeout=timeout, **kwargs)
+
+
+def _from_cache(entry, not_modified):
+    """Rebuild a 200 response from a cache entry the server just confirmed with a 304"""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = entry['body']
+    response.headers = CaseInsensitiveDict(not_modified.headers)
+    if entry.get('content_type'):
+        response.headers['Content-Type'] = entry['content_type']
+    response.encoding = entry.get('encoding')
+    response.url = not_modified.url
+    response.request = not_modified.request
+    response.elapsed = not_modified.elapsed
+    response.reason = 'OK'
+    return response
+
+
+def cached_get(url, timeout=HTTP_TIMEOUT, **kwargs):
+    """
+    GET through the disk HTTP cache.
+
+    A cached URL is requested with If-None-Match / If-Modified-Since; on a 304
+    the cached body is returned as a 200. Responses also carry:
+    revalidated (bool) - the body came from the cache; derived (dict) - values
+    stored with remember_derived for this body, read with recall_derived;
+    cache_token - pass to remember_derived, None if the response isn't cached.
+    """
+    cache = get_http_cache()
+    entry = cache.get(url) if cache is not None else None
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None:
+        headers.update(cache.conditional_headers(entry))
+
+    response = http_get(url, timeout=timeout, headers=headers, **kwargs)
+    if entry is not None and response.status_code == 304:
+        cache.mark_revalidated(url)
+        response = _from_cache(entry, response)
+        response.revalidated = True
+        response.derived = entry.get('derived') or {}
+        response.cache_token = (url, entry['stored_at'])
+        return response
+
+    response.revalidated = False
+    response.derived = {}
+    response.cache_token = None
+    stored_at = cache.store(url, response) if cache is not None else None
+    if stored_at is not None:
+        response.cache_token = (url, stored_at)
+    return response
+
+
+def remember_derived(cache_token, name, value, version=None):
+    """
+    Store a value computed from a cached_get body, so a later 304 can skip
+    recomputing it - as long as recall_derived asks for the same version.
+    """
+    cache = get_http_cache()
+    if cache is None or cache_token is None:
+        return
+    url, stored_at = cache_token
+    cache.set_derived(url, stored_at, name, value, version)
+
+
+def recall_derived(derived, name, version=None):
+    """The value remember_derived stored under name for this version, or None"""
+    return derived_value(derived, name, version)
+
+
+def fetch_html(url, timeout=HTTP_TIMEOUT):
+    """
+    Fetch a page with a plain (conditional) GET.
+
+    Returns:
+        dict: url, html (None on failure), status, path ('http', or 'cached'
+            for a 304), elapsed, bytes downloaded, error, plus cache_token and
+            derived from cached_get.
+    """
+    start = time.perf_counter()
+    cache_token, derived = None, {}
+    path = 'http'
+    try:
+        response = cached_get(url, timeout=timeout)
+        html = response.text if response.status_code == 200 else None
+        error = None if html is not None else f"Status code {response.status_code}"
+        status = response.status_code
+        size = 0 if response.revalidated else len(response.content)
+        cache_token, derived = response.cache_token, response.derived
+        if response.revalidated:
+            path = 'cached'
+    except requests.RequestException as e:
+        html, status, error, size = None, None, str(e), None
+    return {
+        'url': url,
+        'html': html,
+        'status': status,
+        'path': path,
+        'elapsed': time.perf_counter() - start,
+        'bytes': size,
+        'error': error,
+        'cache_token': cache_token,
+        'derived': derived,
+    }
+
+
+def blocked_url_patterns():
+    """Chrome blocklist patterns for BLOCKED_RESOURCE_TYPES plus BLOCKED_URL_PATTERNS"""
+    patterns = []
+    for resource_type in BLOCKED_RESOURCE_TYPES:
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+    return patterns + BLOCKED_URL_PATTERNS
+
+
+def create_chrome_driver(block_resources=BROWSER_BLOCKING, page_load_strategy=PAGE_LOAD_STRATEGY):
+    """Start a headless Chrome with the options the scraper container supports"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.binary_location = CHROME_BINARY
+    options.page_load_strategy = page_load_strategy
+    if block_resources and 'image' in BLOCKED_RESOURCE_TYPES:
+        # Images stay in the DOM with their src; Chrome just never downloads them
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+    # Set up Chrome Service with the path to chromedriver installed in the Dockerfile
+    service = Service(executable_path=CHROMEDRIVER_PATH)
+    driver = webdriver.Chrome(service=service, options=options)
+
+    if block_resources:
+        patterns = blocked_url_patterns()
+        if patterns:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    return driver
+
+
+def page_metrics(driver):
+    """Load time (ms) and bytes transferred for the page the driver is on"""
+    try:
+        metrics = driver.execute_script(PAGE_METRICS_SCRIPT) or {}
+    except Exception:
+        metrics = {}
+    return metrics.get('load_ms'), metrics.get('bytes')
+
+
+def document_ready(driver):
+    """Default readiness condition: the document has finished loading"""
+    return driver.execute_script("return document.readyState") == 'complete'
+
+
+class BrowserPool:
+    """
+    Pool of long-lived headless Chrome drivers for pages plain HTTP can't render.
+
+    Each fetch checks a driver out, loads the page and waits on `ready(driver)`
+    via WebDriverWait instead of a fixed sleep. Drivers start lazily, so a run
+    where every page passes over HTTP never launches a browser. A driver that
+    crashes (or has served `max_pages` pages) is quit and replaced on its next
+    checkout.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, ready=document_ready, ready_timeout=BROWSER_READY_TIMEOUT,
+                 max_pages=BROWSER_MAX_PAGES, block_resources=BROWSER_BLOCKING,
+                 page_load_strategy=PAGE_LOAD_STRATEGY):
+        self.ready = ready
+        self.block_resources = block_resources
+        self.page_load_strategy = page_load_strategy
+        self.ready_timeout = ready_timeout
+        self.max_pages = max_pages
+        self._slots = queue.Queue()
+        self._all_slots = []
+        for index in range(max(1, size)):
+            slot = {'index': index, 'driver': None, 'pages': 0, 'driver_pages': 0,
+                    'failures': 0, 'timeouts': 0, 'recycled': 0}
+            self._all_slots.append(slot)
+            self._slots.put(slot)
+
+    def _recycle(self, slot):
+        driver, slot['driver'] = slot['driver'], None
+        slot['driver_pages'] = 0
+        if driver is not None:
+            slot['recycled'] += 1
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def fetch(self, url):
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        slot = self._slots.get()
+        start = time.perf_counter()
+        load_ms = size = None
+        try:
+            if slot['driver'] is not None and slot['driver_pages'] >= self.max_pages:
+                self._recycle(slot)
+            if slot['driver'] is None:
+                slot['driver'] = create_chrome_driver(self.block_resources, self.page_load_strategy)
+            driver = slot['driver']
+            driver.get(url)
+            try:
+                WebDriverWait(driver, self.ready_timeout).until(self.ready)
+            except TimeoutException:
+                # Serve what rendered; the completeness check decides if it's usable
+                slot['timeouts'] += 1
+            html, error = driver.page_source, None
+            load_ms, size = page_metrics(driver)
+            slot['pages'] += 1
+            slot['driver_pages'] += 1
+        except Exception as e:
+            # Most likely a dead browser or session - start a fresh one next time
+            html, error = None, str(e)
+            slot['failures'] += 1
+            self._recycle(slot)
+        finally:
+            self._slots.put(slot)
+        return {
+            'url': url,
+            'html': html,
+            'status': None,
+            'path': 'browser',
+            'elapsed': time.perf_counter() - start,
+            'load_ms': load_ms,
+            'bytes': size,
+            'error': error,
+        }
+
+    def stats(self):
+        """Per-driver page, failure, wait-timeout and recycle counts"""
+        return [
+            {key: slot[key] for key in ('index', 'pages', 'failures', 'timeouts', 'recycled')}
+            for slot in self._all_slots
+        ]
+
+    def quit(self):
+        for slot in self._all_slots:
+            driver, slot['driver'] = slot['driver'], None
+            if driver is not None:
+                try:
+                    driver.quit()
+                except Exception as e:
+                    print(f"Error closing browser {slot['index']}: {e}")
+
+
+def fetch_page(url, is_complete, browser=None):
+    """
+    Fetch `url` over HTTP, falling back to the browser if the page is unusable.
+
+    Args:
+        url (str): Page to fetch.
+        is_complete (callable): html -> bool, whether the page has what the parser needs.
+        browser (BrowserPool): Fallback; None to disable it.
+
+    Returns:
+        dict: The result of the path that produced the page (see fetch_html),
+            plus 'attempts' listing every path tried with its timing.
+    """
+    result = fetch_html(url)
+    if result['html'] is not None and not is_complete(result['html']):
+        result['error'] = "Incomplete page"
+    attempts = [dict(path=result['path'], elapsed=result['elapsed'], bytes=result['bytes'], error=result['error'])]
+
+    # A page the server says is gone won't render any better in a browser
+    if result['error'] and browser is not None and result['status'] not in GONE_STATUSES:
+        result = browser.fetch(url)
+        if result['html'] is not None and not is_complete(result['html']):
+            result['error'] = "Incomplete page"
+        attempts.append(dict(path='browser', elapsed=result['elapsed'], bytes=result['bytes'], error=result['error']))
+
+    if result['error']:
+        result['html'] = None
+    result['attempts'] = attempts
+    result['elapsed'] = sum(attempt['elapsed'] for attempt in attempts)
+    return result
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to each host to at most `rate` per second.
+
+    Hosts are limited independently, so a slow site doesn't hold back others.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate=HOST_RATE_LIMIT):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def iter_concurrently(fn, items, url=lambda item: item, max_workers=FETCH_CONCURRENCY, limiter=None):
+    """
+    Run fn(item) for each item on a bounded thread pool, rate limited per host,
+    yielding results as they come in.
+
+    Results come back in input order. Items are taken from `items` lazily,
+    at most 2 * max_workers ahead of the consumer, so memory stays bounded
+    however many items there are. An exception in one call doesn't affect
+    the others - it is yielded in that item's slot instead of a result.
+
+    Args:
+        fn (callable): Called once per item.
+        items (iterable): Work items.
+        url (callable): item -> URL, used to pick the host to rate limit.
+        max_workers (int): Maximum calls in flight.
+        limiter (HostRateLimiter): Shared limiter; a new default one if None.
+
+    Yields:
+        tuple: (item, result, error) - exactly one of result and error is None.
+    """
+    limiter = limiter or HostRateLimiter()
+    max_workers = max(1, max_workers)
+
+    def run(item):
+        try:
+            limiter.wait(url(item))
+            return fn(item), None
+        except Exception as e:
+            return None, e
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch') as executor:
+        for item in items:
+            pending.append((item, executor.submit(run, item)))
+            if len(pending) >= 2 * max_workers:
+                item, future = pending.popleft()
+                yield (item,) + future.result()
+        while pending:
+            item, future = pending.popleft()
+            yield (item,) + future.result()
+
+
+def map_concurrently(fn, items, url=lambda item: item, max_workers=FETCH_CONCURRENCY, limiter=None):
+    """
+    Run fn(item) for each item on a bounded thread pool, rate limited per host.
+
+    Results come back in input order. An exception in one call doesn't affect
+    the others - it is returned in that item's slot instead of a result.
+
+    Args:
+        fn (callable): Called once per item.
+        items (iterable): Work items.
+        url (callable): item -> URL, used to pick the host to rate limit.
+        max_workers (int): Maximum calls in flight.
+        limiter (HostRateLimiter): Shared limiter; a new default one if None.
+
+    Returns:
+        list: (result, error) per item - exactly one of the two is None.
+    """
+    items = list(items)
+    if not items:
+        return []
+    return [
+        (result, error)
+        for _, result, error in iter_concurrently(fn, items, url, min(max_workers, len(items)), limiter)
+    ]
+
+
+def format_bytes(size):
+    if size is None:
+        return '?'
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f}MB"
+    return f"{size / 1024:.0f}KB"
+
+
+def print_fetch_report(results):
+    """Print per-page timings and a per-path summary for a batch of fetch_page results"""
+    print("\nFetch report:")
+    for result in results:
+        tried = ', '.join(
+            f"{attempt['path']} {attempt['elapsed']:.2f}s {format_bytes(attempt.get('bytes'))}"
+            + (f" ({attempt['error']})" if attempt['error'] else '')
+            for attempt in result['attempts']
+        )
+        outcome = result['path'] if result['html'] is not None else 'failed'
+        print(f"  {outcome:>8} {result['elapsed']:6.2f}s  {result['url']}  [{tried}]")
+
+    by_path = {}
+    for result in results:
+        for attempt in result['attempts']:
+            by_path.setdefault(attempt['path'], []).append(attempt)
+    for path, attempts in by_path.items():
+        timings = [attempt['elapsed'] for attempt in attempts]
+        failures = sum(1 for attempt in attempts if attempt['error'])
+        transferred = sum(attempt.get('bytes') or 0 for attempt in attempts)
+        print(f"  {path}: {len(attempts)} pages, {failures} unusable, "
+              f"total {sum(timings):.2f}s, mean {sum(timings) / len(timings):.2f}s, max {max(timings):.2f}s, "
+              f"{format_bytes(transferred)} transferred ({format_bytes(transferred // len(attempts))}/page)")
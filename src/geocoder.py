@@ -0,0 +1,113 @@
+"""
+Offline geocoder for listing addresses
+
+This module:
+1. Loads the street gazetteer in data/gazetteer.json
+2. Turns addresses like "18 5 Seminary Apt 1" into approximate coordinates
+3. Computes the haversine distance from a property to campus
+"""
+
+import json
+import math
+import os
+import re
+
+GAZETTEER_PATH = os.environ.get(
+    'GAZETTEER_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.json')
+)
+
+EARTH_RADIUS_MILES = 3958.8
+
+# Leading house number, including the "18 5" form that format_address_from_url
+# produces for "18.5"/"18-5" addresses
+HOUSE_NUMBER_PATTERN = re.compile(r'^\s*(\d+)(?:[\s.-]+5\b)?')
+
+_gazetteer = None
+_street_pattern = None
+_streets_by_alias = None
+
+
+def load_gazetteer():
+    """Load the gazetteer once and build the street lookup"""
+    global _gazetteer, _street_pattern, _streets_by_alias
+    if _gazetteer is None:
+        with open(GAZETTEER_PATH) as f:
+            gazetteer = json.load(f)
+
+        streets_by_alias = {}
+        for street in gazetteer['streets']:
+            for alias in street['aliases']:
+                streets_by_alias[alias.lower()] = street
+
+        # Longest aliases first so "st john" wins over any shorter overlap
+        aliases = sorted(streets_by_alias, key=len, reverse=True)
+        _street_pattern = re.compile(r'\b(' + '|'.join(re.escape(a) for a in aliases) + r')\b', re.I)
+        _streets_by_alias = streets_by_alias
+        _gazetteer = gazetteer
+    return _gazetteer
+
+
+def campus_coordinates():
+    campus = load_gazetteer()['campus']
+    return campus['lat'], campus['lng']
+
+
+def geocode_address(address):
+    """
+    Look up approximate coordinates for a street address.
+
+    Args:
+        address (str): Address or listing title, e.g. "10 Seminary Apt 2".
+
+    Returns:
+        tuple or None: (lat, lng), or None when the street is not in the gazetteer.
+    """
+    if not address:
+        return None
+
+    load_gazetteer()
+    street_match = _street_pattern.search(address)
+    if not street_match:
+        return None
+    street = _streets_by_alias[street_match.group(1).lower()]
+    start, end = street['from'], street['to']
+
+    number_match = HOUSE_NUMBER_PATTERN.match(address)
+    if number_match and end['number'] != start['number']:
+        number = int(number_match.group(1))
+        fraction = (number - start['number']) / (end['number'] - start['number'])
+        fraction = min(max(fraction, 0.0), 1.0)
+    else:
+        # No house number - use the middle of the street
+        fraction = 0.5
+
+    lat = start['lat'] + (end['lat'] - start['lat']) * fraction
+    lng = start['lng'] + (end['lng'] - start['lng']) * fraction
+    return round(lat, 6), round(lng, 6)
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in miles"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def geocode_listing(location, title=None):
+    """
+    Geocode a listing and measure its distance to campus.
+
+    Returns:
+        dict: latitude, longitude and distance (miles, 2 decimals) - all None
+        when neither the location nor the title can be geocoded.
+    """
+    coords = geocode_address(location) or geocode_address(title)
+    if not coords:
+        return {'latitude': None, 'longitude': None, 'distance': None}
+
+    campus_lat, campus_lng = campus_coordinates()
+    distance = haversine_miles(coords[0], coords[1], campus_lat, campus_lng)
+    return {'latitude': coords[0], 'longitude': coords[1], 'distance': round(distance, 2)}
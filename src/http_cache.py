@@ -0,0 +1,254 @@
+"""
+Disk-backed HTTP cache with conditional revalidation
+
+This module:
+1. Stores response bodies and their validators (ETag / Last-Modified) on disk,
+   keyed by URL, in a directory the scraper and web containers can share
+2. Lets callers revalidate with If-None-Match / If-Modified-Since, so an
+   unchanged page costs a 304 instead of a full download
+3. Keeps values derived from a body (e.g. parsed listing fields) alongside
+   it, tagged with the version of the code that derived them, so an
+   unchanged page needn't be parsed again until that code changes
+4. Evicts entries by age and keeps the directory under a size budget
+
+Cache failures are never fatal - a broken or unwritable cache just means a
+normal fetch.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'housing_http_cache'))
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Entries not revalidated for this long are dropped
+HTTP_CACHE_MAX_AGE = float(os.environ.get('HTTP_CACHE_MAX_AGE', 30 * 24 * 3600))
+HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Run an eviction pass after this many stores
+EVICT_EVERY = 50
+
+
+class HttpCache:
+    """
+    URL-keyed store of response bodies, validators and derived values.
+
+    Each entry is two files under a two-character fan-out directory:
+    <key>.body (raw bytes) and <key>.json (url, validators, encoding,
+    timestamps, derived values). Writes go through a temp file and
+    os.replace so readers never see a partial entry.
+    """
+
+    def __init__(self, directory=HTTP_CACHE_DIR, max_bytes=HTTP_CACHE_MAX_BYTES, max_age=HTTP_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stores = 0
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0, 'errors': 0}
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.json', base + '.body'
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def get(self, url):
+        """
+        Look up a cached response.
+
+        Returns:
+            dict or None: meta (url, etag, last_modified, encoding, content_type,
+                stored_at, validated_at, derived) plus 'body' bytes.
+        """
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('url') != url:
+                raise ValueError("cache key collision")
+            if time.time() - meta.get('validated_at', 0) > self.max_age:
+                self._count('misses')
+                return None
+            with open(body_path, 'rb') as f:
+                meta['body'] = f.read()
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except Exception as e:
+            print(f"HTTP cache read failed for {url}: {e}")
+            self._count('errors')
+            return None
+        self._count('hits')
+        return meta
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, response):
+        """
+        Cache a 200 response that carries validators.
+
+        Returns:
+            float or None: The entry's stored_at (see set_derived), or None if
+                the response wasn't cached.
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code != 200 or not (etag or last_modified):
+            return None
+
+        now = time.time()
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'encoding': response.encoding,
+            'content_type': response.headers.get('Content-Type'),
+            'stored_at': now,
+            'validated_at': now,
+            'derived': {},
+        }
+        meta_path, body_path = self._paths(url)
+        try:
+            self._write(body_path, response.content)
+            self._write(meta_path, json.dumps(meta).encode())
+        except Exception as e:
+            print(f"HTTP cache write failed for {url}: {e}")
+            self._count('errors')
+            return None
+
+        self._count('stored')
+        with self._lock:
+            self._stores += 1
+            evict_now = self._stores % EVICT_EVERY == 0
+        if evict_now:
+            self.evict()
+        return now
+
+    def _update_meta(self, url, update):
+        meta_path, _ = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            update(meta)
+            self._write(meta_path, json.dumps(meta).encode())
+        except Exception as e:
+            print(f"HTTP cache update failed for {url}: {e}")
+            self._count('errors')
+
+    def mark_revalidated(self, url):
+        """Record a 304 - the cached body is current as of now"""
+        self._count('revalidated')
+        self._update_meta(url, lambda meta: meta.update(validated_at=time.time()))
+
+    def set_derived(self, url, stored_at, name, value, version=None):
+        """
+        Attach a JSON-serializable value computed from a cached body.
+
+        `stored_at` identifies the body it was computed from; if the entry has
+        since been replaced the value is dropped. Storing a new body clears
+        every derived value. `version` identifies the code that computed it
+        (see derived_value), so a parser change invalidates values computed
+        by the old parser even while the body itself stays current.
+        """
+        def update(meta):
+            if meta.get('stored_at') == stored_at:
+                meta.setdefault('derived', {})[name] = {'version': version, 'value': value}
+
+        self._update_meta(url, update)
+
+    def evict(self):
+        """Drop entries older than max_age, then the least recently validated until under max_bytes"""
+        entries = []
+        now = time.time()
+        try:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith('.json'):
+                        continue
+                    meta_path = os.path.join(root, name)
+                    body_path = meta_path[:-len('.json')] + '.body'
+                    try:
+                        with open(meta_path) as f:
+                            validated_at = json.load(f).get('validated_at', 0)
+                        size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                    except (OSError, ValueError):
+                        validated_at, size = 0, 0
+                    entries.append((validated_at, size, meta_path, body_path))
+        except OSError as e:
+            print(f"HTTP cache eviction scan failed: {e}")
+            return 0
+
+        entries.sort()
+        total = sum(entry[1] for entry in entries)
+        evicted = 0
+        for validated_at, size, meta_path, body_path in entries:
+            if now - validated_at <= self.max_age and total <= self.max_bytes:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._stats['evicted'] += evicted
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def derived_value(derived, name, version=None):
+    """
+    A value stored with set_derived, or None if there is none for this version.
+
+    Values stored by a different version - or before derived values carried
+    one - are misses, to be recomputed and stored again.
+    """
+    entry = (derived or {}).get(name)
+    if not isinstance(entry, dict) or 'value' not in entry or entry.get('version') != version:
+        return None
+    return entry['value']
+
+
+def get_http_cache():
+    """The process-wide cache, or None when HTTP_CACHE_ENABLED is false"""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
@@ -6,6 +6,8 @@ import psycopg2
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import os
 
+from config.db import migrate_properties_table
+
 # Database connection parameters for development
 DEV_DB_PARAMS = {
     'host': os.environ.get('POSTGRES_HOST', 'host.docker.internal'),  # Use environment variable or fallback
@@ -71,6 +73,13 @@ def init_db():
             url TEXT NOT NULL UNIQUE,
             bedrooms INTEGER,
             image_url TEXT,
+            price_value INTEGER,
+            latitude DOUBLE PRECISION,
+            longitude DOUBLE PRECISION,
+            distance DOUBLE PRECISION,
+            content_hash TEXT,
+            active BOOLEAN NOT NULL DEFAULT TRUE,
+            retired_at TIMESTAMP,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         ''')
@@ -132,6 +141,9 @@ def init_db():
         
         print("All tables created successfully")
         
+        # Bring older properties tables up to date
+        migrate_properties_table()
+        
     except Exception as e:
         print(f"Error initializing database: {e}")
         raise
@@ -0,0 +1,264 @@
+"""
+Background admin jobs
+
+This module:
+1. Runs long admin operations (link checks, bulk re-scrapes) on a background
+   thread, so the request that starts one returns straight away
+2. Records each job's progress and final report in the admin_jobs table, so
+   any web worker can answer a poll for it
+3. Runs at most one job of each kind at a time across all workers - the
+   worker running a job holds a Postgres advisory lock for its kind, and
+   starting a kind whose lock is held hands back the running job
+
+A job whose worker dies releases its lock with its database session; the
+next start of that kind marks it abandoned.
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+
+import psycopg2.extensions
+import psycopg2.extras
+
+try:
+    from config.db import get_connection
+except ImportError:
+    from src.config.db import get_connection
+
+# Finished jobs kept in admin_jobs for polling; older ones are pruned
+JOB_HISTORY = 50
+# Minimum seconds between progress writes to the database
+JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', 1))
+# How long a start waits for its job thread to take the kind's lock
+JOB_START_TIMEOUT = 10
+# First key of the two-key advisory locks, so job locks can't collide with other users
+JOB_LOCK_CLASS = 4201
+
+ACTIVE_STATUSES = ('running',)
+# Jobs start as soon as their row is written, so started_at is created_at
+JOB_COLUMNS = '''
+    id, kind, params, status, owner,
+    EXTRACT(EPOCH FROM created_at)::float8 AS created_at,
+    EXTRACT(EPOCH FROM created_at)::float8 AS started_at,
+    EXTRACT(EPOCH FROM updated_at)::float8 AS updated_at,
+    EXTRACT(EPOCH FROM finished_at)::float8 AS finished_at,
+    ROUND(EXTRACT(EPOCH FROM COALESCE(finished_at, NOW()) - created_at)::numeric, 3)::float8 AS elapsed,
+    progress, report, error
+'''
+# How long a start that lost the lock waits to see the winner's row
+JOB_CLAIM_WAIT = 1.0
+
+
+class Job:
+    """
+    One run of a background operation, as seen by the operation.
+
+    The operation receives the job and reports progress through
+    job.update(done=..., total=..., **extra); its return value becomes the
+    job's report. Progress is written to admin_jobs at most every
+    JOB_PROGRESS_INTERVAL seconds, and always when the job ends.
+    """
+
+    def __init__(self, kind, params):
+        self.id = None
+        self.kind = kind
+        self.params = params
+        self.progress = {}
+        self._conn = None
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+            self._write_progress()
+
+    def advance(self, count=1, **progress):
+        """Add `count` to progress['done'] and merge in any other progress fields"""
+        with self._lock:
+            self.progress['done'] = self.progress.get('done', 0) + count
+            self.progress.update(progress)
+            self._write_progress()
+
+    def checkpoint(self, **progress):
+        """update(), writing progress to admin_jobs now rather than when the interval allows"""
+        with self._lock:
+            self.progress.update(progress)
+            self._write_progress(force=True)
+
+    def _write_progress(self, force=False):
+        now = time.monotonic()
+        if self._conn is None or (not force and now - self._written_at < JOB_PROGRESS_INTERVAL):
+            return
+        self._written_at = now
+        try:
+            cur = self._conn.cursor()
+            cur.execute("UPDATE admin_jobs SET progress = %s, updated_at = NOW() WHERE id = %s",
+                        (psycopg2.extras.Json(self.progress), self.id))
+            cur.close()
+        except Exception as e:
+            print(f"Error saving progress for job {self.id}: {e}")
+
+    def _finish(self, status, report=None, error=None):
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute('''
+            UPDATE admin_jobs
+            SET status = %s, progress = %s, report = %s, error = %s, updated_at = NOW(), finished_at = NOW()
+            WHERE id = %s
+            ''', (status, psycopg2.extras.Json(self.progress),
+                  psycopg2.extras.Json(report) if report is not None else None, error, self.id))
+            cur.close()
+
+
+def _claim(job, conn):
+    """
+    Take the kind's lock and record the job as running.
+
+    Returns:
+        tuple: (job dict, started) - started is False if another worker
+            holds the lock, in which case its job is returned.
+    """
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s)) AS locked", (JOB_LOCK_CLASS, job.kind))
+        if not cur.fetchone()['locked']:
+            # The holder writes its row right after locking, and keeps the lock
+            # a moment after finishing - fall back to the kind's newest job
+            deadline = time.monotonic() + JOB_CLAIM_WAIT
+            while True:
+                cur.execute(f'''
+                SELECT {JOB_COLUMNS} FROM admin_jobs
+                WHERE kind = %s
+                ORDER BY id DESC LIMIT 1
+                ''', (job.kind,))
+                latest = cur.fetchone()
+                if (latest and latest['status'] in ACTIVE_STATUSES) or time.monotonic() >= deadline:
+                    break
+                time.sleep(0.05)
+            if latest is None:
+                raise RuntimeError(f"A {job.kind} job is starting in another worker")
+            return dict(latest), False
+
+        # The lock is ours, so any job of this kind still marked running lost its worker
+        cur.execute('''
+        UPDATE admin_jobs
+        SET status = 'abandoned', error = 'Worker stopped before the job finished', finished_at = NOW()
+        WHERE kind = %s AND status IN %s
+        ''', (job.kind, ACTIVE_STATUSES))
+        cur.execute(f'''
+        INSERT INTO admin_jobs (kind, params, status, owner, progress)
+        VALUES (%s, %s, 'running', %s, '{{}}')
+        RETURNING {JOB_COLUMNS}
+        ''', (job.kind, psycopg2.extras.Json(job.params), f"{socket.gethostname()}:{os.getpid()}"))
+        row = dict(cur.fetchone())
+        cur.execute('''
+        DELETE FROM admin_jobs
+        WHERE finished_at IS NOT NULL
+          AND id < (SELECT id FROM admin_jobs WHERE finished_at IS NOT NULL ORDER BY id DESC OFFSET %s LIMIT 1)
+        ''', (JOB_HISTORY,))
+        job.id = row['id']
+        return row, True
+    finally:
+        cur.close()
+
+
+def _release(conn):
+    """Give a job connection back to the pool without its session's advisory locks"""
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_unlock_all()")
+        cur.close()
+    except Exception as e:
+        print(f"Error releasing job locks: {e}")
+        # Closing the session drops its locks; the pool then discards the connection
+        psycopg2.extensions.connection.close(conn)
+    conn.close()
+
+
+def _run(job, operation, claimed, ready):
+    # The lock belongs to this thread's session, so the connection stays checked
+    # out here for the whole job and is never handed between threads
+    conn = None
+    try:
+        conn = get_connection(autocommit=True)
+        claimed['result'] = _claim(job, conn)
+    except Exception as e:
+        claimed['error'] = e
+    finally:
+        ready.set()
+    if 'result' not in claimed or not claimed['result'][1]:
+        if conn is not None:
+            _release(conn)
+        return
+
+    job._conn = conn
+    try:
+        try:
+            report = operation(job, **job.params)
+            job._finish('finished', report=report)
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            print(traceback.format_exc())
+            job._finish('failed', error=str(e))
+    except Exception as e:
+        print(f"Error recording the end of job {job.id}: {e}")
+    finally:
+        job._conn = None
+        _release(conn)
+
+
+def start_job(kind, operation, **params):
+    """
+    Run operation(job, **params) in the background.
+
+    Returns:
+        tuple: (job dict, started) - started is False if a job of this kind
+            was already running (in any worker), in which case that job is
+            returned.
+    """
+    job = Job(kind, params)
+    claimed = {}
+    ready = threading.Event()
+    thread = threading.Thread(target=_run, args=(job, operation, claimed, ready),
+                              name=f'job-{kind}', daemon=True)
+    thread.start()
+    if not ready.wait(JOB_START_TIMEOUT):
+        raise RuntimeError(f"Timed out starting {kind} job")
+    if 'error' in claimed:
+        raise claimed['error']
+    return claimed['result']
+
+
+def get_job(job_id):
+    """A job's status, progress and report, or None if there is no such job"""
+    conn = get_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute(f"SELECT {JOB_COLUMNS} FROM admin_jobs WHERE id = %s", (job_id,))
+        row = cur.fetchone()
+        conn.commit()
+        return dict(row) if row else None
+    finally:
+        cur.close()
+        conn.close()
+
+
+def list_jobs(kind=None):
+    """Known jobs, newest first"""
+    conn = get_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        if kind is None:
+            cur.execute(f"SELECT {JOB_COLUMNS} FROM admin_jobs ORDER BY id DESC")
+        else:
+            cur.execute(f"SELECT {JOB_COLUMNS} FROM admin_jobs WHERE kind = %s ORDER BY id DESC", (kind,))
+        rows = [dict(row) for row in cur.fetchall()]
+        conn.commit()
+        return rows
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,264 @@
+"""
+Listing link health checks
+
+This module:
+1. Checks whether listing URLs still resolve to a real page, concurrently
+   over the shared keep-alive session and rate limited per host
+2. Reads as little of each page as it can: a page already in the disk HTTP
+   cache is revalidated (a 304 costs no download), anything else is a
+   ranged GET for the first LINK_CHECK_PREFIX_BYTES bytes - a "not found"
+   page is usually settled there, and a page that still looks fine is read
+   to the end before it counts as found
+3. Caches each URL's result for LINK_CHECK_TTL seconds, so repeated sweeps
+   don't re-request pages checked moments ago
+4. Finds listings whose source page is gone, for the clean-404-urls job
+
+The site answers a missing page with a 200 "page not found" page as well as
+with a 404, so a status-only HEAD isn't enough - the ranged GET gets the
+status and the start of the body in one round trip, and only a page that
+looks alive after that costs the rest of its download.
+"""
+
+import os
+import time
+
+import requests
+
+try:
+    from config.db import get_connection, remove_properties
+    from cache import TTLCache
+    from fetcher import FETCH_CONCURRENCY, http_get, iter_concurrently
+    from http_cache import get_http_cache
+except ImportError:
+    from src.config.db import get_connection, remove_properties
+    from src.cache import TTLCache
+    from src.fetcher import FETCH_CONCURRENCY, http_get, iter_concurrently
+    from src.http_cache import get_http_cache
+
+LINK_CHECK_TIMEOUT = float(os.environ.get('LINK_CHECK_TIMEOUT', 5))
+LINK_CHECK_CONCURRENCY = int(os.environ.get('LINK_CHECK_CONCURRENCY', FETCH_CONCURRENCY))
+# How long a URL's result is reused before it is checked again
+LINK_CHECK_TTL = float(os.environ.get('LINK_CHECK_TTL', 3600))
+LINK_CHECK_CACHE_SIZE = int(os.environ.get('LINK_CHECK_CACHE_SIZE', 4096))
+# How much of an uncached page is read looking for a "not found" page
+LINK_CHECK_PREFIX_BYTES = int(os.environ.get('LINK_CHECK_PREFIX_BYTES', 64 * 1024))
+# How far before the prefix's end the rest of a page is re-read from
+LINK_CHECK_OVERLAP_BYTES = 256
+
+NOT_FOUND_STATUSES = (404, 410)
+# Body text of the site's "page not found" pages, lowercased
+NOT_FOUND_PHRASES = ('error: page not found', "this page isn't available", 'data-hook="error-code">404<')
+
+# Results don't depend on the database, so they only expire
+link_cache = TTLCache(LINK_CHECK_CACHE_SIZE, LINK_CHECK_TTL, generational=False)
+
+
+def looks_not_found(text):
+    """Whether lowercased page text is a "page not found" page"""
+    return any(phrase in text for phrase in NOT_FOUND_PHRASES) or ('<h1' in text and '404' in text)
+
+
+def _read_prefix(response):
+    """
+    Status code and raw body of the first LINK_CHECK_PREFIX_BYTES of a streamed response.
+
+    Returns:
+        tuple: (status, body bytes, complete) - complete is False when the
+            page goes on past the bytes read.
+    """
+    # Servers that ignore Range send the whole page - stop reading after the prefix
+    chunks, size = [], 0
+    for chunk in response.iter_content(chunk_size=16 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= LINK_CHECK_PREFIX_BYTES:
+            break
+    body = b''.join(chunks)
+    complete = size < LINK_CHECK_PREFIX_BYTES
+    if response.status_code == 206:
+        # "bytes 0-65535/183402" - the total says whether anything is left
+        total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        complete = total.isdigit() and int(total) <= len(body)
+    # 206 is the partial page asked for; 416 means there was nothing to range over
+    status = 200 if response.status_code in (206, 416) else response.status_code
+    return status, body, complete
+
+
+def _read_rest(url, response, body, timeout):
+    """
+    The rest of a page _read_prefix stopped short of.
+
+    A response that ignored Range is read on to the end; for a ranged one
+    the remainder is a second ranged GET, starting a little before the cut
+    so a phrase split across it is still seen.
+    """
+    if response.status_code != 206:
+        return b''.join(response.iter_content(chunk_size=64 * 1024))
+    start = max(len(body) - LINK_CHECK_OVERLAP_BYTES, 0)
+    with http_get(url, timeout=timeout, headers={'Range': f'bytes={start}-'}, allow_redirects=True) as rest:
+        if rest.status_code == 206:
+            return rest.content
+        if rest.status_code == 200:
+            # Range ignored this time - the whole page, so drop what we already have
+            return rest.content[start:]
+        return b''
+
+
+def _decode(body, encoding):
+    return body.decode(encoding or 'utf-8', errors='replace')
+
+
+def check_link(url, timeout=LINK_CHECK_TIMEOUT, use_cache=True):
+    """
+    Check one URL.
+
+    A page whose first LINK_CHECK_PREFIX_BYTES look fine is read to the end
+    before it is called found - the site's "not found" markup can come
+    after the prefix on large pages.
+
+    Returns:
+        dict: url, found (bool, None if the check itself failed), status,
+            reason, method ('cached', 'revalidated', 'range', 'full' - the
+            prefix wasn't enough - or 'error'), error, elapsed, checked_at.
+    """
+    if use_cache:
+        hit, result = link_cache.get(url)
+        if hit:
+            return dict(result, method='cached')
+
+    start = time.perf_counter()
+    result = {'url': url, 'found': None, 'status': None, 'reason': None, 'error': None}
+    try:
+        cache = get_http_cache()
+        entry = cache.get(url) if cache is not None else None
+        headers = {'Range': f'bytes=0-{LINK_CHECK_PREFIX_BYTES - 1}'}
+        if entry is not None:
+            # A page fetched before costs a 304 and no download unless it changed
+            headers.update(cache.conditional_headers(entry))
+        with http_get(url, timeout=timeout, headers=headers, allow_redirects=True, stream=True) as response:
+            if entry is not None and response.status_code == 304:
+                cache.mark_revalidated(url)
+                status = 200
+                # The whole page is on disk already
+                text = _decode(entry['body'], entry.get('encoding'))
+                result['method'] = 'revalidated'
+            else:
+                status, body, complete = _read_prefix(response)
+                text = _decode(body, response.encoding)
+                result['method'] = 'range'
+                if not complete and status == 200 and not looks_not_found(text.lower()):
+                    body += _read_rest(url, response, body, timeout)
+                    text = _decode(body, response.encoding)
+                    result['method'] = 'full'
+        result['status'] = status
+        if status == 410:
+            result.update(found=False, reason="Page gone (410)")
+        elif status in NOT_FOUND_STATUSES or looks_not_found(text.lower()):
+            result.update(found=False, reason="Page not found (404)")
+        else:
+            result['found'] = True
+    except requests.RequestException as e:
+        result.update(method='error', error=str(e))
+
+    result['elapsed'] = round(time.perf_counter() - start, 3)
+    result['checked_at'] = time.time()
+    # Failed checks are usually transient, so they aren't cached
+    if result['error'] is None:
+        link_cache.set(url, result)
+    return result
+
+
+def check_links(urls, progress=None, use_cache=True):
+    """
+    Check many URLs concurrently.
+
+    Args:
+        urls (iterable): URLs to check.
+        progress (callable): Called with each result as it comes in.
+        use_cache (bool): False to re-check URLs with a cached result.
+
+    Returns:
+        list: check_link results, in input order.
+    """
+    results = []
+    checks = iter_concurrently(lambda url: check_link(url, use_cache=use_cache), urls,
+                               max_workers=LINK_CHECK_CONCURRENCY)
+    for url, result, error in checks:
+        if error is not None:
+            result = {'url': url, 'found': None, 'status': None, 'reason': None, 'method': 'error',
+                      'error': str(error), 'elapsed': None, 'checked_at': time.time()}
+        results.append(result)
+        if progress is not None:
+            progress(result)
+    return results
+
+
+def normalize_listing_url(url):
+    if not url.startswith(('http://', 'https://')):
+        return 'https://' + url.lstrip('/')
+    return url
+
+
+def find_dead_listings(job, delete=False, use_cache=True):
+    """
+    Job body for /housing/api/clean-404-urls: check every Binghamton West
+    listing URL and optionally delete the listings whose page is gone.
+
+    A URL that couldn't be checked at all counts as invalid, as it always
+    has for this cleanup.
+
+    Returns:
+        dict: message, invalid_properties, deleted_count, audit_id (the
+            property_removals row), checked, and how many checks each
+            method answered.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        SELECT id, title, url
+        FROM properties
+        WHERE url LIKE '%%binghamtonwest.com%%'
+        ''')
+        properties = [row for row in cur.fetchall() if row[2]]
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    job.update(done=0, total=len(properties), invalid=0)
+    methods = {}
+
+    def progress(result):
+        methods[result['method']] = methods.get(result['method'], 0) + 1
+        job.advance(invalid=job.progress.get('invalid', 0) + (result['found'] is not True))
+
+    results = check_links([normalize_listing_url(url) for _, _, url in properties], progress, use_cache)
+
+    invalid_properties = []
+    for (property_id, title, url), result in zip(properties, results):
+        if result['found'] is True:
+            continue
+        entry = {'id': property_id, 'title': title, 'url': url}
+        if result['found'] is False:
+            entry.update(status_code=result['status'], reason=result['reason'])
+            print(f"404 URL found: {url}")
+        else:
+            entry['error'] = result['error']
+            print(f"Error checking URL {url}: {result['error']}")
+        invalid_properties.append(entry)
+
+    removal = {'removed': 0, 'audit_id': None}
+    if delete:
+        removal = remove_properties(ids=[entry['id'] for entry in invalid_properties],
+                                    reason="Listing URL returns 404")
+    deleted_count = removal['removed']
+    return {
+        "message": f"Found {len(invalid_properties)} properties with 404 URLs" +
+                   (f", {deleted_count} properties deleted" if deleted_count else ""),
+        "invalid_properties": invalid_properties,
+        "deleted_count": deleted_count,
+        "audit_id": removal['audit_id'],
+        "checked": len(results),
+        "methods": methods,
+    }
@@ -0,0 +1,165 @@
+"""
+Listing re-scrape job
+
+This module:
+1. Fills in missing bedrooms and prices on Binghamton West listings, from
+   the title where it says the bedroom count and from the listing's source
+   page otherwise
+2. Fetches the source pages concurrently, rate limited per host, while the
+   changes found so far are written in batches - one UPDATE per batch - so
+   no connection or transaction is held open across the fetches
+3. Reports progress as it goes, and how long each page took
+
+Runs through jobs.start_job, so one refresh runs at a time across all web
+workers and any of them can report its progress.
+"""
+
+import os
+import time
+
+try:
+    from config.db import get_connection, update_properties
+    from normalizer import infer_bedrooms, parse_price_value
+    from fetcher import FETCH_CONCURRENCY, iter_concurrently
+    from pipeline import BatchWriter
+    from scraper import extract_property_details
+except ImportError:
+    from src.config.db import get_connection, update_properties
+    from src.normalizer import infer_bedrooms, parse_price_value
+    from src.fetcher import FETCH_CONCURRENCY, iter_concurrently
+    from src.pipeline import BatchWriter
+    from src.scraper import extract_property_details
+
+REFRESH_CONCURRENCY = int(os.environ.get('LISTING_REFRESH_CONCURRENCY', FETCH_CONCURRENCY))
+# Listings changed per UPDATE
+REFRESH_BATCH_SIZE = int(os.environ.get('LISTING_REFRESH_BATCH_SIZE', 100))
+# Seconds a change may wait for its batch to fill before it is written anyway
+REFRESH_MAX_DELAY = float(os.environ.get('LISTING_REFRESH_MAX_DELAY', 5))
+
+# Prices that mean the listing didn't really have one
+PLACEHOLDER_PRICES = ('$', '$,', 'No price')
+SLOWEST_REPORTED = 10
+
+
+def listing_update(prop, details):
+    """
+    The changes scraped details make to a listing.
+
+    Only fills gaps: bedrooms if the listing has none, the price if it has
+    none or a placeholder.
+
+    Returns:
+        dict or None: id plus the changed fields, or None if nothing changes.
+    """
+    update = {}
+    if details.get('bedrooms') and not prop['bedrooms']:
+        update['bedrooms'] = details['bedrooms']
+    price = details.get('price')
+    if price and price not in PLACEHOLDER_PRICES and (not prop['price'] or prop['price'] in PLACEHOLDER_PRICES):
+        update['price'] = price
+        update['price_value'] = parse_price_value(price)
+    if not update:
+        return None
+    update['id'] = prop['id']
+    return update
+
+
+def timing_summary(seconds):
+    if not seconds:
+        return {'count': 0}
+    seconds = sorted(seconds)
+    return {
+        'count': len(seconds),
+        'total': round(sum(seconds), 3),
+        'mean': round(sum(seconds) / len(seconds), 3),
+        'p50': round(seconds[len(seconds) // 2], 3),
+        'p95': round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 3),
+        'max': round(seconds[-1], 3),
+    }
+
+
+def refresh_listing_sources(job):
+    """
+    Job body for /housing/api/update-property-database.
+
+    Returns:
+        dict: message, updated_count, total_count, errors, fetch timing
+            summary and the slowest pages.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+        SELECT id, title, url, price, bedrooms
+        FROM properties
+        WHERE url LIKE '%%binghamtonwest.com%%'
+        ''')
+        properties = [dict(zip(('id', 'title', 'url', 'price', 'bedrooms'), row))
+                      for row in cur.fetchall() if row[2]]
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+    errors = []
+    timings = []
+    updated = [0]
+
+    def write(batch):
+        try:
+            updated[0] += update_properties(batch)
+        except Exception as e:
+            # The listings in a failed batch are reported, the other batches still go through
+            errors.extend(f"Error updating property {update['id']}: {e}" for update in batch)
+            raise
+        # Runs on the writer's thread once a batch is committed, so pollers see committed counts
+        job.checkpoint(updated=updated[0])
+
+    # Bedrooms inferred from the title need no fetch; everything else is re-scraped
+    to_fetch = []
+    from_title = []
+    for prop in properties:
+        bedrooms = infer_bedrooms(prop['title']) if not prop['bedrooms'] else None
+        if bedrooms is not None:
+            from_title.append({'id': prop['id'], 'bedrooms': bedrooms})
+        else:
+            to_fetch.append(prop)
+    job.update(done=0, total=len(properties), fetched=0, updated=0, errors=0)
+
+    def fetch(prop):
+        start = time.perf_counter()
+        details = extract_property_details(prop['url'])
+        return details, time.perf_counter() - start
+
+    with BatchWriter(write, REFRESH_BATCH_SIZE, REFRESH_MAX_DELAY) as batches:
+        for update in from_title:
+            batches.add(update)
+        job.advance(len(from_title))
+
+        fetched = iter_concurrently(fetch, to_fetch, url=lambda prop: prop['url'], max_workers=REFRESH_CONCURRENCY)
+        for prop, result, error in fetched:
+            details, seconds = result if result is not None else (None, None)
+            if error is None and not (details and details.get('success')):
+                error = (details or {}).get('error', 'Unknown error')
+            if error is not None:
+                error_msg = f"Error updating property {prop['id']}: {error}"
+                print(error_msg)
+                errors.append(error_msg)
+            else:
+                update = listing_update(prop, details)
+                if update is not None:
+                    batches.add(update)
+            if seconds is not None:
+                timings.append({'id': prop['id'], 'url': prop['url'], 'seconds': round(seconds, 3),
+                                'changed': error is None and update is not None})
+            job.advance(fetched=len(timings), errors=len(errors))
+
+    slowest = sorted(timings, key=lambda timing: timing['seconds'], reverse=True)[:SLOWEST_REPORTED]
+    return {
+        "message": f"Database update complete. Updated {updated[0]} of {len(properties)} properties.",
+        "updated_count": updated[0],
+        "total_count": len(properties),
+        "errors": errors,
+        "fetch_seconds": timing_summary([timing['seconds'] for timing in timings]),
+        "slowest": slowest,
+    }
@@ -0,0 +1,94 @@
+"""
+Listing field normalizer
+
+This module:
+1. Holds the precompiled patterns used to clean up scraped listing fields
+2. Parses display prices such as "$1,200/mo" into an integer monthly rent
+3. Infers bedroom counts from listing titles at ingest time
+"""
+
+import re
+
+# Matches "$1,234", "$ 1234.56", "$950/mo" - the amount and an optional period
+PRICE_PATTERN = re.compile(r'\$\s*([\d,]+(?:\.\d+)?)(?:\s*/\s*([a-zA-Z]+))?')
+
+# Display values the scraper has used for "we don't know the price"
+NO_PRICE_VALUES = {'', '$', '$,', 'No price', 'Contact for price'}
+
+# Multipliers to turn a per-period price into a monthly one
+PRICE_PERIODS = {
+    'wk': 52 / 12,
+    'week': 52 / 12,
+    'yr': 1 / 12,
+    'year': 1 / 12,
+}
+
+
+def parse_price_value(price):
+    """
+    Parse a scraped price string into an integer monthly rent in dollars.
+
+    Args:
+        price (str): Display price, e.g. "$1,200" or "$300/week".
+
+    Returns:
+        int or None: Monthly rent, or None when the listing has no usable price.
+    """
+    if price is None:
+        return None
+
+    text = str(price).strip()
+    if text in NO_PRICE_VALUES:
+        return None
+
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return None
+
+    amount = match.group(1).replace(',', '')
+    if not amount:
+        return None
+
+    value = float(amount)
+    period = (match.group(2) or '').lower()
+    value *= PRICE_PERIODS.get(period, 1)
+
+    return int(round(value)) or None
+
+
+# Title patterns tried in order when a listing has no bedroom count:
+# explicit "2 Bed"/"2-BR", then the "Apt 2"/"Apt 2L" unit number, then a trailing number
+BEDROOM_TITLE_PATTERNS = (
+    re.compile(r'(\d+)[\s-]*(?:bed|br|bedroom)', re.I),
+    re.compile(r'apt\s+(\d+)', re.I),
+    re.compile(r'\s(\d+)$'),
+)
+
+
+def infer_bedrooms(title):
+    """
+    Infer a bedroom count from a listing title.
+
+    Args:
+        title (str): Listing title, e.g. "10 Seminary Apt 2".
+
+    Returns:
+        int or None: Bedroom count, or None when the title gives no hint.
+    """
+    if not title:
+        return None
+
+    text = title.strip()
+    for pattern in BEDROOM_TITLE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return int(match.group(1))
+
+    return None
+
+
+def normalize_bedrooms(bedrooms, title):
+    """Use the scraped bedroom count when present, otherwise infer it from the title"""
+    if bedrooms not in (None, ''):
+        return int(bedrooms)
+    return infer_bedrooms(title)
@@ -0,0 +1,302 @@
+"""
+Pipelined fetch / parse / write for the scraper
+
+This module:
+1. Fetches pages on a pool of I/O threads, rate limited per host
+2. Hands the fetched pages to a process pool, so CPU-bound parsing isn't
+   serialized by the GIL while fetches continue
+3. Writes the parsed records to the database in batches as they arrive,
+   by size or by time (BatchWriter, also used on its own by the default
+   scraper mode)
+4. Bounds every hand-off between stages, so memory stays flat however many
+   pages are queued, and reports each stage's throughput
+
+A stage that can't keep up shows as time blocked in the stage before it.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    from fetcher import FETCH_CONCURRENCY, HostRateLimiter
+except ImportError:
+    from src.fetcher import FETCH_CONCURRENCY, HostRateLimiter
+
+# Parser processes (default: one per CPU)
+PARSE_WORKERS = int(os.environ.get('SCRAPER_PARSE_WORKERS', os.cpu_count() or 1))
+# Items waiting between two stages, and pages being parsed at once
+PIPELINE_QUEUE_SIZE = int(os.environ.get('SCRAPER_PIPELINE_QUEUE_SIZE', 32))
+WRITE_BATCH_SIZE = int(os.environ.get('SCRAPER_WRITE_BATCH_SIZE', 100))
+# Seconds a record may wait for its batch to fill before it is written anyway (0: no limit)
+WRITE_MAX_DELAY = float(os.environ.get('SCRAPER_WRITE_MAX_DELAY', 5))
+# The fetch threads are already running when parser processes start, so they
+# mustn't be plain forks of this process
+PARSE_START_METHOD = os.environ.get('SCRAPER_PARSE_START_METHOD', 'forkserver')
+
+# How often the parse dispatcher checks for finished parses while waiting for pages
+POLL_INTERVAL = 0.05
+
+_DONE = object()
+
+
+class StageStats:
+    """
+    Throughput counters for one pipeline stage.
+
+    busy is the time spent doing the stage's own work (summed over its
+    workers); blocked is the time spent waiting to hand results to the next
+    stage, i.e. waiting on a slower stage downstream.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, items=1, errors=0):
+        with self._lock:
+            now = time.monotonic()
+            self.started = now - elapsed if self.started is None else min(self.started, now - elapsed)
+            self.finished = now
+            self.items += items
+            self.errors += errors
+            self.busy += elapsed
+
+    def record_blocked(self, elapsed):
+        with self._lock:
+            self.blocked += elapsed
+
+    def report(self):
+        wall = self.finished - self.started if self.started is not None else 0.0
+        rate = self.items / wall if wall > 0 else 0.0
+        return (f"{self.name}: {self.items} items, {self.errors} errors, {rate:.1f} items/s over {wall:.2f}s, "
+                f"{self.busy:.2f}s busy, {self.blocked:.2f}s blocked downstream")
+
+
+def _handoff(target, entry, stats):
+    start = time.perf_counter()
+    target.put(entry)
+    stats.record_blocked(time.perf_counter() - start)
+
+
+def _timed_call(fn, args):
+    """Runs in a parser process: fn(*args) and how long it took"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class BatchWriter:
+    """
+    Collects records and passes them to `write` in batches.
+
+    A batch is written once it holds `batch_size` records or its oldest
+    record has waited `max_delay` seconds, whichever comes first - the time
+    limit is kept by a background thread, so records are written promptly
+    even while the producer is blocked waiting for the next one. Batches are
+    written one at a time, in order. A failed batch is reported and counted,
+    not raised, so one bad write doesn't stop the records behind it.
+
+    Use as a context manager, or call close() to write the last batch.
+    """
+
+    def __init__(self, write, batch_size=WRITE_BATCH_SIZE, max_delay=WRITE_MAX_DELAY, stats=None):
+        self.write = write
+        self.batch_size = max(1, batch_size)
+        self.max_delay = max_delay
+        self.stats = stats or StageStats('write')
+        self._batch = []
+        self._oldest = None
+        self._closed = False
+        self._pending = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._timer = None
+        if max_delay and max_delay > 0:
+            self._timer = threading.Thread(target=self._flush_when_due, name='write-timer', daemon=True)
+            self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, record):
+        with self._pending:
+            self._batch.append(record)
+            if len(self._batch) == 1:
+                self._oldest = time.monotonic()
+                self._pending.notify()
+            full = len(self._batch) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._pending:
+                batch, self._batch = self._batch, []
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                self.write(batch)
+                errors = 0
+            except Exception as e:
+                print(f"Error writing batch of {len(batch)}: {e}")
+                errors = len(batch)
+            self.stats.record(time.perf_counter() - start, items=len(batch), errors=errors)
+
+    def _flush_when_due(self):
+        while True:
+            with self._pending:
+                while not self._closed:
+                    if not self._batch:
+                        self._pending.wait()
+                        continue
+                    remaining = self._oldest + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._pending.wait(remaining)
+                if self._closed:
+                    return
+            self.flush()
+
+    def close(self):
+        with self._pending:
+            self._closed = True
+            self._pending.notify()
+        if self._timer is not None:
+            self._timer.join()
+        self.flush()
+
+
+def run_pipeline(items, fetch, parse, write, url=lambda item: item, fetch_workers=FETCH_CONCURRENCY,
+                 parse_workers=PARSE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE,
+                 max_delay=WRITE_MAX_DELAY, limiter=None):
+    """
+    Run items through fetch threads, parser processes and a batching writer.
+
+    Every item reaches `write` exactly once, as (item, context, result,
+    error, parse_seconds): error is the exception from fetch or parse, if
+    any; parse_seconds is how long the parser process spent on it (None if
+    it wasn't parsed).
+
+    Args:
+        items (iterable): Work items, consumed lazily.
+        fetch (callable): item -> (context, parse_args). Runs on a fetch
+            thread. parse_args None skips parsing (result is then None);
+            context stays in this process and is passed on to write.
+        parse (callable): parse(*parse_args) -> result. Runs in a parser
+            process, so it, its arguments and its result must pickle.
+        write (callable): Called on the writer thread with each batch.
+        url (callable): item -> URL, used to pick the host to rate limit.
+        fetch_workers (int): Fetch threads.
+        parse_workers (int): Parser processes.
+        queue_size (int): Bound on each hand-off queue and on parses in flight.
+        batch_size, max_delay: When a batch is written - see BatchWriter.
+        limiter (HostRateLimiter): Shared limiter; a new default one if None.
+
+    Returns:
+        dict: StageStats for 'fetch', 'parse' and 'write'.
+    """
+    stats = {name: StageStats(name) for name in ('fetch', 'parse', 'write')}
+    limiter = limiter or HostRateLimiter()
+    queue_size = max(1, queue_size)
+    pending_items = iter(items)
+    items_lock = threading.Lock()
+    parse_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+
+    def fetch_worker():
+        while True:
+            with items_lock:
+                item = next(pending_items, _DONE)
+            if item is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                limiter.wait(url(item))
+                start = time.perf_counter()
+                context, parse_args = fetch(item)
+                error = None
+            except Exception as e:
+                context, parse_args, error = None, None, e
+            stats['fetch'].record(time.perf_counter() - start, errors=int(error is not None))
+            _handoff(parse_queue, (item, context, parse_args, error), stats['fetch'])
+
+    def parse_dispatcher(executor):
+        in_flight = {}
+        fetching = True
+        while fetching or in_flight:
+            if fetching and len(in_flight) < queue_size:
+                try:
+                    entry = parse_queue.get(timeout=POLL_INTERVAL if in_flight else None)
+                except queue.Empty:
+                    entry = None
+                if entry is _DONE:
+                    fetching = False
+                elif entry is not None:
+                    item, context, parse_args, error = entry
+                    if parse_args is not None:
+                        try:
+                            in_flight[executor.submit(_timed_call, parse, parse_args)] = (item, context)
+                        except Exception as e:
+                            # The pool is broken (a parser process died); fail the rest without parsing
+                            stats['parse'].record(0.0, errors=1)
+                            parse_args, error = None, e
+                    if parse_args is None:
+                        _handoff(write_queue, (item, context, None, error, None), stats['parse'])
+            if not in_flight:
+                continue
+            # Block on the parsers only when no more pages may be queued to them
+            at_capacity = not fetching or len(in_flight) >= queue_size
+            done, _ = wait(in_flight, timeout=None if at_capacity else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, context = in_flight.pop(future)
+                try:
+                    result, elapsed = future.result()
+                    error = None
+                except Exception as e:
+                    result, elapsed, error = None, None, e
+                stats['parse'].record(elapsed or 0.0, errors=int(error is not None))
+                _handoff(write_queue, (item, context, result, error, elapsed), stats['parse'])
+        write_queue.put(_DONE)
+
+    def writer():
+        with BatchWriter(write, batch_size, max_delay, stats['write']) as batches:
+            while True:
+                entry = write_queue.get()
+                if entry is _DONE:
+                    return
+                batches.add(entry)
+
+    with ProcessPoolExecutor(max_workers=max(1, parse_workers),
+                             mp_context=multiprocessing.get_context(PARSE_START_METHOD)) as executor:
+        fetchers = [threading.Thread(target=fetch_worker, name=f'fetch-{index}')
+                    for index in range(max(1, fetch_workers))]
+        dispatcher = threading.Thread(target=parse_dispatcher, args=(executor,), name='parse-dispatch')
+        writer_thread = threading.Thread(target=writer, name='write')
+        for thread in fetchers + [dispatcher, writer_thread]:
+            thread.start()
+        for thread in fetchers:
+            thread.join()
+        parse_queue.put(_DONE)
+        dispatcher.join()
+        writer_thread.join()
+
+    return stats
+
+
+def print_pipeline_report(stats):
+    print("\nPipeline report:")
+    for stage in stats.values():
+        print(f"  {stage.report()}")
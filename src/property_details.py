@@ -0,0 +1,123 @@
+"""
+Property detail store
+
+This module:
+1. Reads scraped detail-page content (amenities, description, availability)
+   from the property_details table instead of scraping on every view
+2. Classifies stored details as fresh or stale against a configurable window
+3. Re-scrapes stale or missing details on a small background thread pool,
+   so requests are served from the table immediately (stale-while-revalidate)
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+try:
+    from config.db import save_property_details, record_property_details_error
+    from scraper import extract_property_details
+except ImportError:
+    from src.config.db import save_property_details, record_property_details_error
+    from src.scraper import extract_property_details
+
+# Details younger than this are served as-is; older ones are served and refreshed
+PROPERTY_DETAILS_MAX_AGE = float(os.environ.get('PROPERTY_DETAILS_MAX_AGE', 24 * 3600))
+# Minimum wait before retrying a url whose last scrape failed
+PROPERTY_DETAILS_RETRY_AFTER = float(os.environ.get('PROPERTY_DETAILS_RETRY_AFTER', 900))
+PROPERTY_DETAILS_WORKERS = int(os.environ.get('PROPERTY_DETAILS_WORKERS', 2))
+
+# Only these sources have detail pages extract_property_details understands
+DETAIL_SOURCES = ('binghamtonwest.com',)
+
+_executor = None
+_executor_pid = None
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def has_detail_page(url):
+    return bool(url) and any(source in url for source in DETAIL_SOURCES)
+
+
+def details_status(fetched_at, attempted_at=None, now=None):
+    """
+    Classify stored details.
+
+    Returns:
+        tuple: (status, needs_refresh) - status is 'fresh', 'stale' or 'missing'.
+    """
+    now = now or datetime.now()
+    if fetched_at is None:
+        status = 'missing'
+    elif now - fetched_at > timedelta(seconds=PROPERTY_DETAILS_MAX_AGE):
+        status = 'stale'
+    else:
+        return 'fresh', False
+
+    # Back off after a failed attempt instead of re-scraping on every view
+    recently_attempted = (
+        attempted_at is not None
+        and (fetched_at is None or attempted_at > fetched_at)
+        and now - attempted_at < timedelta(seconds=PROPERTY_DETAILS_RETRY_AFTER)
+    )
+    return status, not recently_attempted
+
+
+def refresh_details(url):
+    """
+    Scrape a listing's detail page and persist the result.
+
+    Returns:
+        dict or None: The scraped details, or None if the scrape failed.
+    """
+    details = extract_property_details(url)
+    if not details or not details.get('success'):
+        error = (details or {}).get('error', 'Unknown error')
+        record_property_details_error(url, error)
+        return None
+
+    save_property_details(url, details)
+    return details
+
+
+def _refresh_in_background(url):
+    try:
+        refresh_details(url)
+    except Exception as e:
+        print(f"Background detail refresh failed for {url}: {e}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(url)
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=PROPERTY_DETAILS_WORKERS,
+            thread_name_prefix='property-details'
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def schedule_refresh(url):
+    """
+    Queue a background re-scrape of `url` unless one is already running.
+
+    Returns:
+        bool: True if a refresh was queued.
+    """
+    with _in_flight_lock:
+        if url in _in_flight:
+            return False
+        _in_flight.add(url)
+    try:
+        _get_executor().submit(_refresh_in_background, url)
+    except Exception as e:
+        with _in_flight_lock:
+            _in_flight.discard(url)
+        print(f"Could not schedule detail refresh for {url}: {e}")
+        return False
+    return True
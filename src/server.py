@@ -23,11 +23,10 @@ except ImportError:
 from server_ui.students.routes.student_routes import student_bp
 from server_ui.students.routes.page_routes import page_bp
 from server_ui.routes.housing import housing_bp
-# Database connection parameters
-hostname = 'database'  # Use the service name from docker-compose.yml
-database = 'test_db'
-username = 'postgres'
-password = 'team13'
+from server_ui.utils.pagination import (
+    PaginationError, parse_limit, parse_fields, select_columns, keyset_conditions, paginate_rows
+)
+from config.db import get_connection, release_thread_connections
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
@@ -39,14 +38,6 @@ from scraper import main as run_scraper
 app = Flask(__name__, template_folder='server_ui/templates',static_folder='server_ui/static')
 CORS(app)
 
-# Database connection parameters
-DB_CONFIG = {
-    'host': hostname,
-    'dbname': database,
-    'user': username,
-    'password': password
-}
-
 # Configure session
 app.secret_key = 'team13-secret-key'  # Replace with a real secret key in production
 app.config['SESSION_TYPE'] = 'filesystem'
@@ -56,10 +47,14 @@ app.config['SESSION_FILE_DIR'] = '/flask_session'
 
 
 def get_db_connection():
-    """Create a connection to the database"""
-    conn = psycopg2.connect(**DB_CONFIG)
-    conn.autocommit = True
-    return conn
+    """Check out a connection from the shared pool (close() returns it)"""
+    return get_connection(autocommit=True)
+
+
+@app.teardown_appcontext
+def release_db_connections(exception=None):
+    """Return any pooled connections a handler left open, e.g. on an early return or error"""
+    release_thread_connections()
 
 
 # Add the function to app config for use in blueprints
@@ -77,29 +72,50 @@ def index():
 
 @app.route('/properties', methods=['GET'])
 def get_properties():
-    """Get all properties or filter by bedrooms"""
+    """
+    Get all properties or filter by bedrooms
+
+    Supports limit/cursor keyset paging (ordered by id) and a fields= projection.
+    """
     bedrooms = request.args.get('bedrooms')
+    cursor = request.args.get('cursor')
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        fields = parse_fields(request.args.get('fields'))
+        columns, hidden_columns = select_columns(fields, 'id_asc')
+        conditions = ["active"]
+        params = []
+        if cursor:
+            # id order resumes with a single range
+            [(cursor_condition, cursor_params)] = keyset_conditions('id_asc', cursor)
+            conditions.append(cursor_condition)
+            params.extend(cursor_params)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     
     if bedrooms:
         if bedrooms == '4':
-            cur.execute("SELECT * FROM properties WHERE bedrooms >= %s ORDER BY id", (bedrooms,))
+            conditions.append("bedrooms >= %s")
         else:
-            cur.execute("SELECT * FROM properties WHERE bedrooms = %s ORDER BY id", (bedrooms,))
-    else:
-        cur.execute("SELECT * FROM properties ORDER BY id")
+            conditions.append("bedrooms = %s")
+        params.append(bedrooms)
+    
+    where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+    limit_clause = f" LIMIT {limit + 1}" if limit is not None else ""
     
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    cur.execute(f"SELECT {columns} FROM properties {where}ORDER BY id{limit_clause}", params)
     properties = cur.fetchall()
     cur.close()
     conn.close()
     
     # Convert to list of dictionaries
-    result = []
-    for prop in properties:
-        result.append(dict(prop))
+    result, next_cursor = paginate_rows(properties, limit, 'id_asc', hidden_columns)
     
+    if limit is not None or cursor:
+        return jsonify({"properties": result, "next_cursor": next_cursor})
     return jsonify(result)
 
 @app.route('/properties/<int:property_id>', methods=['GET'])
@@ -5,11 +5,10 @@
 # - Logic for rendering housing templates
 """
 
-from flask import Blueprint, render_template, request, current_app, jsonify, session
+from flask import Blueprint, render_template, request, current_app, jsonify, session, json
 import psycopg2
 import psycopg2.extras
 import os
-import requests
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 
@@ -20,15 +19,53 @@ except ImportError:
     # Alternative import path for Docker environment
     from src.scraper import extract_property_details
 
+# Shared connection pool - close() on a pooled connection returns it to the pool
+try:
+    from config.db import get_connection, pool_stats, remove_properties
+    from http_cache import get_http_cache
+    from cache import listings_cache, property_cache, current_generation, bump_generation
+    from property_details import has_detail_page, details_status, schedule_refresh, refresh_details
+    from jobs import start_job, get_job, list_jobs
+    from link_checker import find_dead_listings, link_cache
+    from listing_refresh import refresh_listing_sources
+except ImportError:
+    from src.config.db import get_connection, pool_stats, remove_properties
+    from src.http_cache import get_http_cache
+    from src.cache import listings_cache, property_cache, current_generation, bump_generation
+    from src.property_details import has_detail_page, details_status, schedule_refresh, refresh_details
+    from src.jobs import start_job, get_job, list_jobs
+    from src.link_checker import find_dead_listings, link_cache
+    from src.listing_refresh import refresh_listing_sources
+
+try:
+    from server_ui.utils.pagination import (
+        PaginationError, normalize_sort, order_clause, parse_limit, parse_fields,
+        select_columns, keyset_conditions, paginate_rows
+    )
+except ImportError:
+    from src.server_ui.utils.pagination import (
+        PaginationError, normalize_sort, order_clause, parse_limit, parse_fields,
+        select_columns, keyset_conditions, paginate_rows
+    )
+
 housing_bp = Blueprint('housing', __name__)
 
-# Database configuration - direct connection
-DB_CONFIG = {
-    'host': os.environ.get('POSTGRES_HOST', 'database'),
-    'database': os.environ.get('POSTGRES_DB', 'test_db'),
-    'user': os.environ.get('POSTGRES_USER', 'postgres'),
-    'password': os.environ.get('POSTGRES_PASSWORD', 'team13')
-}
+# The per-request estimate listings without a geocoded distance used to get:
+# a figure per street, 1.0 for other streets and 1.5 without a location. The
+# distance filter still holds them to it
+ESTIMATED_DISTANCE_SQL = '''
+CASE
+    WHEN location IS NULL OR location = '' THEN 1.5
+    WHEN location ILIKE '%%seminary%%' THEN 0.8
+    WHEN location ILIKE '%%murray%%' THEN 1.2
+    WHEN location ILIKE '%%leroy%%' THEN 0.9
+    WHEN location ILIKE '%%front%%' THEN 0.5
+    WHEN location ILIKE '%%walnut%%' THEN 1.3
+    WHEN location ILIKE '%%chapin%%' THEN 1.8
+    WHEN location ILIKE '%%ayres%%' THEN 1.5
+    ELSE 1.0
+END
+'''
 
 @housing_bp.route('/', methods=['GET'])
 def home_page():
@@ -50,139 +87,200 @@ def property_detail_page(property_id):
     """Render the property detail page"""
     return render_template('housing/property_detail.html', property_id=property_id)
 
-@housing_bp.route('/api/properties/<int:property_id>', methods=['GET'])
-def get_property(property_id):
-    """API endpoint to get a specific property by ID"""
+def fetch_property_with_details(property_id):
+    """Load a listing joined with its stored detail-page content"""
+    conn = get_connection()
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        cur.execute("SELECT * FROM properties WHERE id = %s", (property_id,))
+        cur.execute("""
+        SELECT p.*,
+               d.bedrooms AS detail_bedrooms,
+               d.price AS detail_price,
+               d.amenities,
+               d.description,
+               d.availability,
+               d.fetched_at AS details_fetched_at,
+               d.attempted_at AS details_attempted_at
+        FROM properties p
+        LEFT JOIN property_details d ON d.url = p.url
+        WHERE p.id = %s
+        """, (property_id,))
         property = cur.fetchone()
-        
         cur.close()
+        return property
+    finally:
         conn.close()
+
+@housing_bp.route('/api/properties/<int:property_id>', methods=['GET'])
+def get_property(property_id):
+    """
+    API endpoint to get a specific property by ID
+
+    Returns the listing together with its stored detail-page content
+    (amenities, description, availability) in one response. Pass
+    refresh=true to re-scrape the source before answering.
+    """
+    refresh = request.args.get('refresh', 'false').lower() == 'true'
+    
+    # Cached responses are shared across workers when Redis is configured
+    generation = current_generation()
+    if not refresh:
+        hit, cached = property_cache.get(property_id)
+        if hit:
+            return json_response(cached)
+    
+    try:
+        # Detail-page content comes from property_details, refreshed in the
+        # background, rather than scraping the source on every view
+        property = fetch_property_with_details(property_id)
+        
+        refresh_failed = False
+        if property and refresh and has_detail_page(property['url']):
+            refresh_failed = refresh_details(property['url']) is None
+            generation = current_generation()
+            property = fetch_property_with_details(property_id)
         
         if property:
             property_dict = dict(property)
+            detail_bedrooms = property_dict.pop('detail_bedrooms')
+            detail_price = property_dict.pop('detail_price')
+            fetched_at = property_dict.pop('details_fetched_at')
+            attempted_at = property_dict.pop('details_attempted_at')
             
             # Fix price formatting
             if not property_dict['price'] or property_dict['price'] == 'No price' or property_dict['price'] == '$,' or property_dict['price'] == '$':
                 property_dict['price'] = 'Contact for price'
             
-            # Calculate distance to Binghamton University if location exists
+            # Distance to Binghamton University is stored at ingest from the gazetteer
             if property_dict.get('location'):
-                try:
-                    # Binghamton University coordinates
-                    bu_coords = {"lat": 42.0896, "lng": -75.9672}
-                    
-                    # Use the existing location to calculate an approximate distance
-                    # Since we don't have geocoding in place, we'll use a static value if it exists
-                    # or calculate a rough estimate based on address patterns
-                    
-                    # Check if there's already a distance field in the database
-                    if property_dict.get('distance'):
-                        # Convert to string with miles unit
-                        property_dict['distance_to_bu'] = f"{property_dict['distance']} miles"
-                    else:
-                        # Rough distance estimate based on the location
-                        location = property_dict['location'].lower()
-                        
-                        # Example distance mapping - in a real app this would use geocoding
-                        if 'seminary' in location:
-                            distance = 0.8
-                        elif 'murray' in location:
-                            distance = 1.2
-                        elif 'leroy' in location:
-                            distance = 0.9
-                        elif 'front' in location:
-                            distance = 0.5
-                        elif 'walnut' in location:
-                            distance = 1.3
-                        elif 'chapin' in location:
-                            distance = 1.8
-                        elif 'ayres' in location:
-                            distance = 1.5
-                        else:
-                            # Default distance estimate
-                            distance = 1.0
-                            
-                        property_dict['distance_to_bu'] = f"{distance} miles"
-                except Exception as e:
-                    print(f"Error calculating distance: {e}")
+                if property_dict.get('distance') is not None:
+                    property_dict['distance_to_bu'] = f"{property_dict['distance']} miles"
+                else:
                     property_dict['distance_to_bu'] = "Distance information unavailable"
             else:
                 property_dict['distance_to_bu'] = "Location not provided"
             
-            # If this is a Binghamton West property, fetch updated details from source
-            if property_dict['url'] and 'binghamtonwest.com' in property_dict['url']:
-                try:
-                    # Use the extract_property_details function to get fresh data
-                    updated_details = extract_property_details(property_dict['url'])
-                    
-                    # If successful, update the property details
-                    if updated_details and updated_details.get('success'):
-                        # Update bedrooms if available in the fresh data
-                        if updated_details.get('bedrooms'):
-                            property_dict['bedrooms'] = updated_details['bedrooms']
-                            
-                        # Update amenities if available
-                        if updated_details.get('amenities'):
-                            property_dict['amenities'] = updated_details['amenities']
-                        
-                        # Update description if available
-                        if updated_details.get('description'):
-                            property_dict['description'] = updated_details['description']
-                            
-                        # Update price if available
-                        if updated_details.get('price'):
-                            # Ensure it's not just "$" or "$,"
-                            price = updated_details['price']
-                            if price and price not in ['$', '$,', 'No price']:
-                                property_dict['price'] = price
-                            else:
-                                property_dict['price'] = 'Contact for price'
-                except Exception as e:
-                    print(f"Error fetching updated property details: {e}")
-                    # Continue with existing data if update fails
+            # For Binghamton West properties, overlay the stored detail-page content
+            if has_detail_page(property_dict['url']):
+                status, needs_refresh = details_status(fetched_at, attempted_at)
+                if status != 'missing':
+                    if detail_bedrooms:
+                        property_dict['bedrooms'] = detail_bedrooms
+                    # Ensure it's not just "$" or "$,"
+                    if detail_price and detail_price not in ['$', '$,', 'No price']:
+                        property_dict['price'] = detail_price
+                    else:
+                        property_dict['price'] = 'Contact for price'
+                else:
+                    for field in ('amenities', 'description', 'availability'):
+                        property_dict.pop(field, None)
+                
+                # Serve what we have now; a stale or missing entry is re-scraped in the background
+                if needs_refresh:
+                    schedule_refresh(property_dict['url'])
+                    if status == 'missing':
+                        status = 'pending'
+                property_dict['details_status'] = status
+                property_dict['details_fetched_at'] = fetched_at
+                # A cached stale or pending answer would hide the listing from
+                # schedule_refresh until it expired, so only fresh ones are kept
+                cacheable = status == 'fresh'
+            else:
+                cacheable = True
+                for field in ('amenities', 'description', 'availability'):
+                    property_dict.pop(field, None)
+            
+            if refresh:
+                property_dict['details_refresh_failed'] = refresh_failed
             
-            return jsonify(property_dict)
+            body = json.dumps(property_dict)
+            if not refresh and cacheable:
+                property_cache.set(property_id, body, generation)
+            return json_response(body)
         else:
             return jsonify({"error": "Property not found"}), 404
     except Exception as e:
         print(f"Error in /api/properties/{property_id}: {str(e)}")
         return jsonify({"error": str(e), "message": "Database error occurred"}), 500
 
+def json_response(body):
+    """Wrap an already-serialized JSON body, as stored in the response caches"""
+    return current_app.response_class(body, mimetype='application/json')
+
+def listings_cache_key(bedrooms, min_price, max_price, max_distance, sort, with_price_only,
+                       include_all, limit, cursor, fields):
+    """Normalize listings query parameters so equivalent requests share a cache entry"""
+    def number(value, cast):
+        if value in (None, ''):
+            return None
+        try:
+            return cast(value)
+        except ValueError:
+            return value
+
+    return (
+        bedrooms or None,
+        number(min_price, int),
+        number(max_price, int),
+        number(max_distance, float),
+        sort,
+        with_price_only,
+        include_all,
+        limit,
+        cursor or None,
+        tuple(fields) if fields else None,
+    )
+
 @housing_bp.route('/api/listings', methods=['GET'])
 def get_listings():
-    """API endpoint to get listings data"""
+    """
+    API endpoint to get listings data
+
+    Pass limit (and then the returned next_cursor) to page through results,
+    and fields=id,title,... to select only the columns the client renders.
+    """
     bedrooms = request.args.get('bedrooms')
     min_price = request.args.get('min_price')
     max_price = request.args.get('max_price')
     max_distance = request.args.get('distance')  # Add support for distance filter
-    sort = request.args.get('sort', 'id_asc')  # Default sort by ID ascending
+    sort = normalize_sort(request.args.get('sort', 'id_asc'))  # Default sort by ID ascending
     show_with_price_only = request.args.get('with_price_only', 'false').lower() == 'true'
     include_all = request.args.get('include_all', 'false').lower() == 'true'  # New parameter to optionally include all properties
+    cursor = request.args.get('cursor')
+    
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        fields = parse_fields(request.args.get('fields'))
+        # Each page query resumes after the cursor, one keyset range at a time
+        page_branches = keyset_conditions(sort, cursor) if cursor else [(None, [])]
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+    paged = limit is not None or bool(cursor)
     
-    print(f"API Request for listings: bedrooms={bedrooms}, min_price={min_price}, max_price={max_price}, max_distance={max_distance}, sort={sort}")
+    # Serve repeated queries from cache until the data changes - the cache
+    # holds serialized bodies so local and Redis hits return identical output
+    cache_key = listings_cache_key(
+        bedrooms, min_price, max_price, max_distance, sort, show_with_price_only,
+        include_all, limit, cursor, fields
+    )
+    generation = current_generation()
+    hit, cached = listings_cache.get(cache_key)
+    if hit:
+        return json_response(cached)
+    
+    print(f"API Request for listings: bedrooms={bedrooms}, min_price={min_price}, max_price={max_price}, max_distance={max_distance}, sort={sort}, limit={limit}")
     
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
-        # Build query based on sort parameter
-        sort_clause = "ORDER BY id ASC"  # Default sort
-        if sort == 'price_asc':
-            sort_clause = "ORDER BY price ASC, id ASC"
-        elif sort == 'price_desc':
-            sort_clause = "ORDER BY price DESC, id ASC"
-        elif sort == 'id_desc':
-            sort_clause = "ORDER BY id DESC"
-        
+        # Sort on indexed columns - price_value is the parsed monthly rent,
+        # distance the precomputed miles to campus
+        sort_clause = order_clause(sort)
+        columns, hidden_columns = select_columns(fields, sort)
         # Start building the query and parameters
-        query_conditions = []
+        # Listings the scraper no longer finds are retired, not deleted
+        query_conditions = ["active"]
         query_params = []
         
         # Add Binghamton West filter unless include_all=true
@@ -197,167 +295,111 @@ def get_listings():
                 query_conditions.append("bedrooms = %s")
             query_params.append(bedrooms)
         
-        # Build base query
-        if query_conditions:
-            query = f"SELECT * FROM properties WHERE {' AND '.join(query_conditions)} {sort_clause}"
-        else:
-            query = f"SELECT * FROM properties {sort_clause}"
+        # Distance is precomputed at ingest from the gazetteer coordinates.
+        # Listings that couldn't be geocoded have none, and pass only if their
+        # old estimate is within the limit
+        if max_distance:
+            query_conditions.append(f"(distance <= %s OR (distance IS NULL AND {ESTIMATED_DISTANCE_SQL} <= %s))")
+            query_params.extend([float(max_distance), float(max_distance)])
+        
+        # Price filters run against the numeric price_value column
+        price_conditions = []
+        price_params = []
+        if min_price or max_price or show_with_price_only:
+            price_conditions.append("price_value IS NOT NULL")
+        if min_price:
+            price_conditions.append("price_value >= %s")
+            price_params.append(int(min_price))
+        if max_price:
+            price_conditions.append("price_value <= %s")
+            price_params.append(int(max_price))
+        
+        def fetch_page(conditions, params):
+            """Fetch up to limit + 1 rows after the cursor, one keyset range at a time"""
+            rows = []
+            for page_condition, page_params in page_branches:
+                wanted = limit + 1 - len(rows) if limit is not None else None
+                if wanted is not None and wanted <= 0:
+                    break
+                branch_conditions = conditions + ([page_condition] if page_condition else [])
+                where = f"WHERE {' AND '.join(branch_conditions)} " if branch_conditions else ""
+                limit_clause = f" LIMIT {wanted}" if wanted is not None else ""
+                query = f"SELECT {columns} FROM properties {where}{sort_clause}{limit_clause}"
+                print(f"Executing query: {query} with params: {params + page_params}")
+                cur.execute(query, params + page_params)
+                rows.extend(cur.fetchall())
+            return rows
+        
+        properties = fetch_page(query_conditions + price_conditions, query_params + price_params)
+        
+        # If price filters are set but no matching property has a price at all,
+        # return the unfiltered listings with a flag to inform the frontend
+        all_no_price = False
+        if not properties and (min_price or max_price):
+            where = f"WHERE {' AND '.join(query_conditions + ['price_value IS NOT NULL'])}"
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM properties {where})", query_params)
+            if not cur.fetchone()[0]:
+                all_no_price = True
+                properties = fetch_page(query_conditions, query_params)
         
-        print(f"Executing query: {query} with params: {query_params}")
-        
-        cur.execute(query, query_params)
-        properties = cur.fetchall()
+        cur.close()
+        conn.close()
         
         print(f"Fetched {len(properties)} properties from database")
         
-        # Convert to list of dictionaries
-        all_properties = []
-        for row in properties:
-            property_dict = dict(row)
-            
+        all_properties, next_cursor = paginate_rows(properties, limit, sort, hidden_columns)
+        
+        for property_dict in all_properties:
             # Fix price formatting
-            if not property_dict['price'] or property_dict['price'] == 'No price' or property_dict['price'] == '$,' or property_dict['price'] == '$':
+            if 'price' in property_dict and (not property_dict['price'] or property_dict['price'] == 'No price' or property_dict['price'] == '$,' or property_dict['price'] == '$'):
                 property_dict['price'] = 'Contact for price'
-            
-            # Ensure bedrooms is a valid value
-            if property_dict['bedrooms'] is None or property_dict['bedrooms'] == '':
-                # Try to extract bedrooms from title
-                title = property_dict.get('title', '')
-                try:
-                    # Look for patterns like "2 Bedroom" or "2 BR" or "2-Bedroom" or "Apt 2" or ending with 2
-                    import re
-                    
-                    # First, check for explicit bedroom mentions
-                    bedroom_match = re.search(r'(\d+)[\s-]*(bed|br|bedroom)', title.lower())
-                    if bedroom_match:
-                        property_dict['bedrooms'] = int(bedroom_match.group(1))
-                    
-                    # If no match, check for "Apt X" pattern
-                    elif re.search(r'apt\s+(\d+)', title.lower()):
-                        apt_match = re.search(r'apt\s+(\d+)', title.lower())
-                        property_dict['bedrooms'] = int(apt_match.group(1))
-                    
-                    # If still no match, check if property address ends with a number
-                    elif re.search(r'\s(\d+)$', title.strip()):
-                        end_match = re.search(r'\s(\d+)$', title.strip())
-                        property_dict['bedrooms'] = int(end_match.group(1))
-                    
-                    # Look for apartment number after the suffix like 1L, 2R, etc.
-                    elif re.search(r'apt\s+\d+[a-zA-Z]', title.lower()):
-                        # Extract the digit part in patterns like "Apt 2L"
-                        apt_letter_match = re.search(r'apt\s+(\d+)[a-zA-Z]', title.lower())
-                        if apt_letter_match:
-                            property_dict['bedrooms'] = int(apt_letter_match.group(1))
-                    
-                    # Extract from title like "10 Seminary Apt 2"
-                    elif "Seminary Apt" in title:
-                        seminary_match = re.search(r'Seminary\s+Apt\s+(\d+)', title)
-                        if seminary_match:
-                            property_dict['bedrooms'] = int(seminary_match.group(1))
-                    
-                    else:
-                        property_dict['bedrooms'] = None
-                except Exception as e:
-                    print(f"Error extracting bedrooms from title '{title}': {str(e)}")
-                    property_dict['bedrooms'] = None
-                
-            # Ensure distance is set for all properties
-            if property_dict.get('distance') is None:
-                # Estimate distance based on address patterns if location is available
-                if property_dict.get('location'):
-                    location = property_dict['location'].lower()
-                    # Example distance mapping - in a real app this would use geocoding
-                    if 'seminary' in location:
-                        property_dict['distance'] = 0.8
-                    elif 'murray' in location:
-                        property_dict['distance'] = 1.2
-                    elif 'leroy' in location:
-                        property_dict['distance'] = 0.9
-                    elif 'front' in location:
-                        property_dict['distance'] = 0.5
-                    elif 'walnut' in location:
-                        property_dict['distance'] = 1.3
-                    elif 'chapin' in location:
-                        property_dict['distance'] = 1.8
-                    elif 'ayres' in location:
-                        property_dict['distance'] = 1.5
-                    else:
-                        # Default distance estimate
-                        property_dict['distance'] = 1.0
-                else:
-                    # If no location, use a default
-                    property_dict['distance'] = 1.5
-            
-            all_properties.append(property_dict)
         
-        # If price filters are set but all properties have "No price",
-        # return a special flag to inform the frontend
-        if (min_price or max_price) and all(prop['price'] == 'No price' or not prop['price'] or prop['price'] == 'Contact for price' for prop in all_properties):
-            cur.close()
-            conn.close()
-            
+        if all_no_price:
             # Return a special response with the listings but also a flag
             print("All properties have 'No price'")
-            return jsonify({
+            response = {
                 "all_no_price": True,
                 "message": "All properties have no price information. Price filters cannot be applied.",
                 "properties": all_properties
-            })
-            
-        # Apply price filters in Python
-        # This is needed because price is stored as TEXT in the database
-        result = []
-        for property_dict in all_properties:
-            # Skip properties with no price or "No price" if min_price, max_price is set, or if show_with_price_only is true
-            if ((min_price or max_price or show_with_price_only) and 
-                (not property_dict['price'] or property_dict['price'] == 'No price' or property_dict['price'] == 'Contact for price')):
-                continue
-                
-            # Extract numeric value from price for filtering
-            # Example: Convert "$1,200" to 1200 for comparison
-            if property_dict['price'] and property_dict['price'] != 'No price' and property_dict['price'] != 'Contact for price':
-                # Extract numbers from the price string
-                price_value = ''.join(c for c in property_dict['price'] if c.isdigit())
-                if price_value:
-                    numeric_price = int(price_value)
-                    
-                    # Apply min_price filter
-                    if min_price and numeric_price < int(min_price):
-                        continue
-                        
-                    # Apply max_price filter
-                    if max_price and numeric_price > int(max_price):
-                        continue
-            
-            # Apply distance filter
-            if max_distance and property_dict.get('distance'):
-                if float(property_dict['distance']) > float(max_distance):
-                    continue
-            
-            result.append(property_dict)
-        
-        # Apply sorting
-        if sort == 'distance_asc':
-            # Sort by distance if available, then by ID
-            result.sort(key=lambda p: (float(p.get('distance', 999)), p['id']) if p.get('distance') else (999, p['id']))
-        
-        cur.close()
-        conn.close()
+            }
+            if paged:
+                response["next_cursor"] = next_cursor
+        elif paged:
+            response = {"properties": all_properties, "next_cursor": next_cursor}
+        else:
+            response = all_properties
         
-        print(f"Returning {len(result)} filtered properties")
-        return jsonify(result)
+        body = json.dumps(response)
+        listings_cache.set(cache_key, body, generation)
+        print(f"Returning {len(all_properties)} filtered properties")
+        return json_response(body)
     except Exception as e:
         import traceback
         print(f"Error in /api/listings: {str(e)}")
         print(traceback.format_exc())
         return jsonify({"error": str(e), "message": "Database error occurred"}), 500
 
+@housing_bp.route('/api/db-pool-stats', methods=['GET'])
+def db_pool_stats():
+    """Utility endpoint to report connection pool counters for sizing"""
+    return jsonify(pool_stats())
+
+@housing_bp.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Utility endpoint to report response cache hit/miss/eviction counters"""
+    http_cache = get_http_cache()
+    return jsonify({
+        "listings": listings_cache.stats(),
+        "property": property_cache.stats(),
+        "links": link_cache.stats(),
+        "http": http_cache.stats() if http_cache is not None else None
+    })
+
 @housing_bp.route('/api/diagnose-images', methods=['GET'])
 def diagnose_images():
     """Utility endpoint to diagnose image issues"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         # Get all properties with their image URLs
@@ -391,8 +433,7 @@ def diagnose_images():
 def fix_map_images():
     """Utility endpoint to fix map images for all properties"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         # Get API key parameter, if provided
@@ -445,6 +486,7 @@ def fix_map_images():
                 print(f"Error updating map_image (might not exist): {str(e)}")
         
         conn.commit()
+        bump_generation()
         cur.close()
         conn.close()
         
@@ -460,8 +502,7 @@ def fix_map_images():
 def filter_binghamton_west():
     """Filter to show only Binghamton West properties and delete others"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         # First, check how many properties we have from non-Binghamton West sources
@@ -481,6 +522,7 @@ def filter_binghamton_west():
             """)
             deleted_count = cur.rowcount
             conn.commit()
+            bump_generation()
         
         # Get count of remaining Binghamton West properties
         cur.execute("""
@@ -525,8 +567,7 @@ def filter_binghamton_west():
 def analyze_sources():
     """Analyze the sources of all properties in the database"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         # Get distinct domains from URLs
@@ -588,8 +629,7 @@ def analyze_sources():
 def clean_404_images():
     """Identify and optionally delete listings with 404 image URLs"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         # Get all property IDs and image URLs
@@ -623,22 +663,22 @@ def clean_404_images():
                         'issue': 'Missing local file'
                     })
         
-        # Delete problematic properties if requested
-        deleted_count = 0
-        if request.args.get('delete', 'false').lower() == 'true':
-            for prop in problematic_properties:
-                cur.execute("DELETE FROM properties WHERE id = %s", (prop['id'],))
-                deleted_count += 1
-            conn.commit()
-        
         cur.close()
         conn.close()
         
+        # Delete problematic properties if requested, in one statement
+        removal = {'removed': 0, 'audit_id': None}
+        if request.args.get('delete', 'false').lower() == 'true':
+            removal = remove_properties(ids=[prop['id'] for prop in problematic_properties],
+                                        reason="Missing image")
+        deleted_count = removal['removed']
+        
         return jsonify({
             "message": f"Found {len(problematic_properties)} properties with image issues" + 
                       (f", {deleted_count} properties deleted" if deleted_count > 0 else ""),
             "problematic_properties": problematic_properties,
-            "deleted_count": deleted_count
+            "deleted_count": deleted_count,
+            "audit_id": removal['audit_id']
         })
     except Exception as e:
         print(f"Error cleaning 404 images: {str(e)}")
@@ -646,140 +686,75 @@ def clean_404_images():
 
 @housing_bp.route('/api/clean-404-urls', methods=['GET'])
 def clean_404_urls():
-    """Identify and optionally delete listings whose URLs return 404"""
+    """
+    Identify and optionally delete listings whose URLs return 404.
+
+    Runs as a background job: returns 202 with the job, whose report (the
+    invalid properties and deleted count) is polled from /api/jobs/<id>.
+    Pass refresh=true to re-check URLs checked within the last
+    LINK_CHECK_TTL seconds.
+    """
+    delete = request.args.get('delete', 'false').lower() == 'true'
+    use_cache = request.args.get('refresh', 'false').lower() != 'true'
+    return start_job_response('clean-404-urls', find_dead_listings, delete=delete, use_cache=use_cache)
+
+def start_job_response(kind, operation, **params):
+    """Start a background job (or find the one of its kind already running, in any worker) and return 202"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        # Get all property IDs and URLs
-        cur.execute("""
-        SELECT id, title, url 
-        FROM properties
-        WHERE url LIKE '%%binghamtonwest.com%%'
-        """)
-        
-        properties = cur.fetchall()
-        
-        # Setup for requests
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Check each URL for 404 errors
-        invalid_properties = []
-        for prop in properties:
-            try:
-                # Skip if URL is empty
-                if not prop['url']:
-                    continue
-                    
-                # Ensure URL is properly formatted
-                url = prop['url']
-                if not url.startswith(('http://', 'https://')):
-                    url = 'https://' + url.lstrip('/')
-                
-                # Make request with timeout - use GET instead of HEAD to get content
-                response = requests.get(url, headers=headers, timeout=5, allow_redirects=True)
-                
-                # Check for 404 indicators in the content
-                is_404 = False
-                
-                # Check HTTP status code
-                if response.status_code == 404:
-                    is_404 = True
-                
-                # Check for 404 text patterns in the HTML
-                content = response.text.lower()
-                if (
-                    'error: page not found' in content or 
-                    '<h1' in content and '404' in content or
-                    "this page isn't available" in content or
-                    'data-hook="error-code">404<' in content
-                ):
-                    is_404 = True
-                    
-                if is_404:
-                    invalid_properties.append({
-                        'id': prop['id'],
-                        'title': prop['title'],
-                        'url': prop['url'],
-                        'status_code': response.status_code,
-                        'reason': 'Page not found (404)'
-                    })
-                    print(f"404 URL found: {prop['url']}")
-            except Exception as e:
-                # Count connection errors as invalid too
-                print(f"Error checking URL {prop['url']}: {str(e)}")
-                invalid_properties.append({
-                    'id': prop['id'],
-                    'title': prop['title'],
-                    'url': prop['url'],
-                    'error': str(e)
-                })
-        
-        # Delete invalid properties if requested
-        deleted_count = 0
-        if request.args.get('delete', 'false').lower() == 'true':
-            for prop in invalid_properties:
-                cur.execute("DELETE FROM properties WHERE id = %s", (prop['id'],))
-                deleted_count += 1
-            conn.commit()
-        
-        cur.close()
-        conn.close()
-        
-        return jsonify({
-            "message": f"Found {len(invalid_properties)} properties with 404 URLs" + 
-                      (f", {deleted_count} properties deleted" if deleted_count > 0 else ""),
-            "invalid_properties": invalid_properties,
-            "deleted_count": deleted_count
-        })
+        job, started = start_job(kind, operation, **params)
     except Exception as e:
-        print(f"Error cleaning 404 URLs: {str(e)}")
-        return jsonify({"error": str(e), "message": "Database error occurred"}), 500
+        print(f"Error starting {kind} job: {str(e)}")
+        return jsonify({"error": str(e), "message": "Could not start job"}), 500
+    body = dict(job, started=started, status_url=f"/housing/api/jobs/{job['id']}")
+    if not started:
+        body['message'] = f"A {kind} job is already running"
+    return jsonify(body), 202
+
+@housing_bp.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """Utility endpoint to list recent background jobs from every worker, newest first"""
+    try:
+        return jsonify({"jobs": list_jobs(request.args.get('kind'))})
+    except Exception as e:
+        print(f"Error listing jobs: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@housing_bp.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll a background job's progress and, once finished, its report"""
+    try:
+        job = get_job(job_id)
+    except Exception as e:
+        print(f"Error getting job {job_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 @housing_bp.route('/api/force-clean-bad-listings', methods=['GET'])
 def force_clean_bad_listings():
-    """Directly remove all listings with placeholder or missing images"""
+    """
+    Directly remove all listings with placeholder or missing images.
+
+    Both kinds go in one DELETE; pass dry_run=true to only list them.
+    """
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        # First, delete any listings missing image_url
-        cur.execute("""
-        DELETE FROM properties
-        WHERE image_url IS NULL OR image_url = ''
-        RETURNING id, title
-        """)
-        missing_images = cur.fetchall()
-        missing_image_count = len(missing_images)
-        conn.commit()
-        
-        # Now identify and delete all listings with placeholder images (600x400)
-        cur.execute("""
-        SELECT id, title, url, image_url
-        FROM properties
-        WHERE url LIKE '%binghamtonwest.com%'
-        AND (
-            image_url = '/static/images/placeholder.jpg'
-            OR image_url LIKE '%600x400%'
-            OR image_url LIKE '%placeholder%'
-        )
-        """)
-        placeholder_listings = [dict(row) for row in cur.fetchall()]
-        
-        # Delete all the placeholder listings by default
-        placeholder_deleted = 0
-        for listing in placeholder_listings:
-            cur.execute("DELETE FROM properties WHERE id = %s", (listing['id'],))
-            placeholder_deleted += 1
-        
-        conn.commit()
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        removal = remove_properties(predicates=('missing_image', 'placeholder_image'),
+                                    reason="Placeholder or missing image", dry_run=dry_run)
+        
+        missing_images = []
+        placeholder_listings = []
+        for listing in removal['listings']:
+            if listing['image_url']:
+                placeholder_listings.append(listing)
+            else:
+                missing_images.append({'id': listing['id'], 'title': listing['title']})
+        removed_ids = {listing['id'] for listing in removal['listings']}
         
         # Let's also check for any invalid image URLs (ones that can't be loaded)
-        # First get all remaining listings
+        conn = get_connection()
+        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         cur.execute("""
         SELECT id, title, url, image_url
         FROM properties
@@ -792,7 +767,7 @@ def force_clean_bad_listings():
         suspect_listings = []
         for prop in remaining_listings:
             image_url = prop['image_url']
-            if not image_url:
+            if not image_url or prop['id'] in removed_ids:
                 continue
                 
             # Check for patterns that might indicate problematic images
@@ -806,10 +781,12 @@ def force_clean_bad_listings():
         conn.close()
         
         return jsonify({
-            "message": f"Cleaned up listings: {missing_image_count} with missing images, {placeholder_deleted} with placeholder images",
-            "missing_images": [dict(row) for row in missing_images],
+            "message": f"{'Would clean up' if dry_run else 'Cleaned up'} listings: {len(missing_images)} with missing images, {len(placeholder_listings)} with placeholder images",
+            "missing_images": missing_images,
             "placeholder_listings": placeholder_listings,
-            "suspect_listings": suspect_listings
+            "suspect_listings": suspect_listings,
+            "dry_run": dry_run,
+            "audit_id": removal['audit_id']
         })
     except Exception as e:
         print(f"Error force cleaning listings: {str(e)}")
@@ -819,10 +796,6 @@ def force_clean_bad_listings():
 def remove_specific_listings():
     """Remove specific listings identified in the screenshots"""
     try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
         # List of specific listings to remove (by title/pattern)
         specific_listings = [
             # Listings with generic bedroom photos
@@ -833,42 +806,59 @@ def remove_specific_listings():
             "BINGHAMTON WEST"
         ]
         
-        # Track the deleted items
-        deleted_items = []
-        
-        # Delete each specific listing
-        for listing_title in specific_listings:
-            # First get the details so we can return what was deleted
-            cur.execute("""
-            SELECT id, title, url 
-            FROM properties 
-            WHERE title = %s
-            """, (listing_title,))
-            
-            items = cur.fetchall()
-            for item in items:
-                deleted_items.append(dict(item))
-            
-            # Then delete it
-            cur.execute("""
-            DELETE FROM properties 
-            WHERE title = %s
-            """, (listing_title,))
-        
-        # Commit the changes
-        conn.commit()
-        
-        cur.close()
-        conn.close()
+        # Delete them all in one statement, returning what was deleted
+        removal = remove_properties(titles=specific_listings, reason="Specific listings flagged for removal")
+        deleted_items = [
+            {'id': listing['id'], 'title': listing['title'], 'url': listing['url']}
+            for listing in removal['listings']
+        ]
         
         return jsonify({
             "message": f"Successfully removed {len(deleted_items)} specific listings",
-            "deleted_listings": deleted_items
+            "deleted_listings": deleted_items,
+            "audit_id": removal['audit_id']
         })
     except Exception as e:
         print(f"Error removing specific listings: {str(e)}")
         return jsonify({"error": str(e), "message": "Database error occurred"}), 500
 
+@housing_bp.route('/api/admin/remove-listings', methods=['POST'])
+def bulk_remove_listings():
+    """
+    Delete or retire listings in bulk, in one statement with an audit row.
+
+    JSON body: ids (list of ints), titles (list of strings) and predicates
+    (names from REMOVAL_PREDICATES) - a listing matching any of them is
+    removed - plus action ('delete' or 'retire'), reason and dry_run.
+    Anything else in those fields is a 400. dry_run defaults to true, so
+    the change has to be asked for explicitly.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    predicates = data.get('predicates') or []
+    if isinstance(predicates, str):
+        predicates = [predicates]
+    if not isinstance(predicates, list):
+        return jsonify({"error": "predicates must be a list of predicate names"}), 400
+    if data.get('reason') is not None and not isinstance(data['reason'], str):
+        return jsonify({"error": "reason must be a string"}), 400
+    try:
+        removal = remove_properties(
+            ids=data.get('ids'),
+            titles=data.get('titles'),
+            predicates=predicates,
+            action=data.get('action', 'delete'),
+            reason=data.get('reason'),
+            dry_run=bool(data.get('dry_run', True))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error removing listings: {str(e)}")
+        return jsonify({"error": str(e), "message": "Database error occurred"}), 500
+    return jsonify(removal)
+
 @housing_bp.route('/api/scrape-listing-details', methods=['GET'])
 def scrape_listing_details():
     """API endpoint to scrape details from original listing URLs"""
@@ -911,7 +901,7 @@ def save_listing():
         print(f"Attempting to save property {property_id} for student {student_id}")
         
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor()
         
         # Check if the property exists
@@ -972,7 +962,7 @@ def unsave_listing():
         property_id = data['property_id']
         
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor()
         
         # Delete the saved listing
@@ -1004,7 +994,7 @@ def check_saved_listing():
             return jsonify({"error": "Property ID is required"}), 400
         
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor()
         
         # Check if property is saved
@@ -1033,7 +1023,7 @@ def get_saved_listings():
     
     try:
         # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = get_connection()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         # Get all saved listings for this student with property details
@@ -1056,48 +1046,6 @@ def get_saved_listings():
             if not property_dict['price'] or property_dict['price'] == 'No price' or property_dict['price'] == '$,' or property_dict['price'] == '$':
                 property_dict['price'] = 'Contact for price'
             
-            # Process bedrooms field if it's null or empty
-            if property_dict['bedrooms'] is None or property_dict['bedrooms'] == '':
-                # Try to extract bedrooms from title
-                title = property_dict.get('title', '')
-                try:
-                    # Look for patterns like "2 Bedroom" or "2 BR" or "2-Bedroom" or "Apt 2" or ending with 2
-                    import re
-                    
-                    # First, check for explicit bedroom mentions
-                    bedroom_match = re.search(r'(\d+)[\s-]*(bed|br|bedroom)', title.lower())
-                    if bedroom_match:
-                        property_dict['bedrooms'] = int(bedroom_match.group(1))
-                    
-                    # If no match, check for "Apt X" pattern
-                    elif re.search(r'apt\s+(\d+)', title.lower()):
-                        apt_match = re.search(r'apt\s+(\d+)', title.lower())
-                        property_dict['bedrooms'] = int(apt_match.group(1))
-                    
-                    # If still no match, check if property address ends with a number
-                    elif re.search(r'\s(\d+)$', title.strip()):
-                        end_match = re.search(r'\s(\d+)$', title.strip())
-                        property_dict['bedrooms'] = int(end_match.group(1))
-                    
-                    # Look for apartment number after the suffix like 1L, 2R, etc.
-                    elif re.search(r'apt\s+\d+[a-zA-Z]', title.lower()):
-                        # Extract the digit part in patterns like "Apt 2L"
-                        apt_letter_match = re.search(r'apt\s+(\d+)[a-zA-Z]', title.lower())
-                        if apt_letter_match:
-                            property_dict['bedrooms'] = int(apt_letter_match.group(1))
-                    
-                    # Extract from title like "10 Seminary Apt 2"
-                    elif "Seminary Apt" in title:
-                        seminary_match = re.search(r'Seminary\s+Apt\s+(\d+)', title)
-                        if seminary_match:
-                            property_dict['bedrooms'] = int(seminary_match.group(1))
-                    
-                    else:
-                        property_dict['bedrooms'] = None
-                except Exception as e:
-                    print(f"Error extracting bedrooms from title '{title}': {str(e)}")
-                    property_dict['bedrooms'] = None
-                
             result.append(property_dict)
         
         cur.close()
@@ -1110,119 +1058,12 @@ def get_saved_listings():
 
 @housing_bp.route('/api/update-property-database', methods=['GET'])
 def update_property_database():
-    """Update the database with correct property details from original sources"""
-    try:
-        # Direct database connection
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        # First, check how many properties need updating
-        cur.execute("""
-        SELECT id, title, url, price, bedrooms 
-        FROM properties 
-        WHERE url LIKE '%%binghamtonwest.com%%'
-        """)
-        
-        properties = cur.fetchall()
-        total_count = len(properties)
-        updated_count = 0
-        errors = []
-        
-        for prop in properties:
-            try:
-                if prop['url']:
-                    print(f"Updating property {prop['id']}: {prop['title']}")
-                    
-                    # Attempt to extract bedrooms from title if not already set
-                    extracted_bedrooms = None
-                    if not prop['bedrooms']:
-                        title = prop['title']
-                        try:
-                            # Look for patterns like "2 Bedroom" or "2 BR" or "2-Bedroom" or "Apt 2" or ending with 2
-                            import re
-                            
-                            # First, check for explicit bedroom mentions
-                            bedroom_match = re.search(r'(\d+)[\s-]*(bed|br|bedroom)', title.lower())
-                            if bedroom_match:
-                                extracted_bedrooms = int(bedroom_match.group(1))
-                            
-                            # If no match, check for "Apt X" pattern
-                            elif re.search(r'apt\s+(\d+)', title.lower()):
-                                apt_match = re.search(r'apt\s+(\d+)', title.lower())
-                                extracted_bedrooms = int(apt_match.group(1))
-                            
-                            # If still no match, check if property address ends with a number
-                            elif re.search(r'\s(\d+)$', title.strip()):
-                                end_match = re.search(r'\s(\d+)$', title.strip())
-                                extracted_bedrooms = int(end_match.group(1))
-                            
-                            # Look for apartment number after the suffix like 1L, 2R, etc.
-                            elif re.search(r'apt\s+\d+[a-zA-Z]', title.lower()):
-                                # Extract the digit part in patterns like "Apt 2L"
-                                apt_letter_match = re.search(r'apt\s+(\d+)[a-zA-Z]', title.lower())
-                                if apt_letter_match:
-                                    extracted_bedrooms = int(apt_letter_match.group(1))
-                            
-                            # Extract from title like "10 Seminary Apt 2"
-                            elif "Seminary Apt" in title:
-                                seminary_match = re.search(r'Seminary\s+Apt\s+(\d+)', title)
-                                if seminary_match:
-                                    extracted_bedrooms = int(seminary_match.group(1))
-                                
-                        except Exception as e:
-                            print(f"Error extracting bedrooms from title '{title}': {str(e)}")
-                    
-                    # If we successfully extracted bedrooms from the title, update immediately
-                    if extracted_bedrooms is not None:
-                        cur.execute(
-                            "UPDATE properties SET bedrooms = %s WHERE id = %s",
-                            (extracted_bedrooms, prop['id'])
-                        )
-                        updated_count += 1
-                        print(f"Updated property {prop['id']} with extracted bedrooms: {extracted_bedrooms}")
-                        continue
-                    
-                    # Use the extract_property_details function to get fresh data from URL
-                    updated_details = extract_property_details(prop['url'])
-                    
-                    # If successful, update the property details
-                    if updated_details and updated_details.get('success'):
-                        updates = []
-                        params = []
-                        
-                        # Update bedrooms if available and not already set
-                        if updated_details.get('bedrooms') and (not prop['bedrooms'] or prop['bedrooms'] == ''):
-                            updates.append("bedrooms = %s")
-                            params.append(updated_details['bedrooms'])
-                        
-                        # Update price if available and current is just "$" or "$,"
-                        if updated_details.get('price'):
-                            price = updated_details['price']
-                            if price and price not in ['$', '$,', 'No price'] and (not prop['price'] or prop['price'] in ['$', '$,', 'No price']):
-                                updates.append("price = %s")
-                                params.append(price)
-                        
-                        # Only update if we have changes to make
-                        if updates:
-                            params.append(prop['id'])
-                            update_query = f"UPDATE properties SET {', '.join(updates)} WHERE id = %s"
-                            cur.execute(update_query, params)
-                            updated_count += 1
-            except Exception as e:
-                error_msg = f"Error updating property {prop['id']}: {str(e)}"
-                print(error_msg)
-                errors.append(error_msg)
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return jsonify({
-            "message": f"Database update complete. Updated {updated_count} of {total_count} properties.",
-            "updated_count": updated_count,
-            "total_count": total_count,
-            "errors": errors
-        })
-    except Exception as e:
-        print(f"Error updating property database: {str(e)}")
-        return jsonify({"error": str(e), "message": "Database error occurred"}), 500 
\ No newline at end of file
+    """
+    Update the database with correct property details from original sources.
+
+    Runs as a background job: returns 202 with the job, whose progress and
+    report (updated count, errors, per-page fetch timings) are polled from
+    /api/jobs/<id> on any worker. While a refresh is running, another
+    request gets that job back instead of starting a second one.
+    """
+    return start_job_response('update-property-database', refresh_listing_sources)
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""
+Keyset pagination helpers for the property APIs
+
+Pages are addressed by an opaque cursor that encodes the sort key and id of
+the last row served, so every page is an index range scan and costs the same
+no matter how deep into the result set it is.
+"""
+
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+
+# sort name -> (key column or None for id-only, direction)
+# Keyed sorts break ties on id in the same direction and put NULL keys last,
+# so the non-NULL rows are one range over a matching (column, id) index
+SORT_ORDERS = {
+    'id_asc': (None, 'ASC'),
+    'id_desc': (None, 'DESC'),
+    'price_asc': ('price_value', 'ASC'),
+    'price_desc': ('price_value', 'DESC'),
+    'distance_asc': ('distance', 'ASC'),
+}
+
+# Columns a client may request with fields=
+PROPERTY_FIELDS = (
+    'id', 'title', 'price', 'price_value', 'location', 'url', 'bedrooms',
+    'image_url', 'map_image_url', 'latitude', 'longitude', 'distance', 'created_at'
+)
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed limit, cursor or fields parameter"""
+
+
+def normalize_sort(sort):
+    """Fall back to id_asc for unknown sort names, as the listings API always has"""
+    return sort if sort in SORT_ORDERS else 'id_asc'
+
+
+def order_clause(sort):
+    column, direction = SORT_ORDERS[normalize_sort(sort)]
+    if column is None:
+        return f"ORDER BY id {direction}"
+    return f"ORDER BY {column} {direction} NULLS LAST, id {direction}"
+
+
+def parse_limit(value):
+    """Parse the limit parameter; None means the caller did not ask for paging"""
+    if value in (None, ''):
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        raise PaginationError("limit must be an integer")
+    if limit < 1:
+        raise PaginationError("limit must be at least 1")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(value):
+    """
+    Parse a comma-separated fields= projection.
+
+    Returns:
+        list or None: Requested columns in PROPERTY_FIELDS order, or None for all columns.
+    """
+    if not value:
+        return None
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(PROPERTY_FIELDS)
+    if unknown:
+        raise PaginationError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in PROPERTY_FIELDS if field in requested]
+
+
+def select_columns(fields, sort):
+    """
+    Columns to select for a projection, plus the ones pagination needs.
+
+    Returns:
+        tuple: (SQL column list, columns to strip from the response)
+    """
+    if fields is None:
+        return '*', []
+    column, _ = SORT_ORDERS[normalize_sort(sort)]
+    columns = list(fields)
+    extra = []
+    for needed in ('id', column):
+        if needed and needed not in columns:
+            columns.append(needed)
+            extra.append(needed)
+    return ', '.join(columns), extra
+
+
+def encode_cursor(sort, row):
+    """Build the opaque cursor pointing just past `row`"""
+    sort = normalize_sort(sort)
+    column, _ = SORT_ORDERS[sort]
+    payload = {'s': sort, 'id': row['id']}
+    if column:
+        payload['k'] = row[column]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Decode a cursor, checking it was issued for the same sort order"""
+    sort = normalize_sort(sort)
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = int(payload['id'])
+    except (ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if payload.get('s') != sort:
+        raise PaginationError("Cursor was issued for a different sort order")
+    return payload.get('k'), last_id
+
+
+def keyset_conditions(sort, cursor):
+    """
+    WHERE fragments selecting rows that come after the cursor in `sort` order.
+
+    A keyed sort pages through the non-NULL keys with a row-value
+    comparison, then through the NULLS LAST tail by id. Each fragment is a
+    single index range; query them in turn until the page is full.
+
+    Returns:
+        list: (SQL fragment, params) tuples, in order.
+    """
+    key, last_id = decode_cursor(cursor, sort)
+    column, direction = SORT_ORDERS[normalize_sort(sort)]
+    op = '>' if direction == 'ASC' else '<'
+
+    if column is None:
+        return [(f"id {op} %s", [last_id])]
+
+    # Already in the NULLS LAST tail - only later NULL rows remain
+    if key is None:
+        return [(f"{column} IS NULL AND id {op} %s", [last_id])]
+
+    return [
+        (f"({column}, id) {op} (%s, %s)", [key, last_id]),
+        (f"{column} IS NULL", []),
+    ]
+
+
+def paginate_rows(rows, limit, sort, strip=()):
+    """
+    Trim a page fetched with LIMIT limit + 1 and compute the next cursor.
+
+    Returns:
+        tuple: (list of row dicts, next cursor or None)
+    """
+    rows = [dict(row) for row in rows]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1])
+    for row in rows:
+        for column in strip:
+            row.pop(column, None)
+    return rows, next_cursor